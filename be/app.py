@@ -6,10 +6,11 @@ from routes.file_routes import file_bp
 from routes.sync_routes import sync_bp
 from routes.optimized_file_routes import optimized_file_bp
 from services.user_service import UserService
+from commands import register_commands
 # 导入所有模型以确保数据库表创建
 from models.user import User
 from models.file import File
-from models.chunk import Chunk, FileChunkMapping
+from models.chunk import Chunk, FileChunkMapping, MaintenanceCheckpoint, StorageCounters, FileManifest, ChunkSketch, ChunkDelta, ChunkAccess, ChunkDictionary, ChunkFingerprint, ChunkRemovalEpoch, ChunkRemoval
 
 def create_app():
     app = Flask(__name__)
@@ -28,6 +29,7 @@ def create_app():
     app.register_blueprint(file_bp, url_prefix='/file')
     app.register_blueprint(sync_bp, url_prefix='/sync')
     app.register_blueprint(optimized_file_bp)
+    register_commands(app)
 
     with app.app_context():
         db.create_all()
@@ -0,0 +1,99 @@
+"""
+分块策略权衡：全局固定块大小 vs 按文件大小/类型自适应
+
+对一个样本语料（--corpus 指定目录；未指定时生成由小文件、中等文件、
+带少量修改的大文件版本和已压缩文件组成的语料）只做分块和哈希，不写盘，统计：
+- mapping rows: 文件→块映射行数（每个文件的每个块一行）
+- chunk rows:   去重后的块记录数（每个唯一块一行 + 一个块文件）
+- stored MB / dedup: 去重后的数据量与去重率
+
+注意：同一文件的两个版本若恰好落在档位边界两侧（如一个 64 MB、一个略大于 64 MB），
+会使用不同的块大小，彼此之间无法去重；目标块数越小，块越大，映射行数越少，去重率越低。
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_chunk_policy --corpus /data/sample --base-kb 4096 --targets 256 1024 4096
+    python -m benchmarks.bench_chunk_policy --base-kb 64 --large-mb 64
+"""
+import argparse
+import hashlib
+import os
+import random
+
+from benchmarks.bench_chunking import make_versions
+from benchmarks.common import text_like_bytes
+from services.dedup.chunk_policy import ChunkPolicy
+from services.dedup.chunker import make_chunker
+
+
+def load_corpus(path: str):
+    """读取目录下的所有文件，产出 (文件名, 数据)"""
+    for dirpath, _, names in os.walk(path):
+        for name in sorted(names):
+            with open(os.path.join(dirpath, name), "rb") as f:
+                yield name, f.read()
+
+
+def generate_corpus(large_mb: int, seed: int = 7):
+    """生成样本语料：大量小文件、若干中等文件、大文件的两个版本、已压缩文件"""
+    rng = random.Random(seed)
+    for i in range(200):
+        yield f"note-{i}.txt", text_like_bytes(rng.randint(1, 64) * 1024, seed=i)
+    for i in range(8):
+        yield f"doc-{i}.txt", text_like_bytes(rng.randint(1, 8) * 1024 * 1024, seed=1000 + i)
+    base, edited = make_versions(large_mb * 1024 * 1024, edits=8, seed=seed + 1)
+    yield "disk-v1.img", base
+    yield "disk-v2.img", edited
+    for i in range(4):
+        yield f"photo-{i}.jpg", b"\xff\xd8\xff\xe0" + rng.randbytes(2 * 1024 * 1024)
+
+
+def run(corpus, pick_chunker):
+    unique = {}
+    total = 0
+    mappings = 0
+    for name, data in corpus:
+        chunker = pick_chunker(name, data)
+        for piece in chunker.split(data):
+            unique[hashlib.sha256(piece).digest()] = len(piece)
+            mappings += 1
+        total += len(data)
+    stored = sum(unique.values())
+    return {
+        "mapping_rows": mappings,
+        "chunk_rows": len(unique),
+        "stored_mb": stored / 1e6,
+        "dedup_ratio": total / stored if stored else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=None, help="样本语料目录，默认生成语料")
+    parser.add_argument("--large-mb", type=int, default=96, help="生成语料中大文件的大小")
+    parser.add_argument("--algorithm", default="cdc", choices=["fixed", "cdc"])
+    parser.add_argument("--base-kb", type=int, default=64, help="基础（全局）块大小")
+    parser.add_argument("--max-mb", type=int, default=64, help="自适应块大小上限")
+    parser.add_argument("--targets", type=int, nargs="+", default=[256, 1024, 4096], help="每个文件的目标块数")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = list(load_corpus(args.corpus))
+    else:
+        corpus = list(generate_corpus(args.large_mb))
+    total_mb = sum(len(data) for _, data in corpus) / 1e6
+    base = args.base_kb * 1024
+    print(f"{len(corpus)} files, {total_mb:.1f} MB, {args.algorithm} base {args.base_kb} KB")
+    print(f"{'policy':<18}{'mapping rows':>14}{'chunk rows':>12}{'stored MB':>12}{'dedup':>8}")
+
+    fixed = make_chunker(args.algorithm, base)
+    rows = [("global", run(corpus, lambda name, data: fixed))]
+    for target in args.targets:
+        policy = ChunkPolicy(args.algorithm, base, args.max_mb * 1024 * 1024, target)
+        rows.append((f"adaptive/{target}",
+                     run(corpus, lambda name, data: policy.chunker_for(len(data), name, data[:64]))))
+    for label, r in rows:
+        print(f"{label:<18}{r['mapping_rows']:>14}{r['chunk_rows']:>12}{r['stored_mb']:>12.1f}{r['dedup_ratio']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+相似块增量压缩基准：存储空间节省与读取延迟代价
+
+语料为同一批文档/日志的多个版本（每个版本在上一版本上做少量修改，日志在末尾追加），
+分别在关闭/开启增量压缩时入库，统计：
+- stored MB:   块数据实际占用（压缩后）
+- MB/s:        入库吞吐
+- delta:       以差分存储的块数与最大链深度
+- read ms:     关闭块缓存后逐块读取所有版本的平均每块耗时（差分块需要先读取并还原基准块）
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_delta --docs 20 --versions 5 --chunk-kb 64
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import bench_app, text_like_bytes
+from common.db import db
+from models.chunk import Chunk, ChunkDelta, ChunkSketch, FileChunkMapping
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+def make_corpus(docs: int, versions: int, size: int, seed: int = 5):
+    """产出 [(名称, 数据)]：每个文档 versions 个版本，一半为原地修改的文档、一半为追加写入的日志"""
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(docs):
+        data = text_like_bytes(size, seed=seed * 1000 + d)
+        for v in range(versions):
+            corpus.append((f"doc{d}-v{v}", data))
+            edited = bytearray(data)
+            if d % 2:
+                edited += text_like_bytes(rng.randint(256, 4096), seed=rng.randrange(1 << 30))
+            else:
+                for _ in range(rng.randint(1, 6)):
+                    pos = rng.randrange(len(edited) - 64)
+                    edited[pos:pos + 16] = rng.randbytes(16)
+            data = bytes(edited)
+    return corpus
+
+
+def run(corpus, chunk_size: int, delta: bool, max_depth: int):
+    root = tempfile.mkdtemp(prefix="delta-bench-")
+    store = DatabaseChunkStore(root, chunk_size=chunk_size, chunking="cdc")
+    store.chunk_policy = None
+    store.durable_writes = False
+    store.delta_enabled = delta
+    store.delta_max_depth = max_depth
+    store.chunk_cache = ChunkCache(0)  # 每次读取都访问磁盘并还原差分
+    try:
+        for model in (Chunk, FileChunkMapping, ChunkSketch, ChunkDelta):
+            db.session.query(model).delete()
+        db.session.commit()
+
+        total = sum(len(data) for _, data in corpus)
+        start = time.perf_counter()
+        hashes = [store.store_file(data)['file_hash'] for _, data in corpus]
+        ingest = time.perf_counter() - start
+
+        chunks = 0
+        start = time.perf_counter()
+        for file_hash in hashes:
+            for _ in store.open_file(file_hash):
+                chunks += 1
+        read = time.perf_counter() - start
+
+        stats = store.get_delta_stats()
+        return {
+            'stored_mb': Chunk.get_storage_stats()['total_compressed_size'] / 1e6,
+            'mb_per_s': total / ingest / 1e6,
+            'delta_chunks': stats['delta_chunks'],
+            'max_depth': stats['max_depth'],
+            'read_ms': 1000 * read / chunks,
+            'delta_read_ms': stats['runtime']['avg_delta_read_ms'],
+        }
+    finally:
+        store.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--size-kb", type=int, default=512, help="每个文档的初始大小")
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    parser.add_argument("--max-depth", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.docs, args.versions, args.size_kb * 1024)
+    total_mb = sum(len(data) for _, data in corpus) / 1e6
+    print(f"{len(corpus)} files, {total_mb:.1f} MB, cdc {args.chunk_kb} KB chunks")
+    print(f"{'mode':<10}{'stored MB':>11}{'MB/s':>8}{'delta':>8}{'depth':>7}{'read ms':>9}{'delta ms':>10}")
+
+    with bench_app():
+        modes = [("off", False, 0)] + [(f"depth<={d}", True, d) for d in args.max_depth]
+        for label, delta, depth in modes:
+            r = run(corpus, args.chunk_kb * 1024, delta, depth)
+            print(f"{label:<10}{r['stored_mb']:>11.2f}{r['mb_per_s']:>8.1f}{r['delta_chunks']:>8}"
+                  f"{r['max_depth']:>7}{r['read_ms']:>9.3f}{r['delta_read_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
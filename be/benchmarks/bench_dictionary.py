@@ -0,0 +1,107 @@
+"""
+小文件字典压缩基准：训练字典的 zstd 与当前 gzip.compress 的压缩率和吞吐
+
+每个语料生成一批小文件，80% 用于训练字典，剩下 20% 逐个文件压缩/解压（与块存储中逐块压缩一致）；
+压缩率为压缩后总大小 / 原始总大小（不含封装头部），吞吐按原始字节计算。
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_dictionary --files 5000 --dict-kb 110
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+
+from benchmarks.common import text_like_bytes
+from utils.compress import TrainedDictionary, train_dictionary
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def json_config(rng):
+    return json.dumps({
+        "service": f"svc-{rng.randint(0, 10 ** 6)}",
+        "replicas": rng.randint(1, 9),
+        "image": f"registry.example.com/team/app:{rng.randint(100, 999)}",
+        "env": {"LOG_LEVEL": rng.choice(["info", "debug", "warn"]), "REGION": rng.choice(["cn-east", "cn-north"])},
+        "ports": [{"name": "http", "port": rng.choice([80, 8080, 8000])}],
+        "resources": {"cpu": f"{rng.randint(1, 8)}00m", "memory": f"{rng.randint(1, 16)}Gi"},
+        "healthcheck": {"path": "/healthz", "interval_seconds": rng.randint(5, 60)},
+    }, indent=2).encode()
+
+
+def source_file(rng):
+    name = f"handler_{rng.randint(0, 10 ** 6)}"
+    lines = ["import os", "import logging", "", "logger = logging.getLogger(__name__)", ""]
+    for i in range(rng.randint(2, 8)):
+        lines += [
+            f"def {name}_{i}(request, user_id, limit={rng.randint(10, 100)}):",
+            f'    """处理第 {i} 类请求"""',
+            "    if not user_id:",
+            "        raise ValueError('missing user_id')",
+            "    items = request.get('items', [])[:limit]",
+            "    logger.info('processed %d items for %s', len(items), user_id)",
+            "    return {'count': len(items), 'user_id': user_id}",
+            "",
+        ]
+    return "\n".join(lines).encode()
+
+
+def text_note(rng):
+    return text_like_bytes(rng.randint(512, 4096), seed=rng.randint(0, 10 ** 6))
+
+
+CORPORA = {"json": json_config, "source": source_file, "text": text_note}
+
+
+def measure(files, compress, decompress):
+    """返回 (压缩率, 压缩 MB/s, 解压 MB/s)"""
+    raw = sum(len(data) for data in files)
+    started = time.perf_counter()
+    blobs = [compress(data) for data in files]
+    compress_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for blob, data in zip(blobs, files):
+        assert len(decompress(blob, len(data))) == len(data)
+    decompress_seconds = time.perf_counter() - started
+    return sum(len(blob) for blob in blobs) / raw, raw / compress_seconds / 1e6, raw / decompress_seconds / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000, help="每个语料的小文件数")
+    parser.add_argument("--dict-kb", type=int, default=110)
+    parser.add_argument("--level", type=int, default=3, help="zstd 压缩级别")
+    args = parser.parse_args()
+    if zstandard is None:
+        parser.error("需要安装 zstandard")
+
+    print(f"{'corpus':>8}{'method':>12}{'ratio':>8}{'comp MB/s':>11}{'decomp MB/s':>13}")
+    for corpus, make in CORPORA.items():
+        rng = random.Random(corpus)
+        files = [make(rng) for _ in range(args.files)]
+        split = len(files) // 5
+        holdout, training = files[:split], files[split:]
+        started = time.perf_counter()
+        dictionary = TrainedDictionary(1, train_dictionary(training, args.dict_kb * 1024, args.level))
+        train_seconds = time.perf_counter() - started
+
+        plain = zstandard.ZstdCompressor(level=args.level)
+        methods = {
+            "gzip": (gzip.compress, lambda blob, size: gzip.decompress(blob)),
+            "zstd": (plain.compress, lambda blob, size: zstandard.ZstdDecompressor().decompress(blob)),
+            "zstd+dict": (lambda data: dictionary.compress(data, args.level), dictionary.decompress),
+        }
+        for name, (compress, decompress) in methods.items():
+            ratio, comp, decomp = measure(holdout, compress, decompress)
+            print(f"{corpus:>8}{name:>12}{ratio:>8.3f}{comp:>11.1f}{decomp:>13.1f}")
+        avg = sum(len(data) for data in holdout) / len(holdout)
+        print(f"{'':>8}  avg file {avg:.0f} B, dictionary trained in {train_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+块指纹算法基准：各算法在本机上的哈希吞吐（单线程与多线程），用于选择 CHUNK_FINGERPRINT
+
+按块大小分别测量：每轮对同一批随机块逐个计算指纹（与入库时逐块计算一致），吞吐按原始字节计算；
+多线程模式用 --threads 个线程并发哈希不同的块（hashlib 对大块数据释放 GIL，接近入库工作线程池的情形）。
+blake3 需安装 blake3 包，未安装时不参与比较。
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_fingerprint --chunk-kb 4 64 1024 --total-mb 256 --threads 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.hash import available_fingerprints, get_fingerprint
+
+
+def measure(fingerprint, chunks, rounds, threads):
+    """返回 MB/s（取各轮中最快的一轮）"""
+    size = sum(len(chunk) for chunk in chunks)
+    best = float("inf")
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            if threads == 1:
+                for chunk in chunks:
+                    fingerprint(chunk)
+            else:
+                list(executor.map(fingerprint, chunks))
+            best = min(best, time.perf_counter() - started)
+    return size / best / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-kb", type=int, nargs="+", default=[4, 64, 1024])
+    parser.add_argument("--total-mb", type=int, default=256, help="每种块大小哈希的总数据量")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    names = available_fingerprints()
+    print(f"algorithms: {', '.join(names)}; {args.total_mb} MB per chunk size, {args.threads} threads")
+    print(f"{'chunk KB':>9}{'algorithm':>10}{'1 thread MB/s':>15}{f'{args.threads} threads MB/s':>18}")
+    for chunk_kb in args.chunk_kb:
+        chunk_size = chunk_kb * 1024
+        chunks = [os.urandom(chunk_size) for _ in range(max(1, args.total_mb * 1024 // chunk_kb))]
+        for name in names:
+            fingerprint = get_fingerprint(name)
+            single = measure(fingerprint, chunks, args.rounds, 1)
+            multi = measure(fingerprint, chunks, args.rounds, args.threads)
+            print(f"{chunk_kb:>9}{name:>10}{single:>15.1f}{multi:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
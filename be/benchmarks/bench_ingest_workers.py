@@ -0,0 +1,53 @@
+"""
+入库工作线程数基准：1/2/4/8 个哈希+压缩工作线程的吞吐
+
+分别报告：
+- prepare: 只有哈希+压缩阶段（可并行的部分）
+- ingest:  完整的 store_file_stream（含写盘与数据库记录）
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_ingest_workers --size-mb 128 --chunk-kb 1024
+"""
+import argparse
+import io
+import os
+import time
+
+from benchmarks.common import bench_app, text_like_bytes
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    chunk_size = args.chunk_kb * 1024
+    print(f"{args.size_mb} MB, chunk {args.chunk_kb} KB, cpu_count={os.cpu_count()}")
+    print(f"{'workers':>8}{'prepare MB/s':>14}{'ingest MB/s':>14}")
+
+    with bench_app() as (app, temp_dir):
+        for workers in args.workers:
+            # 每轮使用不同数据，避免去重命中影响结果
+            data = text_like_bytes(size, seed=workers)
+            store = DatabaseChunkStore(os.path.join(temp_dir, f"w{workers}"), chunk_size=chunk_size,
+                                       ingest_workers=workers)
+            try:
+                start = time.perf_counter()
+                for _ in store._prepare_stage(store._read_stage(store.chunker.split(data))):
+                    pass
+                prepare = size / (time.perf_counter() - start) / 1e6
+
+                start = time.perf_counter()
+                store.store_file_stream(io.BytesIO(data))
+                ingest = size / (time.perf_counter() - start) / 1e6
+            finally:
+                store.close()
+            print(f"{workers:>8}{prepare:>14.1f}{ingest:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+顺序读取预读基准：冷读大文件的首字节/末字节时间（time-to-first/last-byte）
+
+冷盘和对象存储的延迟通过 --latency-ms 注入到每次块读取中（本机页缓存无法代表冷读）；
+每轮读取前清空块缓存，保证每个块都真正读取+解压一次。
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_readahead --size-mb 2048 --chunk-kb 4096 --latency-ms 20
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import bench_app, text_like_bytes
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.readahead import ReadAhead
+
+
+class GeneratedStream:
+    """按段生成数据的流，不在内存中保留整个文件"""
+    SEGMENT = 8 * 1024 * 1024
+
+    def __init__(self, size):
+        self.remaining = size
+        self.segment = text_like_bytes(self.SEGMENT)
+        self.pos = 0
+        self.seed = 0
+
+    def read(self, size=-1):
+        size = min(size if size and size > 0 else self.remaining, self.remaining)
+        out = bytearray()
+        while len(out) < size:
+            if self.pos == len(self.segment):
+                # 每段末尾改写少量字节，避免所有块去重成同一个
+                self.seed += 1
+                self.segment = self.seed.to_bytes(8, "little") + self.segment[8:]
+                self.pos = 0
+            take = min(size - len(out), len(self.segment) - self.pos)
+            out += self.segment[self.pos:self.pos + take]
+            self.pos += take
+        self.remaining -= size
+        return bytes(out)
+
+
+def timed_read(store, file_hash):
+    """返回 (首字节秒数, 末字节秒数, 字节数)"""
+    store.chunk_cache.clear()
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for piece in store.open_file(file_hash):
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(piece)
+    return first, time.perf_counter() - start, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--chunk-kb", type=int, default=4096)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="每次块读取注入的延迟")
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 2, 4, 8], help="预读块数，0为关闭")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    chunk_size = args.chunk_kb * 1024
+    print(f"{args.size_mb} MB, chunk {args.chunk_kb} KB, latency {args.latency_ms} ms/chunk, "
+          f"cpu_count={os.cpu_count()}")
+
+    with bench_app() as (app, temp_dir):
+        store = DatabaseChunkStore(os.path.join(temp_dir, "store"), chunk_size=chunk_size)
+        store.chunk_cache = ChunkCache(0)
+        try:
+            file_hash = store.store_file_stream(GeneratedStream(size))['file_hash']
+
+            read_blob = store._read_chunk_blob
+
+            def slow_read(path):
+                time.sleep(args.latency_ms / 1000)
+                return read_blob(path)
+
+            store._read_chunk_blob = slow_read
+
+            print(f"{'depth':>6}{'TTFB ms':>10}{'TTLB s':>10}{'MB/s':>10}")
+            with ThreadPoolExecutor(args.workers, thread_name_prefix="bench-readahead") as executor:
+                for depth in args.depth:
+                    store.readahead = ReadAhead(
+                        executor, depth=depth, max_bytes=max(depth, 1) * chunk_size,
+                        trigger=store.READAHEAD_TRIGGER
+                    ) if depth > 0 else None
+                    first, last, total = timed_read(store, file_hash)
+                    assert total == size
+                    print(f"{depth:>6}{first * 1000:>10.1f}{last:>10.2f}{total / last / 1e6:>10.1f}")
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+零拷贝下载基准：大文件（原样存储，不压缩）发往套接字时每 GB 的 CPU 时间与吞吐
+
+三种发送方式，数据都写入本机 socketpair，由另一线程丢弃：
+    decode    open_file 解压路径（读出整块、校验CRC、复制），sock.sendall
+    pread     open_file_for_send 的多块路径（按区间 pread，不解压），sock.sendall
+    sendfile  每个块一个 RegionStream，os.sendfile 直接从页缓存发送（支持 sendfile 的 WSGI 服务器
+              对单块区间的 wsgi.file_wrapper 响应走的就是这条路径）
+CPU 时间只统计发送线程（time.thread_time），预读关闭、块缓存关闭，页缓存是热的。
+
+用法（在 be/ 目录下）:
+    python -m benchmarks.bench_sendfile --size-mb 1024 --chunk-kb 4096 --rounds 3
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+
+from benchmarks.common import bench_app
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.sendfile import RegionStream, sendfile_region
+
+
+class RandomStream:
+    """按段生成随机（不可压缩）数据的流"""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, size=-1):
+        size = min(size if size and size > 0 else self.remaining, self.remaining)
+        self.remaining -= size
+        return os.urandom(size)
+
+
+def drain(sock):
+    buffer = bytearray(1024 * 1024)
+    while sock.recv_into(buffer):
+        pass
+
+
+def send_bytes(sock, stream):
+    total = 0
+    for piece in stream:
+        sock.sendall(piece)
+        total += len(piece)
+    return total
+
+
+def send_regions(sock, store, file_hash):
+    total = 0
+    for _, chunk_offset, chunk_size, _ in store.FileChunkMapping.get_manifest(file_hash):
+        region = store.open_file_for_send(file_hash, chunk_offset, chunk_offset + chunk_size)
+        assert isinstance(region, RegionStream), "块不是原样存储"
+        with region:
+            total += sendfile_region(sock.fileno(), region)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--chunk-kb", type=int, default=4096)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    print(f"{args.size_mb} MB raw, chunk {args.chunk_kb} KB, {args.rounds} rounds")
+
+    with bench_app() as (app, temp_dir):
+        store = DatabaseChunkStore(os.path.join(temp_dir, "store"), chunk_size=args.chunk_kb * 1024)
+        store.chunk_policy = None
+        store.chunk_cache = ChunkCache(0)
+        store.readahead = None
+        try:
+            file_hash = store.store_file_stream(RandomStream(size))['file_hash']
+            modes = {
+                "decode": lambda sock: send_bytes(sock, store.open_file(file_hash)),
+                "pread": lambda sock: send_bytes(sock, store.open_file_for_send(file_hash)),
+                "sendfile": lambda sock: send_regions(sock, store, file_hash),
+            }
+
+            print(f"{'mode':>10}{'MB/s':>10}{'CPU s/GB':>10}")
+            for name, send in modes.items():
+                wall = cpu = 0.0
+                for _ in range(args.rounds):
+                    sender, receiver = socket.socketpair()
+                    reader = threading.Thread(target=drain, args=(receiver,))
+                    reader.start()
+                    start, start_cpu = time.perf_counter(), time.thread_time()
+                    total = send(sender)
+                    cpu += time.thread_time() - start_cpu
+                    wall += time.perf_counter() - start
+                    sender.close()
+                    reader.join()
+                    receiver.close()
+                    assert total == size
+                gb = size * args.rounds / (1024 ** 3)
+                print(f"{name:>10}{size * args.rounds / wall / 1e6:>10.1f}{cpu / gb:>10.3f}")
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""基准脚本公用的测试数据与临时应用"""
+import os
+import random
+from contextlib import contextmanager
+import shutil
+import tempfile
+
+from flask import Flask
+
+from common.db import db
+
+
+_WORDS = [w.encode() for w in (
+    "alpha beta gamma delta epsilon zeta theta kappa lambda sigma omega "
+    "cloud drive chunk store file upload download hash compress"
+).split()]
+
+
+def text_like_bytes(size: int, seed: int = 0) -> bytes:
+    """生成可压缩的类文本数据（压缩率与普通文档接近）"""
+    rng = random.Random(seed)
+    out = bytearray()
+    while len(out) < size:
+        out += b" ".join(rng.choices(_WORDS, k=64)) + rng.randbytes(32) + b"\n"
+    return bytes(out[:size])
+
+
+@contextmanager
+def bench_app():
+    """创建使用临时SQLite文件的应用，并返回 (app, 临时目录)"""
+    temp_dir = tempfile.mkdtemp(prefix="cloud-bench-")
+    app = Flask("bench")
+    app.config.update({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(temp_dir, 'bench.db')}",
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    })
+    db.init_app(app)
+    import models.chunk  # noqa: F401  注册数据表
+    try:
+        with app.app_context():
+            db.create_all()
+            yield app, temp_dir
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
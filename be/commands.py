@@ -0,0 +1,137 @@
+# 块存储的后台维护命令（由 cron / systemd timer 定期调用），例如:
+#   flask --app app chunk-gc --max-batches 100
+#   flask --app app chunk-sweep --dry-run
+#   flask --app app chunk-scrub --max-batches 1000
+#   flask --app app chunk-stats-reconcile
+#   flask --app app chunk-migrate-layout --max-batches 200
+#   flask --app app chunk-delta-stats
+#   flask --app app chunk-tier-migrate --max-batches 50
+#   flask --app app chunk-tier-stats
+#   flask --app app chunk-dict-train
+import json
+
+import click
+
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.storage.local_storage import UPLOAD_DIR
+
+
+def _store():
+    return DatabaseChunkStore(UPLOAD_DIR)
+
+
+def _echo_report(report):
+    click.echo(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+
+
+def register_commands(app):
+    @app.cli.command("chunk-gc")
+    @click.option("--dry-run", is_flag=True, help="只统计可回收的块，不删除")
+    @click.option("--max-batches", type=int, default=None, help="本次最多处理的批数，未完成时下次从断点继续")
+    @click.option("--restart", is_flag=True, help="忽略断点，从头开始")
+    def chunk_gc(dry_run, max_batches, restart):
+        """回收不被任何文件引用的数据块"""
+        store = _store()
+        try:
+            _echo_report(store.collect_garbage(dry_run=dry_run, max_batches=max_batches, resume=not restart))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-sweep")
+    @click.option("--dry-run", is_flag=True, help="只统计孤立文件，不删除")
+    @click.option("--grace-seconds", type=float, default=None, help="宽限期，默认取 ORPHAN_GRACE_SECONDS")
+    def chunk_sweep(dry_run, grace_seconds):
+        """删除数据库中没有记录的块文件"""
+        store = _store()
+        try:
+            _echo_report(store.sweep_orphaned_chunks(grace_seconds=grace_seconds, dry_run=dry_run))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-scrub")
+    @click.option("--repair", is_flag=True, help="修复引用计数，删除损坏/丢失的块")
+    @click.option("--max-batches", type=int, default=None, help="本次最多校验的批数，未完成时下次从断点继续")
+    @click.option("--restart", is_flag=True, help="忽略断点，从头开始")
+    @click.option("--skip-refcounts", is_flag=True, help="不校验引用计数")
+    def chunk_scrub(repair, max_batches, restart, skip_refcounts):
+        """校验块内容与引用计数"""
+        store = _store()
+        try:
+            _echo_report(store.scrub(repair=repair, max_batches=max_batches, resume=not restart,
+                                     check_refcounts=not skip_refcounts))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-migrate-layout")
+    @click.option("--dry-run", is_flag=True, help="只统计待迁移的块，不移动文件")
+    @click.option("--max-batches", type=int, default=None, help="本次最多迁移的批数，未完成时下次从断点继续")
+    @click.option("--restart", is_flag=True, help="忽略断点，从头开始")
+    def chunk_migrate_layout(dry_run, max_batches, restart):
+        """把块文件在线迁移到当前配置的目录布局"""
+        store = _store()
+        try:
+            _echo_report(store.migrate_layout(dry_run=dry_run, max_batches=max_batches, resume=not restart))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-compact")
+    def chunk_compact():
+        """压缩死字节比例过高的包文件"""
+        store = _store()
+        try:
+            _echo_report(store.compact_packs())
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-stats-reconcile")
+    @click.option("--dry-run", is_flag=True, help="只报告偏差，不修正计数器")
+    def chunk_stats_reconcile(dry_run):
+        """全表重新计算存储统计计数器"""
+        store = _store()
+        try:
+            _echo_report(store.reconcile_stats(dry_run=dry_run))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-delta-stats")
+    def chunk_delta_stats():
+        """增量压缩的差分块数、节省的空间与差分链深度"""
+        store = _store()
+        try:
+            _echo_report(store.get_delta_stats())
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-tier-migrate")
+    @click.option("--dry-run", is_flag=True, help="只统计待迁移的块，不上传")
+    @click.option("--max-batches", type=int, default=None, help="本次最多迁移的批数，未完成时下次从断点继续")
+    @click.option("--restart", is_flag=True, help="忽略断点，从头开始")
+    @click.option("--cold-after-seconds", type=float, default=None, help="未读取多久视为冷块，默认取 TIER_COLD_AFTER_SECONDS")
+    def chunk_tier_migrate(dry_run, max_batches, restart, cold_after_seconds):
+        """把长时间未读取的块迁移到对象存储冷层（限速）"""
+        store = _store()
+        try:
+            _echo_report(store.migrate_cold_chunks(dry_run=dry_run, max_batches=max_batches, resume=not restart,
+                                                   cold_after_seconds=cold_after_seconds))
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-tier-stats")
+    def chunk_tier_stats():
+        """本地热层与对象存储冷层的块数与字节数"""
+        store = _store()
+        try:
+            _echo_report(store.get_tier_stats())
+        finally:
+            store.close()
+
+    @app.cli.command("chunk-dict-train")
+    @click.option("--force", is_flag=True, help="不检查距上一版本的间隔 COMPRESSION_DICT_RETRAIN_SECONDS")
+    @click.option("--dry-run", is_flag=True, help="只训练和评估，不发布新版本")
+    def chunk_dict_train(force, dry_run):
+        """从已存储的小块中训练新版本压缩字典，比当前版本压缩得更小时发布"""
+        store = _store()
+        try:
+            _echo_report(store.train_dictionary(force=force, dry_run=dry_run))
+        finally:
+            store.close()
@@ -11,8 +11,114 @@ class Config:
 
     # 存储后端选择：local 或 s3
     STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+    # 块指纹算法：sha256 / blake2b / blake3（需安装 blake3）；改换算法后新块不再与旧算法的块去重，旧块仍可读取和校验
+    CHUNK_FINGERPRINT = os.getenv('CHUNK_FINGERPRINT', 'sha256')
     # 是否启用入库压缩/出库解压
     ENABLE_COMPRESSION = os.getenv('ENABLE_COMPRESSION', 'true').lower() in ('1', 'true', 'yes')
+    # 块压缩算法：none / zlib / gzip / zstd（需安装 zstandard）/ lz4（需安装 lz4）
+    COMPRESSION_CODEC = os.getenv('COMPRESSION_CODEC', 'gzip')
+    # 压缩级别，不设置时使用算法默认值
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL')) if os.getenv('COMPRESSION_LEVEL') else None
+    # 块头部是否记录原始数据CRC32
+    CHUNK_CHECKSUM = os.getenv('CHUNK_CHECKSUM', 'true').lower() in ('1', 'true', 'yes')
+    # 入库前检测不可压缩数据（采样字节熵，已压缩格式魔数可降低熵阈值），命中时跳过压缩
+    SKIP_INCOMPRESSIBLE = os.getenv('SKIP_INCOMPRESSIBLE', 'true').lower() in ('1', 'true', 'yes')
+    INCOMPRESSIBLE_ENTROPY_THRESHOLD = float(os.getenv('INCOMPRESSIBLE_ENTROPY_THRESHOLD', '7.8'))
+    # 小块字典压缩：原始大小不超过 COMPRESSION_DICT_MAX_CHUNK_SIZE 的块使用训练得到的 zstd 字典（需安装 zstandard），
+    # 字典由 flask chunk-dict-train 定期抽样 COMPRESSION_DICT_SAMPLE_CHUNKS 个块重新训练，
+    # 距上一版本不足 COMPRESSION_DICT_RETRAIN_SECONDS 时跳过；各进程每 COMPRESSION_DICT_REFRESH_SECONDS 秒检查新版本
+    COMPRESSION_DICT_ENABLED = os.getenv('COMPRESSION_DICT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    COMPRESSION_DICT_MAX_CHUNK_SIZE = int(os.getenv('COMPRESSION_DICT_MAX_CHUNK_SIZE', str(64 * 1024)))
+    COMPRESSION_DICT_SIZE = int(os.getenv('COMPRESSION_DICT_SIZE', str(112640)))
+    COMPRESSION_DICT_SAMPLE_CHUNKS = int(os.getenv('COMPRESSION_DICT_SAMPLE_CHUNKS', '2000'))
+    COMPRESSION_DICT_RETRAIN_SECONDS = int(os.getenv('COMPRESSION_DICT_RETRAIN_SECONDS', str(24 * 3600)))
+    COMPRESSION_DICT_REFRESH_SECONDS = int(os.getenv('COMPRESSION_DICT_REFRESH_SECONDS', '60'))
+    # 解压后块数据的内存缓存容量（字节），0表示关闭
+    CHUNK_CACHE_BYTES = int(os.getenv('CHUNK_CACHE_BYTES', str(256 * 1024 * 1024)))
+    # 顺序读取预读：预读的块数（0表示关闭）、预读缓冲上限（字节）、预读线程数
+    READAHEAD_CHUNKS = int(os.getenv('READAHEAD_CHUNKS', '4'))
+    READAHEAD_MAX_BYTES = int(os.getenv('READAHEAD_MAX_BYTES', str(64 * 1024 * 1024)))
+    READAHEAD_WORKERS = int(os.getenv('READAHEAD_WORKERS', '4'))
+    # 下载时原样存储（未压缩、非差分）的本地块不经过解压：单块区间交给 wsgi.file_wrapper（服务器 sendfile），
+    # 多块按文件区间直接读取；这些块的CRC32只由巡检校验
+    ZERO_COPY_DOWNLOADS = os.getenv('ZERO_COPY_DOWNLOADS', 'true').lower() in ('1', 'true', 'yes')
+
+    # 块存储分块算法：fixed（固定大小）或 cdc（内容定义分块）
+    CHUNKING_ALGORITHM = os.getenv('CHUNKING_ALGORITHM', 'fixed')
+    # 按文件选择分块参数：大文件自动增大块大小，使每个文件的块数不超过目标值；已压缩格式使用固定分块
+    CHUNK_POLICY_ENABLED = os.getenv('CHUNK_POLICY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CHUNK_POLICY_TARGET_CHUNKS = int(os.getenv('CHUNK_POLICY_TARGET_CHUNKS', '1024'))
+    CHUNK_POLICY_MAX_CHUNK_SIZE = int(os.getenv('CHUNK_POLICY_MAX_CHUNK_SIZE', str(64 * 1024 * 1024)))
+    # CDC最小/最大块大小（字节），0 表示按平均块大小推导
+    CDC_MIN_CHUNK_SIZE = int(os.getenv('CDC_MIN_CHUNK_SIZE', '0')) or None
+    CDC_MAX_CHUNK_SIZE = int(os.getenv('CDC_MAX_CHUNK_SIZE', '0')) or None
+    # 入库时并发哈希+压缩的工作线程数
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+    # 相似块增量压缩：新块与超级特征相同的已有块做差分，差分不超过完整存储大小的 DELTA_MAX_RATIO 时只存差分
+    DELTA_COMPRESSION_ENABLED = os.getenv('DELTA_COMPRESSION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # 差分链最大深度（读取一个块最多还原的差分次数）；参与查找的最小块大小（字节）
+    DELTA_MAX_DEPTH = int(os.getenv('DELTA_MAX_DEPTH', '2'))
+    DELTA_MIN_CHUNK_SIZE = int(os.getenv('DELTA_MIN_CHUNK_SIZE', '4096'))
+    DELTA_MAX_RATIO = float(os.getenv('DELTA_MAX_RATIO', '0.5'))
+
+    # 块哈希内存过滤器（布隆过滤器），确定不存在的块跳过数据库查询
+    CHUNK_FILTER_ENABLED = os.getenv('CHUNK_FILTER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CHUNK_FILTER_ERROR_RATE = float(os.getenv('CHUNK_FILTER_ERROR_RATE', '0.01'))
+    # 删除的块数超过过滤器元素数的该比例时重建
+    CHUNK_FILTER_REBUILD_RATIO = float(os.getenv('CHUNK_FILTER_REBUILD_RATIO', '0.2'))
+
+    # 小块包文件：压缩后小于阈值的块追加写入包文件，而不是每块一个文件
+    PACK_SMALL_CHUNKS = os.getenv('PACK_SMALL_CHUNKS', 'true').lower() in ('1', 'true', 'yes')
+    PACK_CHUNK_THRESHOLD = int(os.getenv('PACK_CHUNK_THRESHOLD', str(512 * 1024)))
+    PACK_MAX_SIZE = int(os.getenv('PACK_MAX_SIZE', str(64 * 1024 * 1024)))
+    # 包压缩：死字节比例阈值；只处理超过该秒数未修改的包
+    PACK_COMPACT_THRESHOLD = float(os.getenv('PACK_COMPACT_THRESHOLD', '0.5'))
+    PACK_COMPACT_MIN_AGE = int(os.getenv('PACK_COMPACT_MIN_AGE', '600'))
+    # 持久写入：块数据在数据库提交前 fsync（批量组提交）；每批最多累计的待同步文件数
+    DURABLE_WRITES = os.getenv('DURABLE_WRITES', 'true').lower() in ('1', 'true', 'yes')
+    DURABLE_SYNC_BATCH = int(os.getenv('DURABLE_SYNC_BATCH', '256'))
+    # 块文件布局：根目录（默认为存储目录下的 .chunks）；分片层数与每层目录名字符数（修改后用 chunk-migrate-layout 迁移）
+    CHUNK_STORE_ROOT = os.getenv('CHUNK_STORE_ROOT') or None
+    CHUNK_LAYOUT_DEPTH = int(os.getenv('CHUNK_LAYOUT_DEPTH', '2'))
+    CHUNK_LAYOUT_WIDTH = int(os.getenv('CHUNK_LAYOUT_WIDTH', '2'))
+    # 布局迁移：每批迁移块数；每秒最多迁移块数（0表示不限制）
+    LAYOUT_MIGRATE_BATCH_SIZE = int(os.getenv('LAYOUT_MIGRATE_BATCH_SIZE', '500'))
+    LAYOUT_MIGRATE_MAX_CHUNKS_PER_SECOND = float(os.getenv('LAYOUT_MIGRATE_MAX_CHUNKS_PER_SECOND', '0'))
+    # 孤立块清理：宽限期内（秒）的文件视为正在写入不删除；并行扫描线程数；数据库哈希每批读取行数
+    ORPHAN_GRACE_SECONDS = int(os.getenv('ORPHAN_GRACE_SECONDS', '3600'))
+    SWEEP_WORKERS = int(os.getenv('SWEEP_WORKERS', str(min(8, os.cpu_count() or 1))))
+    SWEEP_DB_BATCH_SIZE = int(os.getenv('SWEEP_DB_BATCH_SIZE', '10000'))
+    # 垃圾回收：每批回收块数；宽限期（秒）内有更新的块不回收；每秒最多回收块数（0表示不限制）
+    GC_BATCH_SIZE = int(os.getenv('GC_BATCH_SIZE', '1000'))
+    GC_GRACE_SECONDS = int(os.getenv('GC_GRACE_SECONDS', '3600'))
+    GC_MAX_DELETES_PER_SECOND = float(os.getenv('GC_MAX_DELETES_PER_SECOND', '0'))
+    # 完整性校验：并行线程数；读取速率上限（字节/秒，0表示不限制）；每批校验块数（每批保存一次断点）
+    SCRUB_WORKERS = int(os.getenv('SCRUB_WORKERS', str(min(4, os.cpu_count() or 1))))
+    SCRUB_MAX_BYTES_PER_SECOND = float(os.getenv('SCRUB_MAX_BYTES_PER_SECOND', str(50 * 1024 * 1024)))
+    SCRUB_BATCH_SIZE = int(os.getenv('SCRUB_BATCH_SIZE', '256'))
+
+    # 块数据后端：local（本地包文件/块文件）或 s3（每块一个对象，块级去重同样生效）
+    CHUNK_BACKEND = os.getenv('CHUNK_BACKEND', 'local')
+    # 块对象存储：s3 后端的存储位置，也是本地后端的冷层；s3 后端未配置存储桶时使用 S3_BUCKET
+    OBJECT_STORE_BUCKET = os.getenv('OBJECT_STORE_BUCKET', '')
+    OBJECT_STORE_PREFIX = os.getenv('OBJECT_STORE_PREFIX', 'chunks/')
+    OBJECT_STORE_ENDPOINT_URL = os.getenv('OBJECT_STORE_ENDPOINT_URL') or None
+    # 同时进行的对象存储请求数上限（PUT/GET/批量删除）
+    OBJECT_STORE_MAX_CONCURRENCY = int(os.getenv('OBJECT_STORE_MAX_CONCURRENCY', '16'))
+    # 冷热分层（本地后端且配置了 OBJECT_STORE_BUCKET 时）：长时间未读取的块迁移到对象存储，读取冷层块时写回本地
+    # 超过该秒数未读取（且未被新上传引用）的块迁移到冷层；读取冷层块时是否提升回本地
+    TIER_COLD_AFTER_SECONDS = int(os.getenv('TIER_COLD_AFTER_SECONDS', str(30 * 24 * 3600)))
+    TIER_PROMOTE_ON_READ = os.getenv('TIER_PROMOTE_ON_READ', 'true').lower() in ('1', 'true', 'yes')
+    # 待提升块的内存缓冲上限（字节）
+    TIER_PROMOTE_MAX_BYTES = int(os.getenv('TIER_PROMOTE_MAX_BYTES', str(64 * 1024 * 1024)))
+    # 访问时间批量写入：距上次写入的秒数或缓冲条数达到任一阈值时写入
+    ACCESS_FLUSH_INTERVAL = float(os.getenv('ACCESS_FLUSH_INTERVAL', '30'))
+    ACCESS_FLUSH_BATCH = int(os.getenv('ACCESS_FLUSH_BATCH', '1000'))
+    # 冷层迁移：每批迁移块数；上传速率上限（字节/秒，0表示不限制）；并行上传线程数
+    TIER_MIGRATE_BATCH_SIZE = int(os.getenv('TIER_MIGRATE_BATCH_SIZE', '200'))
+    TIER_MIGRATE_MAX_BYTES_PER_SECOND = float(os.getenv('TIER_MIGRATE_MAX_BYTES_PER_SECOND', str(20 * 1024 * 1024)))
+    TIER_MIGRATE_WORKERS = int(os.getenv('TIER_MIGRATE_WORKERS', '4'))
 
     # S3 / MinIO
     AWS_ACCESS_KEY = os.getenv('AWS_ACCESS_KEY', 'test-key')
@@ -1,6 +1,16 @@
+import json
 from models.base import BaseModel
 from common.db import db
-from sqlalchemy import func, Index
+from sqlalchemy import func, Index, insert, update, bindparam, DDL, event, or_, case
+
+
+def _upsert(table):
+    """按当前数据库方言构造支持 ON CONFLICT 的 INSERT 语句"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
 
 
 class Chunk(BaseModel):
@@ -50,6 +60,66 @@ class Chunk(BaseModel):
             db.session.commit()
         return chunk.ref_count
 
+    @classmethod
+    def find_existing(cls, chunk_hashes) -> set:
+        """一次 IN 查询返回已存在的块哈希集合"""
+        chunk_hashes = list(set(chunk_hashes))
+        if not chunk_hashes:
+            return set()
+        rows = db.session.query(cls.chunk_hash).filter(cls.chunk_hash.in_(chunk_hashes)).all()
+        return {row.chunk_hash for row in rows}
+
+    @classmethod
+    def upsert_refs(cls, chunks: list, commit: bool = True):
+        """批量插入缺失的块并增加引用计数
+        
+        INSERT ... ON CONFLICT(chunk_hash) DO UPDATE SET ref_count = ref_count + excluded.ref_count
+        
+        Args:
+            chunks: [{'chunk_hash': str, 'chunk_size': int, 'storage_path': str,
+                      'compressed_size': int, 'ref_count': int}, ...]
+                    ref_count 为本次要增加的引用数；块已存在时只累加引用计数
+        """
+        if chunks:
+            stmt = _upsert(cls.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.__table__.c.chunk_hash],
+                set_={
+                    'ref_count': cls.__table__.c.ref_count + stmt.excluded.ref_count,
+                    'updated_at': func.now(),
+                }
+            )
+            db.session.execute(stmt, chunks)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def add_refs(cls, ref_deltas: dict, commit: bool = True):
+        """批量调整已存在块的引用计数 {chunk_hash: delta}"""
+        if ref_deltas:
+            stmt = (
+                update(cls.__table__)
+                .where(cls.__table__.c.chunk_hash == bindparam('b_chunk_hash'))
+                .values(ref_count=cls.__table__.c.ref_count + bindparam('b_delta'))
+            )
+            db.session.execute(stmt, [
+                {'b_chunk_hash': chunk_hash, 'b_delta': delta}
+                for chunk_hash, delta in ref_deltas.items()
+            ])
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def touch(cls, chunk_hashes) -> set:
+        """更新块的 updated_at（宽限期内不被垃圾回收），返回仍然存在的块哈希集合（不提交）"""
+        chunk_hashes = list(set(chunk_hashes))
+        if not chunk_hashes:
+            return set()
+        cls.query.filter(cls.chunk_hash.in_(chunk_hashes)).update(
+            {'updated_at': func.now()}, synchronize_session=False
+        )
+        return cls.find_existing(chunk_hashes)
+
     @classmethod
     def decrement_ref(cls, chunk_hash: str):
         """减少引用计数，返回新的计数值，如果为0则删除记录"""
@@ -80,9 +150,35 @@ class Chunk(BaseModel):
         """检查数据块是否存在"""
         return cls.query.filter_by(chunk_hash=chunk_hash).first() is not None
 
+    @classmethod
+    def iter_hashes(cls, batch_size: int = 10000, after: str = ""):
+        """
+        按哈希升序分批产出所有块哈希（键集分页，每批一次查询，不一次性加载整表）
+        
+        Args:
+            batch_size: 每批查询的行数
+            after: 只产出大于该值的哈希（用于断点续扫）
+        """
+        while True:
+            batch = [
+                row[0] for row in db.session.query(cls.chunk_hash)
+                .filter(cls.chunk_hash > after)
+                .order_by(cls.chunk_hash)
+                .limit(batch_size)
+            ]
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
     @classmethod
     def get_storage_stats(cls):
-        """获取存储统计信息"""
+        """获取存储统计信息（读取计数器表，O(1)）"""
+        return StorageCounters.snapshot()
+
+    @classmethod
+    def compute_storage_stats(cls):
+        """全表聚合重新计算存储统计信息（用于校对计数器）"""
         result = db.session.query(
             func.count(cls.id).label('total_chunks'),
             func.sum(cls.ref_count).label('total_refs'),
@@ -119,51 +215,99 @@ class FileChunkMapping(BaseModel):
     )
 
     @classmethod
-    def create_mapping(cls, file_hash: str, chunk_mappings: list):
+    def create_mapping(cls, file_hash: str, chunk_mappings: list, commit: bool = True):
         """创建文件-块映射关系
         
         Args:
             file_hash: 文件哈希
             chunk_mappings: 块映射列表 [{'chunk_hash': str, 'chunk_index': int, 'chunk_offset': int, 'chunk_size': int}, ...]
+            commit: 是否立即提交（入库时与块引用计数放在同一事务中提交）
         """
         # 先删除现有映射
         cls.query.filter_by(file_hash=file_hash).delete()
         
-        # 创建新映射
-        for mapping in chunk_mappings:
-            file_chunk = cls(
-                file_hash=file_hash,
-                chunk_hash=mapping['chunk_hash'],
-                chunk_index=mapping['chunk_index'],
-                chunk_offset=mapping['chunk_offset'],
-                chunk_size=mapping['chunk_size']
+        # 批量创建新映射
+        if chunk_mappings:
+            db.session.execute(
+                insert(cls.__table__),
+                [dict(mapping, file_hash=file_hash) for mapping in chunk_mappings]
             )
-            db.session.add(file_chunk)
         
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
     @classmethod
     def get_file_chunks(cls, file_hash: str):
         """获取文件的所有数据块信息，按顺序排列"""
         return cls.query.filter_by(file_hash=file_hash).order_by(cls.chunk_index).all()
 
+    @classmethod
+    def get_manifest(cls, file_hash: str, start: int = None, end: int = None):
+        """
+        获取文件的块清单（连同块的存储位置一次查出），按顺序排列
+        
+        Args:
+            start, end: 只返回与字节区间 [start, end) 重叠的块，默认整个文件
+            
+        Returns:
+            list: [(chunk_hash, chunk_offset, chunk_size, storage_path), ...]
+        """
+        query = db.session.query(
+            cls.chunk_hash, cls.chunk_offset, cls.chunk_size, Chunk.storage_path
+        ).outerjoin(Chunk, Chunk.chunk_hash == cls.chunk_hash).filter(cls.file_hash == file_hash)
+        if start is not None:
+            query = query.filter(cls.chunk_offset + cls.chunk_size > start)
+        if end is not None:
+            query = query.filter(cls.chunk_offset < end)
+        return query.order_by(cls.chunk_index).all()
+
+    @classmethod
+    def get_file_size(cls, file_hash: str):
+        """文件总大小（不加载映射行），文件不存在时返回None"""
+        count, total = db.session.query(
+            func.count(cls.id), func.sum(cls.chunk_size)
+        ).filter(cls.file_hash == file_hash).one()
+        return int(total or 0) if count else None
+
     @classmethod
     def get_chunk_files(cls, chunk_hash: str):
         """获取使用某个数据块的所有文件"""
         return cls.query.filter_by(chunk_hash=chunk_hash).all()
 
     @classmethod
-    def delete_file_mapping(cls, file_hash: str):
-        """删除文件的所有块映射"""
-        mappings = cls.query.filter_by(file_hash=file_hash).all()
-        chunk_hashes = [m.chunk_hash for m in mappings]
+    def delete_file_mapping(cls, file_hash: str, commit: bool = True):
+        """删除文件的所有块映射
+        
+        Args:
+            commit: 是否立即提交（删除文件时与引用计数递减放在同一事务中提交）
+        """
+        chunk_hashes = [
+            row[0] for row in db.session.query(cls.chunk_hash).filter_by(file_hash=file_hash)
+        ]
         
         # 删除映射记录
         cls.query.filter_by(file_hash=file_hash).delete()
-        db.session.commit()
+        if commit:
+            db.session.commit()
         
         return chunk_hashes  # 返回需要减少引用计数的块哈希列表
 
+    @classmethod
+    def iter_chunk_hashes(cls, batch_size: int = 10000, after: str = ""):
+        """按哈希升序分批产出被任意文件引用的块哈希（去重，键集分页）"""
+        while True:
+            batch = [
+                row[0] for row in db.session.query(cls.chunk_hash)
+                .filter(cls.chunk_hash > after)
+                .distinct()
+                .order_by(cls.chunk_hash)
+                .limit(batch_size)
+            ]
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
     @classmethod
     def get_file_info(cls, file_hash: str):
         """获取文件信息摘要"""
@@ -191,3 +335,605 @@ class FileChunkMapping(BaseModel):
 
     def __repr__(self):
         return f'<FileChunkMapping file={self.file_hash[:8]}... chunk={self.chunk_hash[:8]}... index={self.chunk_index}>'
+
+
+class FileManifest(BaseModel):
+    """文件清单头 - 记录文件入库时使用的分块参数（块列表见 FileChunkMapping）"""
+    __tablename__ = 'file_manifests'
+
+    file_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # 文件的整体哈希
+    total_size = db.Column(db.BigInteger, nullable=False)  # 文件大小
+    chunk_count = db.Column(db.Integer, nullable=False)  # 块数
+    chunking = db.Column(db.Text)  # 分块参数（JSON），如 {"algorithm": "cdc", "avg_size": ...}
+
+    @classmethod
+    def save(cls, file_hash: str, total_size: int, chunk_count: int, chunking: dict, commit: bool = True):
+        """写入或覆盖清单头（入库时与文件-块映射在同一事务中提交）"""
+        stmt = _upsert(cls.__table__)
+        values = {'file_hash': file_hash, 'total_size': total_size, 'chunk_count': chunk_count,
+                  'chunking': json.dumps(chunking, sort_keys=True)}
+        stmt = stmt.values(**values).on_conflict_do_update(
+            index_elements=[cls.__table__.c.file_hash],
+            set_=dict(values, updated_at=func.now())
+        )
+        db.session.execute(stmt)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def get_chunking(cls, file_hash: str):
+        """返回文件的分块参数，旧数据没有清单头时返回 None"""
+        chunking = db.session.query(cls.chunking).filter_by(file_hash=file_hash).scalar()
+        return json.loads(chunking) if chunking else None
+
+    @classmethod
+    def delete_manifest(cls, file_hash: str, commit: bool = True):
+        cls.query.filter_by(file_hash=file_hash).delete(synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<FileManifest {self.file_hash[:8]}... chunks={self.chunk_count}>'
+
+
+class ChunkSketch(BaseModel):
+    """数据块的相似度特征（超级特征）- 为新块查找内容相近的基准块"""
+    __tablename__ = 'chunk_sketches'
+
+    chunk_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # 数据块哈希
+    sf0 = db.Column(db.Integer, nullable=False, index=True)  # 超级特征
+    sf1 = db.Column(db.Integer, nullable=False, index=True)
+    sf2 = db.Column(db.Integer, nullable=False, index=True)
+
+    @classmethod
+    def save_many(cls, rows: list, commit: bool = True):
+        """批量写入特征 [{'chunk_hash', 'sf0', 'sf1', 'sf2'}, ...]（已存在的块忽略）"""
+        if rows:
+            stmt = _upsert(cls.__table__).on_conflict_do_nothing(index_elements=[cls.__table__.c.chunk_hash])
+            db.session.execute(stmt, rows)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def find_similar(cls, sketches: list, max_depth: int, limit: int = 1000):
+        """
+        一次查询找出与任一特征组有相同超级特征（同一位置）的已有块
+
+        Args:
+            sketches: [(sf0, sf1, sf2), ...]
+            max_depth: 只返回差分深度小于该值的块（以它为基准的新块深度不超过 max_depth）
+            limit: 最多返回的行数
+
+        Returns:
+            list: [(chunk_hash, sf0, sf1, sf2, depth, storage_path), ...]
+        """
+        if not sketches:
+            return []
+        columns = (cls.sf0, cls.sf1, cls.sf2)
+        depth = func.coalesce(ChunkDelta.depth, 0)
+        return db.session.query(
+            cls.chunk_hash, cls.sf0, cls.sf1, cls.sf2, depth.label('depth'), Chunk.storage_path
+        ).join(Chunk, Chunk.chunk_hash == cls.chunk_hash).outerjoin(
+            ChunkDelta, ChunkDelta.chunk_hash == cls.chunk_hash
+        ).filter(
+            or_(*(column.in_({sketch[i] for sketch in sketches}) for i, column in enumerate(columns))),
+            depth < max_depth
+        ).limit(limit).all()
+
+    @classmethod
+    def delete_for(cls, chunk_hashes: list, commit: bool = True):
+        if chunk_hashes:
+            cls.query.filter(cls.chunk_hash.in_(chunk_hashes)).delete(synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<ChunkSketch {self.chunk_hash[:8]}...>'
+
+
+class ChunkDelta(BaseModel):
+    """以差分存储的数据块 - 块数据是相对基准块的差分，基准块在被引用期间不会被回收"""
+    __tablename__ = 'chunk_deltas'
+
+    chunk_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # 数据块哈希
+    base_hash = db.Column(db.String(64), nullable=False, index=True)  # 基准块哈希
+    depth = db.Column(db.Integer, nullable=False, default=1)  # 差分链深度（基准块为完整块时为1）
+    full_size = db.Column(db.Integer, nullable=False)  # 完整存储时的大小（压缩后）
+    delta_size = db.Column(db.Integer, nullable=False)  # 实际存储的差分大小（压缩后）
+
+    @classmethod
+    def save_many(cls, rows: list, commit: bool = True):
+        """批量记录差分块 [{'chunk_hash', 'base_hash', 'depth', 'full_size', 'delta_size'}, ...]"""
+        if rows:
+            stmt = _upsert(cls.__table__).on_conflict_do_nothing(index_elements=[cls.__table__.c.chunk_hash])
+            db.session.execute(stmt, rows)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def base_of(cls, chunk_hashes: list) -> dict:
+        """{差分块哈希: 基准块哈希}"""
+        if not chunk_hashes:
+            return {}
+        rows = db.session.query(cls.chunk_hash, cls.base_hash).filter(cls.chunk_hash.in_(chunk_hashes))
+        return {row.chunk_hash: row.base_hash for row in rows}
+
+    @classmethod
+    def is_base(cls, chunk_hash: str) -> bool:
+        """是否有差分块以该块为基准"""
+        return db.session.query(cls.id).filter_by(base_hash=chunk_hash).first() is not None
+
+    @classmethod
+    def iter_base_hashes(cls, batch_size: int = 10000, after: str = ""):
+        """按哈希升序分批产出被差分块引用的基准块哈希（去重，键集分页）"""
+        while True:
+            batch = [
+                row[0] for row in db.session.query(cls.base_hash)
+                .filter(cls.base_hash > after)
+                .distinct()
+                .order_by(cls.base_hash)
+                .limit(batch_size)
+            ]
+            yield from batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]
+
+    @classmethod
+    def delete_for(cls, chunk_hashes: list, commit: bool = True):
+        if chunk_hashes:
+            cls.query.filter(cls.chunk_hash.in_(chunk_hashes)).delete(synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def summary(cls) -> dict:
+        """差分块的数量、存储字节数、完整存储所需字节数与最大深度"""
+        result = db.session.query(
+            func.count(cls.id), func.sum(cls.delta_size), func.sum(cls.full_size), func.max(cls.depth)
+        ).one()
+        delta_bytes, full_bytes = int(result[1] or 0), int(result[2] or 0)
+        return {
+            'delta_chunks': result[0] or 0,
+            'delta_bytes': delta_bytes,
+            'full_bytes': full_bytes,
+            'saved_bytes': full_bytes - delta_bytes,
+            'max_depth': result[3] or 0,
+        }
+
+    def __repr__(self):
+        return f'<ChunkDelta {self.chunk_hash[:8]}... base={self.base_hash[:8]}... depth={self.depth}>'
+
+
+class ChunkAccess(BaseModel):
+    """数据块的最近读取时间 - 冷热分层据此把长时间未读取的块迁移到对象存储（读取时批量写入）"""
+    __tablename__ = 'chunk_access'
+
+    chunk_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # 数据块哈希
+    accessed_at = db.Column(db.DateTime, nullable=False, index=True)  # 最近读取时间（UTC）
+
+    @classmethod
+    def record_many(cls, accessed: dict, commit: bool = True):
+        """批量写入 {块哈希: 读取时间}（已有记录时更新为较新的时间）"""
+        if accessed:
+            table = cls.__table__
+            stmt = _upsert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.chunk_hash],
+                set_={'accessed_at': case(
+                    (stmt.excluded.accessed_at > table.c.accessed_at, stmt.excluded.accessed_at),
+                    else_=table.c.accessed_at
+                )}
+            )
+            db.session.execute(stmt, [
+                {'chunk_hash': chunk_hash, 'accessed_at': accessed_at}
+                for chunk_hash, accessed_at in accessed.items()
+            ])
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def delete_for(cls, chunk_hashes: list, commit: bool = True):
+        if chunk_hashes:
+            cls.query.filter(cls.chunk_hash.in_(chunk_hashes)).delete(synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<ChunkAccess {self.chunk_hash[:8]}... at={self.accessed_at}>'
+
+
+class ChunkFingerprint(BaseModel):
+    """数据块的指纹算法 - 块哈希不是 sha256 计算的块才有记录（没有记录的块为 sha256），校验时按块各自的算法重算"""
+    __tablename__ = 'chunk_fingerprints'
+
+    chunk_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # 数据块哈希
+    algorithm = db.Column(db.String(16), nullable=False)  # 指纹算法名（blake2b / blake3）
+
+    @classmethod
+    def save_many(cls, chunk_hashes, algorithm: str, commit: bool = True):
+        """批量记录块的指纹算法（已有记录的块忽略）"""
+        rows = [{'chunk_hash': chunk_hash, 'algorithm': algorithm} for chunk_hash in chunk_hashes]
+        if rows:
+            stmt = _upsert(cls.__table__).on_conflict_do_nothing(index_elements=[cls.__table__.c.chunk_hash])
+            db.session.execute(stmt, rows)
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def algorithms_of(cls, chunk_hashes: list) -> dict:
+        """{块哈希: 指纹算法}，只包含有记录（非 sha256）的块"""
+        if not chunk_hashes:
+            return {}
+        rows = db.session.query(cls.chunk_hash, cls.algorithm).filter(cls.chunk_hash.in_(chunk_hashes))
+        return {row.chunk_hash: row.algorithm for row in rows}
+
+    @classmethod
+    def delete_for(cls, chunk_hashes: list, commit: bool = True):
+        if chunk_hashes:
+            cls.query.filter(cls.chunk_hash.in_(chunk_hashes)).delete(synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<ChunkFingerprint {self.chunk_hash[:8]}... {self.algorithm}>'
+
+
+class ChunkDictionary(BaseModel):
+    """压缩字典 - 从已存储的小块中训练的 zstd 字典；id 即字典版本（写入块的封装头部），发布后不修改、不删除"""
+    __tablename__ = 'chunk_dictionaries'
+
+    codec = db.Column(db.String(16), nullable=False, default='zstd')  # 字典所属的压缩算法
+    data = db.Column(db.LargeBinary, nullable=False)  # 字典内容
+    sample_chunks = db.Column(db.Integer, nullable=False)  # 训练样本块数
+    sample_bytes = db.Column(db.BigInteger, nullable=False)  # 训练样本字节数
+    holdout_ratio = db.Column(db.Float)  # 留出样本上使用该字典的压缩率（压缩后/原始）
+
+    @classmethod
+    def latest(cls):
+        return cls.query.order_by(cls.id.desc()).first()
+
+    @classmethod
+    def latest_id(cls):
+        return db.session.query(func.max(cls.id)).scalar()
+
+    @classmethod
+    def load_many(cls, dict_ids=None) -> dict:
+        """返回 {字典id: 字典内容}，dict_ids 为空时返回全部版本"""
+        query = db.session.query(cls.id, cls.data)
+        if dict_ids is not None:
+            query = query.filter(cls.id.in_(list(dict_ids)))
+        return {row.id: bytes(row.data) for row in query}
+
+    @classmethod
+    def publish(cls, data: bytes, sample_chunks: int, sample_bytes: int, holdout_ratio: float = None,
+                commit: bool = True) -> int:
+        """保存新版本字典，返回字典id"""
+        row = cls(codec='zstd', data=data, sample_chunks=sample_chunks, sample_bytes=sample_bytes,
+                  holdout_ratio=holdout_ratio)
+        db.session.add(row)
+        db.session.flush()
+        if commit:
+            db.session.commit()
+        return row.id
+
+    def __repr__(self):
+        return f'<ChunkDictionary v{self.id} {len(self.data or b"")} bytes>'
+
+
+class MaintenanceCheckpoint(BaseModel):
+    """后台维护任务（垃圾回收、校验等）的断点，任务中断后从 cursor 之后继续"""
+    __tablename__ = 'maintenance_checkpoints'
+
+    task = db.Column(db.String(64), unique=True, nullable=False)  # 任务名
+    cursor = db.Column(db.String(128), nullable=False, default='')  # 已处理到的位置（如块哈希）
+    stats = db.Column(db.Text)  # 本轮累计统计（JSON）
+
+    @classmethod
+    def load(cls, task: str):
+        """返回 (cursor, stats字典)，没有断点时返回 ('', {})"""
+        checkpoint = cls.query.filter_by(task=task).first()
+        if checkpoint is None:
+            return '', {}
+        return checkpoint.cursor, json.loads(checkpoint.stats or '{}')
+
+    @classmethod
+    def save(cls, task: str, cursor: str, stats: dict = None, commit: bool = True):
+        """保存断点（可与任务本身的修改放在同一事务中）"""
+        checkpoint = cls.query.filter_by(task=task).first()
+        if checkpoint is None:
+            checkpoint = cls(task=task)
+            db.session.add(checkpoint)
+        checkpoint.cursor = cursor
+        checkpoint.stats = json.dumps(stats or {})
+        if commit:
+            db.session.commit()
+
+    @classmethod
+    def clear(cls, task: str, commit: bool = True):
+        cls.query.filter_by(task=task).delete()
+        if commit:
+            db.session.commit()
+
+    def __repr__(self):
+        return f'<MaintenanceCheckpoint {self.task} cursor={self.cursor[:8]}>'
+
+
+class ChunkRemovalEpoch(BaseModel):
+    """
+    块数据删除纪元（单行表）
+    - 删除独立块文件/对象存储中的块数据前在同一事务中加一，持有该行的锁直到删除完成后提交
+    - 这些位置由块哈希决定，块记录删除之后并发上传可能在同一位置重新写入该块：
+      上传提交时纪元与开始时不同，说明期间有删除，按 ChunkRemoval 中的记录判断本次写入的块是否被删除
+    """
+    __tablename__ = 'chunk_removal_epoch'
+
+    ROW_ID = 1
+
+    epoch = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def current(cls, lock: bool = False) -> int:
+        """读取当前纪元；lock 时加共享锁（PostgreSQL），与进行中的删除互斥"""
+        query = db.session.query(cls.epoch).filter(cls.id == cls.ROW_ID)
+        if lock:
+            query = query.with_for_update(read=True)
+        return query.scalar() or 0
+
+    @classmethod
+    def advance(cls) -> int:
+        """纪元加一（不提交），返回新的纪元"""
+        stmt = _upsert(cls.__table__).values(id=cls.ROW_ID, epoch=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.__table__.c.id],
+            set_={'epoch': cls.__table__.c.epoch + 1, 'updated_at': func.now()}
+        )
+        db.session.execute(stmt)
+        return cls.current()
+
+    def __repr__(self):
+        return f'<ChunkRemovalEpoch {self.epoch}>'
+
+
+class ChunkRemoval(BaseModel):
+    """
+    块数据删除记录 - 推进删除纪元的事务中记下要删除数据的块，提交时纪元有变化的上传据此判断自己写入的块
+    是否被删除（不需要向后端确认存在性，对象存储不发 HEAD 请求）；只保留最近 RETAIN_EPOCHS 个纪元
+    """
+    __tablename__ = 'chunk_removals'
+
+    RETAIN_EPOCHS = 1000
+
+    epoch = db.Column(db.BigInteger, nullable=False, index=True)
+    chunk_hash = db.Column(db.String(64), nullable=False)
+
+    @classmethod
+    def record(cls, epoch: int, chunk_hashes):
+        """记录本纪元删除数据的块，并清理过期的记录（不提交）"""
+        rows = [{'epoch': epoch, 'chunk_hash': chunk_hash} for chunk_hash in set(chunk_hashes)]
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+        cls.query.filter(cls.epoch <= epoch - cls.RETAIN_EPOCHS).delete(synchronize_session=False)
+
+    @classmethod
+    def removed_since(cls, epoch: int, current: int, chunk_hashes) -> set:
+        """纪元 epoch 之后被删除数据的块（限 chunk_hashes）；记录已清理时无法判断，视为全部被删除"""
+        chunk_hashes = set(chunk_hashes)
+        if not chunk_hashes or current - epoch >= cls.RETAIN_EPOCHS:
+            return chunk_hashes
+        return {row[0] for row in db.session.query(cls.chunk_hash).filter(
+            cls.epoch > epoch, cls.chunk_hash.in_(chunk_hashes)
+        )}
+
+    def __repr__(self):
+        return f'<ChunkRemoval {self.epoch} {self.chunk_hash}>'
+
+
+class StorageCounters(BaseModel):
+    """
+    存储统计计数器（STRIPES 行，读取时求和）
+    - 由 chunks / file_chunk_mappings 上的数据库触发器维护，与块、映射的修改在同一事务中生效
+    - PostgreSQL 使用语句级触发器（按转换表聚合，每条语句一次 UPDATE），并按连接的后端进程号
+      分散到不同的行，并发上传不会在同一行锁上排队；SQLite 同一时刻只有一个写事务，逐行更新第 ROW_ID 行
+    - 文件数按 chunk_index = 0 的映射行计数（每个非空文件恰好一行）
+    - 建表时按现有数据初始化第 ROW_ID 行；计数出现偏差时用 reconcile() 从头重新计算
+    """
+    __tablename__ = 'storage_counters'
+
+    ROW_ID = 1
+    STRIPES = 16
+    FIELDS = ('total_chunks', 'total_refs', 'total_size', 'total_compressed_size', 'total_files')
+
+    total_chunks = db.Column(db.BigInteger, nullable=False, default=0)  # 块数
+    total_refs = db.Column(db.BigInteger, nullable=False, default=0)  # 引用总数
+    total_size = db.Column(db.BigInteger, nullable=False, default=0)  # 原始字节数
+    total_compressed_size = db.Column(db.BigInteger, nullable=False, default=0)  # 存储字节数
+    total_files = db.Column(db.BigInteger, nullable=False, default=0)  # 不同文件数
+
+    @staticmethod
+    def _with_ratio(stats: dict) -> dict:
+        stats['compression_ratio'] = (stats['total_compressed_size'] / stats['total_size']) if stats['total_size'] else 0
+        return stats
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """读取当前计数（各行之和）"""
+        row = db.session.query(*(func.sum(getattr(cls, name)) for name in cls.FIELDS)).one()
+        return cls._with_ratio({name: int(row[i] or 0) for i, name in enumerate(cls.FIELDS)})
+
+    @classmethod
+    def compute(cls) -> dict:
+        """全表聚合计算真实值"""
+        stats = Chunk.compute_storage_stats()
+        stats['total_files'] = db.session.query(func.count(func.distinct(FileChunkMapping.file_hash))).scalar() or 0
+        return stats
+
+    @classmethod
+    def reconcile(cls, dry_run: bool = False) -> dict:
+        """
+        从头重新计算计数并覆盖计数器，返回偏差
+
+        Returns:
+            Dict: {'before', 'after', 'drift': {字段: 真实值 - 计数值}, 'repaired'}
+        """
+        try:
+            before = cls.snapshot()
+            actual = cls.compute()
+            drift = {name: actual[name] - before[name] for name in cls.FIELDS if actual[name] != before[name]}
+            if drift and not dry_run:
+                # 真实值写入第 ROW_ID 行，其余行清零（缺少的行补齐）
+                for stripe in range(1, cls.STRIPES + 1):
+                    row = db.session.get(cls, stripe)
+                    if row is None:
+                        row = cls(id=stripe)
+                        db.session.add(row)
+                    for name in cls.FIELDS:
+                        setattr(row, name, actual[name] if stripe == cls.ROW_ID else 0)
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {'before': before, 'after': actual, 'drift': drift, 'repaired': bool(drift) and not dry_run}
+
+    def __repr__(self):
+        return f'<StorageCounters chunks={self.total_chunks} files={self.total_files}>'
+
+
+# 计数器表依赖块表和映射表：建表时用现有数据初始化，再在两张表上安装触发器
+StorageCounters.__table__.add_is_dependent_on(Chunk.__table__)
+StorageCounters.__table__.add_is_dependent_on(FileChunkMapping.__table__)
+
+_SEED_COUNTERS = DDL(
+    "INSERT INTO storage_counters "
+    "(id, total_chunks, total_refs, total_size, total_compressed_size, total_files) "
+    "SELECT 1, COUNT(*), COALESCE(SUM(ref_count), 0), COALESCE(SUM(chunk_size), 0), "
+    "COALESCE(SUM(compressed_size), 0), "
+    "(SELECT COUNT(DISTINCT file_hash) FROM file_chunk_mappings) FROM chunks"
+)
+_SEED_STRIPES = DDL(
+    "INSERT INTO storage_counters "
+    "(id, total_chunks, total_refs, total_size, total_compressed_size, total_files) VALUES "
+    + ", ".join(f"({stripe}, 0, 0, 0, 0, 0)" for stripe in range(2, StorageCounters.STRIPES + 1))
+)
+
+_CHUNK_COLUMNS = (
+    ('total_refs', '{row}.ref_count'),
+    ('total_size', '{row}.chunk_size'),
+    ('total_compressed_size', 'COALESCE({row}.compressed_size, 0)'),
+)
+
+
+def _chunk_delta(add: str = None, subtract: str = None) -> str:
+    """生成计数器的 SET 子句：加上 add 行、减去 subtract 行的各列值（每列只赋值一次）"""
+    assignments = []
+    for counter, column in _CHUNK_COLUMNS:
+        expr = counter
+        if add:
+            expr += ' + ' + column.format(row=add)
+        if subtract:
+            expr += ' - ' + column.format(row=subtract)
+        assignments.append(f'{counter} = {expr}')
+    return ', '.join(assignments)
+
+
+_SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_chunks_counters_insert AFTER INSERT ON chunks
+    BEGIN
+        UPDATE storage_counters SET total_chunks = total_chunks + 1, {_chunk_delta('NEW')} WHERE id = 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_chunks_counters_update
+    AFTER UPDATE OF ref_count, chunk_size, compressed_size ON chunks
+    BEGIN
+        UPDATE storage_counters SET {_chunk_delta('NEW', 'OLD')} WHERE id = 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_chunks_counters_delete AFTER DELETE ON chunks
+    BEGIN
+        UPDATE storage_counters SET total_chunks = total_chunks - 1, {_chunk_delta(subtract='OLD')} WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_mappings_counters_insert AFTER INSERT ON file_chunk_mappings
+    WHEN NEW.chunk_index = 0
+    BEGIN
+        UPDATE storage_counters SET total_files = total_files + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_mappings_counters_delete AFTER DELETE ON file_chunk_mappings
+    WHEN OLD.chunk_index = 0
+    BEGIN
+        UPDATE storage_counters SET total_files = total_files - 1 WHERE id = 1;
+    END""",
+]
+
+# PostgreSQL：语句级触发器按转换表（new_rows / old_rows）聚合整条语句的增量，只更新当前连接对应的一行
+_PG_STRIPE = f"1 + pg_backend_pid() % {StorageCounters.STRIPES}"
+
+
+def _pg_chunk_update(*tables: str) -> str:
+    """把转换表中的块行带符号（新行 +1、旧行 -1）汇总后加到计数器上"""
+    rows = ' UNION ALL '.join(
+        f"SELECT {1 if table == 'new_rows' else -1} AS s, ref_count, chunk_size, compressed_size FROM {table}"
+        for table in tables
+    )
+    return f"""UPDATE storage_counters SET total_chunks = total_chunks + d.chunks, total_refs = total_refs + d.refs,
+                total_size = total_size + d.size, total_compressed_size = total_compressed_size + d.compressed
+            FROM (SELECT COUNT(*) AS n, COALESCE(SUM(s), 0) AS chunks, COALESCE(SUM(s * ref_count), 0) AS refs,
+                         COALESCE(SUM(s * chunk_size), 0) AS size,
+                         COALESCE(SUM(s * COALESCE(compressed_size, 0)), 0) AS compressed
+                  FROM ({rows}) t) d
+            WHERE storage_counters.id = {_PG_STRIPE} AND d.n > 0"""
+
+
+def _pg_mapping_update(table: str, sign: str) -> str:
+    return f"""UPDATE storage_counters SET total_files = total_files {sign} d.files
+            FROM (SELECT COUNT(*) AS files FROM {table} WHERE chunk_index = 0) d
+            WHERE storage_counters.id = {_PG_STRIPE} AND d.files > 0"""
+
+
+# 带转换表的触发器不能指定更新的列，且每种事件各建一个
+_POSTGRES_TRIGGERS = [
+    f"""CREATE OR REPLACE FUNCTION storage_counters_chunks() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_pg_chunk_update('new_rows')};
+        ELSIF TG_OP = 'UPDATE' THEN
+            {_pg_chunk_update('new_rows', 'old_rows')};
+        ELSE
+            {_pg_chunk_update('old_rows')};
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    f"""CREATE OR REPLACE FUNCTION storage_counters_mappings() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {_pg_mapping_update('new_rows', '+')};
+        ELSE
+            {_pg_mapping_update('old_rows', '-')};
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS trg_chunks_counters_insert ON chunks",
+    """CREATE TRIGGER trg_chunks_counters_insert AFTER INSERT ON chunks REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION storage_counters_chunks()""",
+    "DROP TRIGGER IF EXISTS trg_chunks_counters_update ON chunks",
+    """CREATE TRIGGER trg_chunks_counters_update AFTER UPDATE ON chunks
+    REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION storage_counters_chunks()""",
+    "DROP TRIGGER IF EXISTS trg_chunks_counters_delete ON chunks",
+    """CREATE TRIGGER trg_chunks_counters_delete AFTER DELETE ON chunks REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION storage_counters_chunks()""",
+    "DROP TRIGGER IF EXISTS trg_mappings_counters_insert ON file_chunk_mappings",
+    """CREATE TRIGGER trg_mappings_counters_insert AFTER INSERT ON file_chunk_mappings
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION storage_counters_mappings()""",
+    "DROP TRIGGER IF EXISTS trg_mappings_counters_delete ON file_chunk_mappings",
+    """CREATE TRIGGER trg_mappings_counters_delete AFTER DELETE ON file_chunk_mappings
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION storage_counters_mappings()""",
+]
+
+event.listen(StorageCounters.__table__, 'after_create', _SEED_COUNTERS)
+event.listen(StorageCounters.__table__, 'after_create', _SEED_STRIPES)
+for _statement in _SQLITE_TRIGGERS:
+    event.listen(StorageCounters.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in _POSTGRES_TRIGGERS:
+    event.listen(StorageCounters.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
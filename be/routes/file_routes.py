@@ -1,8 +1,20 @@
-from flask import Blueprint, request, send_file
+from flask import Blueprint, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.wsgi import wrap_file
 from services.file_service import FileService
+from services.dedup.sendfile import RegionStream
 from common.response import success, fail
-import io
+from utils.http_range import (
+    parse_range,
+    if_range_matches,
+    content_range,
+    content_disposition,
+    last_modified,
+    new_boundary,
+    multipart_byteranges,
+    multipart_byteranges_length,
+)
+import mimetypes
 
 file_bp = Blueprint('file', __name__)
 
@@ -23,10 +35,98 @@ def download_file():
     user_id = get_jwt_identity()
     filename = request.args.get("filename")
     folder = request.args.get("folder", "")
-    result = FileService.download(user_id, filename, folder)
-    if not result:
+    meta = FileService.stat(user_id, filename, folder)
+    if not meta:
         return fail("文件不存在")
-    return send_file(io.BytesIO(result["content"]), as_attachment=True, download_name=result["filename"])
+
+    # If-Range 不匹配（文件已变化）时忽略 Range，返回完整文件
+    ranges = None
+    if if_range_matches(request.headers.get("If-Range"), meta["etag"], meta["mtime"]):
+        ranges = parse_range(request.headers.get("Range"), meta["size"])
+
+    if ranges is None:
+        # 逐块产出数据，长度取自块清单，不在内存中拼装整个文件
+        stream = FileService.download(user_id, filename, folder)
+        if stream is None:
+            return fail("文件不存在")
+        body, passthrough = _stream_body(stream)
+        response = Response(
+            body,
+            mimetype=_guess_mimetype(filename),
+            headers={"Content-Disposition": content_disposition(filename)},
+            direct_passthrough=passthrough
+        )
+        response.content_length = meta["size"]
+    else:
+        response = _partial_response(user_id, filename, folder, meta, ranges)
+
+    response.headers["Accept-Ranges"] = "bytes"
+    if meta["etag"]:
+        response.headers["ETag"] = f'"{meta["etag"]}"'
+    if meta["mtime"] is not None:
+        response.headers["Last-Modified"] = last_modified(meta["mtime"])
+    return response
+
+
+def _guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def _stream_body(stream):
+    """响应体与是否直接透传：原样存储的单块区间交给 wsgi.file_wrapper（服务器支持时 sendfile 零拷贝），其余按块流式产出"""
+    if isinstance(stream, RegionStream):
+        return wrap_file(request.environ, stream, RegionStream.BLOCK_SIZE), True
+    return stream_with_context(stream), False
+
+
+def _partial_response(user_id, filename, folder, meta, ranges):
+    """按区间返回 206（单区间直接返回，多区间使用 multipart/byteranges），区间都无法满足时返回 416"""
+    size = meta["size"]
+    if not ranges:
+        return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+
+    content_type = _guess_mimetype(filename)
+    headers = {"Content-Disposition": content_disposition(filename)}
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        stream = FileService.download(user_id, filename, folder, start, end)
+        if stream is None:
+            # 文件在 stat 之后被删除：不能按已算好的 Content-Length 发送空响应体
+            return fail("文件不存在"), 404
+        headers["Content-Range"] = content_range(start, end, size)
+        body, passthrough = _stream_body(stream)
+        response = Response(body, status=206, mimetype=content_type, headers=headers,
+                            direct_passthrough=passthrough)
+        response.content_length = end - start
+        return response
+
+    # 先打开所有区间的数据流（数据在产出时才逐块读取），任一区间的文件已不存在时整个请求返回 404
+    streams = []
+    for start, end in ranges:
+        stream = FileService.download(user_id, filename, folder, start, end)
+        if stream is None:
+            _close_streams(streams)
+            return fail("文件不存在"), 404
+        streams.append(stream)
+    parts = [(start, end, stream) for (start, end), stream in zip(ranges, streams)]
+
+    boundary = new_boundary()
+    response = Response(
+        stream_with_context(multipart_byteranges(parts, size, content_type, boundary)),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )
+    response.content_length = multipart_byteranges_length(ranges, size, content_type, boundary)
+    return response
+
+
+def _close_streams(streams):
+    """关闭已打开但不再发送的数据流（RegionStream 持有文件句柄）"""
+    for stream in streams:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
 
 @file_bp.route('/list', methods=['GET'])
 @jwt_required()
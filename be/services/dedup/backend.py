@@ -0,0 +1,114 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
+
+from services.dedup.durability import SyncBatch
+from services.dedup.layout import ChunkLayout
+from services.dedup.packfile import PackStore
+
+
+class ChunkBackend(ABC):
+    """
+    块数据 I/O 后端接口
+    - 块是否存在、存在哪里以数据库（Chunk.storage_path）为准，后端只按位置读写删除，不做存在性检查
+    - put_many 写入一批块并返回各自的位置字符串；sync 为调用方的组提交批次，
+      调用方在 sync.flush() 之后才提交引用这些位置的数据库记录
+    - read 按位置读取，数据不存在时返回 None；delete_many 批量删除，返回删除失败的数量
+    - locate 返回位置在本地文件中的 (文件路径, 偏移)，供下载时直接按文件区间发送；不在本地文件中时返回 None
+    """
+
+    @abstractmethod
+    def put_many(self, items: List[Tuple[str, bytes]], sync: Optional[SyncBatch] = None) -> List[str]:
+        """写入 [(块哈希, 存储数据), ...]，按顺序返回存储位置"""
+        pass
+
+    @abstractmethod
+    def read(self, location: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def delete_many(self, locations: Iterable[str]) -> int:
+        pass
+
+    def locate(self, location: str) -> Optional[Tuple[str, int]]:
+        return None
+
+    def close(self):
+        pass
+
+
+class LocalChunkBackend(ChunkBackend):
+    """
+    本地磁盘后端：小块追加到包文件，大块按布局写独立文件（临时文件 + 原子替换，组提交落盘）
+    - 包文件目录和旧布局中的块始终可读，关闭打包或修改布局后已有数据仍可访问
+    - 包内的块无法单独删除，只留下死字节，由包压缩回收
+    """
+
+    def __init__(self, layout: ChunkLayout, pack_store: PackStore, pack_small_chunks: bool = True,
+                 pack_threshold: int = 512 * 1024, durable: bool = False):
+        """
+        Args:
+            layout: 独立块文件的目录布局
+            pack_store: 小块包文件
+            pack_small_chunks: 是否把小块写入包文件
+            pack_threshold: 存储数据小于该字节数的块写入包文件
+            durable: 未提供组提交批次时，写完是否立即 fsync
+        """
+        self.layout = layout
+        self.pack_store = pack_store
+        self.pack_small_chunks = pack_small_chunks
+        self.pack_threshold = pack_threshold
+        self.durable = durable
+
+    def put(self, chunk_hash: str, blob: bytes, sync: SyncBatch) -> str:
+        if self.pack_small_chunks and len(blob) < self.pack_threshold:
+            location = self.pack_store.append(chunk_hash, blob)
+            sync.add_pack(self.pack_store)
+            return location
+        location = self.layout.path_for(chunk_hash)
+        try:
+            sync.write(location, blob)
+        except FileNotFoundError:
+            # 分片目录被外部删除，清除目录缓存后重建
+            self.layout.forget_dir(chunk_hash)
+            location = self.layout.path_for(chunk_hash)
+            sync.write(location, blob)
+        return location
+
+    def put_many(self, items: List[Tuple[str, bytes]], sync: Optional[SyncBatch] = None) -> List[str]:
+        batch = sync if sync is not None else SyncBatch(durable=self.durable)
+        locations = [self.put(chunk_hash, blob, batch) for chunk_hash, blob in items]
+        if sync is None:
+            batch.flush()
+        return locations
+
+    def read(self, location: str) -> Optional[bytes]:
+        if PackStore.is_pack_location(location):
+            return self.pack_store.read(location)
+        try:
+            with open(location, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def locate(self, location: str) -> Optional[Tuple[str, int]]:
+        if PackStore.is_pack_location(location):
+            pack_name, offset, _ = PackStore.parse_location(location)
+            return self.pack_store.pack_path(pack_name), offset
+        return location, 0
+
+    def delete_many(self, locations: Iterable[str]) -> int:
+        errors = 0
+        for location in locations:
+            if PackStore.is_pack_location(location):
+                continue
+            try:
+                os.remove(location)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                errors += 1
+        return errors
+
+    def close(self):
+        self.pack_store.close()
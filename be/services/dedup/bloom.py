@@ -0,0 +1,46 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """
+    布隆过滤器（线程安全）
+    - might_contain 返回 False 时元素一定不存在
+    - 返回 True 时元素可能存在，误判率约为 error_rate（元素数不超过 capacity 时）
+    - 不支持删除，删除后需整体重建
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        """双重哈希生成 num_hashes 个比特位置"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        positions = self._positions(key)
+        with self._lock:
+            for pos in positions:
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+
+    def might_contain(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.might_contain(key)
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ChunkCache:
+    """
+    解压后数据块的内存LRU缓存（线程安全）
+    - 按块哈希缓存，容量按字节计算而不是按条目数
+    - 块按内容寻址且不可变，缓存项不会过期，只需在块被物理删除时移除
+    - 单个块超过容量的 MAX_ENTRY_RATIO 时不缓存，避免一个大块冲掉整个缓存
+    """
+
+    MAX_ENTRY_RATIO = 0.25
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self.max_entry_size = int(self.max_bytes * self.MAX_ENTRY_RATIO)
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'rejected': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, chunk_hash: str) -> Optional[bytes]:
+        """命中时返回块数据并标记为最近使用，未命中返回None"""
+        with self._lock:
+            data = self._entries.get(chunk_hash)
+            if data is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(chunk_hash)
+            self._stats['hits'] += 1
+            return data
+
+    def put(self, chunk_hash: str, data: bytes):
+        """加入缓存，超出容量时从最久未使用的一端淘汰"""
+        size = len(data)
+        if not self.enabled:
+            return
+        with self._lock:
+            if size > self.max_entry_size:
+                self._stats['rejected'] += 1
+                return
+            old = self._entries.pop(chunk_hash, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[chunk_hash] = bytes(data)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._stats['evictions'] += 1
+
+    def discard(self, chunk_hash: str):
+        """移除缓存项（块被物理删除时调用）"""
+        with self._lock:
+            data = self._entries.pop(chunk_hash, None)
+            if data is not None:
+                self._size -= len(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __contains__(self, chunk_hash: str) -> bool:
+        with self._lock:
+            return chunk_hash in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries, size = len(self._entries), self._size
+        lookups = stats['hits'] + stats['misses']
+        return {
+            'enabled': self.enabled,
+            'max_bytes': self.max_bytes,
+            'size_bytes': size,
+            'entries': entries,
+            **stats,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,97 @@
+import os
+from typing import Optional
+
+from services.dedup.chunker import FastCDCChunker, FixedSizeChunker, make_chunker
+from utils.compress import has_compressed_signature
+
+# 已压缩的媒体/归档格式：内容经过熵编码，插入少量字节会改变其后的全部数据，
+# 内容定义分块找不到可复用的块，只增加扫描开销，改用固定分块
+COMPRESSED_EXTENSIONS = frozenset((
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp4", ".mov", ".mkv", ".webm", ".avi", ".mp3", ".aac", ".ogg", ".flac", ".m4a",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".lz4",
+    ".jar", ".apk", ".docx", ".xlsx", ".pptx",
+))
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(0, (n - 1).bit_length())
+
+
+class ChunkPolicy:
+    """
+    按文件选择分块参数
+    - 块大小：文件越大块越大，保证每个文件的块数不超过约 target_chunks（映射行数有上限），
+      取 2 的幂（相同量级的文件使用相同参数，跨文件仍能去重），限制在 [base_size, max_size]
+    - 分块算法：已压缩的媒体/归档格式（按扩展名或文件头魔数判断）使用固定分块，其余使用默认算法
+    - 文件大小未知（流式上传且未提供大小）时使用默认参数
+    - 块大小不同的文件之间不能去重：大小跨过档位边界的两个版本各自分块，这是减少映射行数的代价
+    - 选出的参数由 DatabaseChunkStore 记录到文件清单中
+    """
+
+    def __init__(self, algorithm: str, base_size: int, max_size: int, target_chunks: int,
+                 min_chunk_size: Optional[int] = None, max_chunk_size: Optional[int] = None):
+        """
+        Args:
+            algorithm: 默认分块算法 'fixed' / 'cdc'
+            base_size: 小文件使用的（平均）块大小，即存储实例的 chunk_size
+            max_size: 自适应块大小的上限
+            target_chunks: 每个文件的目标块数上限
+            min_chunk_size / max_chunk_size: 使用基础块大小时的 CDC 最小/最大块大小（与原配置一致）
+        """
+        self.algorithm = algorithm
+        self.base_size = base_size
+        self.max_size = max(max_size, base_size)
+        self.target_chunks = max(1, target_chunks)
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self._chunkers = {}
+
+    def chunk_size_for(self, file_size: Optional[int]) -> int:
+        if not file_size or file_size <= self.base_size * self.target_chunks:
+            return self.base_size
+        return min(_next_power_of_two(-(-file_size // self.target_chunks)), self.max_size)
+
+    def algorithm_for(self, filename: Optional[str] = None, head: Optional[bytes] = None) -> str:
+        if filename and os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS:
+            return FixedSizeChunker.name
+        if head and has_compressed_signature(head):
+            return FixedSizeChunker.name
+        return self.algorithm
+
+    def chunker_for(self, file_size: Optional[int] = None, filename: Optional[str] = None,
+                    head: Optional[bytes] = None):
+        """
+        返回该文件使用的分块器（相同参数的分块器复用）
+
+        Args:
+            file_size: 文件大小，未知时为 None
+            filename: 原始文件名，用于按扩展名判断类型
+            head: 文件开头的若干字节，用于按魔数判断类型
+        """
+        algorithm = self.algorithm_for(filename, head)
+        chunk_size = self.chunk_size_for(file_size)
+        key = (algorithm, chunk_size)
+        chunker = self._chunkers.get(key)
+        if chunker is None:
+            if chunk_size == self.base_size:
+                chunker = make_chunker(algorithm, chunk_size, self.min_chunk_size, self.max_chunk_size)
+            else:
+                chunker = make_chunker(algorithm, chunk_size)
+            self._chunkers[key] = chunker
+        return chunker
+
+    def describe(self) -> dict:
+        return {
+            'algorithm': self.algorithm,
+            'base_size': self.base_size,
+            'max_size': self.max_size,
+            'target_chunks': self.target_chunks,
+        }
+
+
+def chunker_from_params(params: dict):
+    """按清单中记录的参数重建分块器（describe() 的逆操作）"""
+    if params.get('algorithm') == FastCDCChunker.name:
+        return FastCDCChunker(params['avg_size'], params.get('min_size'), params.get('max_size'))
+    return FixedSizeChunker(params['chunk_size'])
@@ -1,125 +1,562 @@
 import os
 import hashlib
-from typing import List, Dict, Optional, Tuple, BinaryIO
-from utils.compress import compress_for_storage, decompress_from_storage
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple, BinaryIO, Iterator
+from utils.compress import (
+    CompressionStats,
+    compress_for_storage,
+    compress_with_detection,
+    decompress_from_storage,
+    get_codec,
+    read_envelope_header,
+    CorruptBlobError,
+    ENVELOPE_MAX_HEADER_SIZE,
+)
+from services.dedup.chunker import make_chunker
+from services.dedup.chunk_policy import ChunkPolicy
+from services.dedup.bloom import BloomFilter
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.delta import DeltaStats, apply_delta, compute_sketch, delta_base_hash, encode_delta
+from services.dedup.dictionary import DictionarySet, DictionaryTrainer
+from services.dedup.readahead import ReadAhead
+from services.dedup.sendfile import RegionStream
+from services.dedup.sweeper import OrphanSweeper
+from services.dedup.gc import GarbageCollector
+from services.dedup.scrub import Scrubber
+from services.dedup.layout import ChunkLayout, LayoutMigrator
+from services.dedup.durability import SyncBatch
+from services.dedup.packfile import PackStore
+from services.dedup.backend import ChunkBackend, LocalChunkBackend
+from services.dedup.object_store import ObjectStore
+from services.dedup.tiering import AccessTracker, PromotionQueue, TierMigrator, TierStats
+from utils.hash import DEFAULT_FINGERPRINT, get_fingerprint
 from config import Config
+from common.db import db
+from sqlalchemy import func
+
+
+class ChunkReadError(IOError):
+    """流式读取过程中数据块缺失、损坏或大小不符"""
+
+
+class ChunkReclaimedError(RuntimeError):
+    """入库过程中复用或写入的块被并发的垃圾回收删除，本次入库已回滚，重新上传即可"""
 
 
 class DatabaseChunkStore:
     """
     数据库驱动的块级去重存储系统
-    - 将文件分割成固定大小的数据块
+    - 将文件分割成数据块（固定大小或内容定义分块，可按存储实例选择）
     - 对每个数据块进行去重存储
     - 支持文件的分块上传和组装下载
     - 提供块级引用计数管理
     """
     
     DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB默认块大小
+    MIN_FILTER_CAPACITY = 100000  # 过滤器最小容量，避免小库频繁因扩容重建
+    READAHEAD_TRIGGER = 2  # 连续读取的块数达到该值后开始预读
+    SIGNATURE_HEAD_SIZE = 64  # 分块策略按魔数判断文件类型时使用的文件头字节数
+    COMPACT_BATCH_BYTES = 4 * 1024 * 1024  # 包压缩每批读出、写入的数据量
+    SEND_RUN_CHUNKS = 32  # 下载时连续的非原样块攒够该数量即交给解压路径，不等扫描完整个清单才产出首字节
     
-    def __init__(self, storage_root: str = "./uploads", chunk_size: int = None):
+    def __init__(self, storage_root: str = "./uploads", chunk_size: int = None, chunking: str = None,
+                 min_chunk_size: int = None, max_chunk_size: int = None, ingest_workers: int = None,
+                 chunks_root: str = None, fingerprint: str = None):
+        """
+        Args:
+            storage_root: 存储根目录
+            chunk_size: 块大小（CDC分块时为平均块大小）
+            chunking: 分块算法 'fixed' / 'cdc'，默认取 Config.CHUNKING_ALGORITHM
+            min_chunk_size: CDC最小块大小，默认 chunk_size // 4
+            max_chunk_size: CDC最大块大小，默认 chunk_size * 4
+            ingest_workers: 入库时并发哈希+压缩的工作线程数，默认取 Config.INGEST_WORKERS
+            chunks_root: 块文件根目录，默认取 Config.CHUNK_STORE_ROOT，未配置时为 storage_root/.chunks
+            fingerprint: 新块的指纹算法 sha256 / blake2b / blake3（需安装 blake3），默认取 Config.CHUNK_FINGERPRINT
+        """
         self.storage_root = storage_root
         self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
-        self.chunks_dir = os.path.join(self.storage_root, ".chunks")
+        self.chunking = chunking or getattr(Config, "CHUNKING_ALGORITHM", "fixed")
+        self.chunker = make_chunker(
+            self.chunking,
+            self.chunk_size,
+            min_size=min_chunk_size or getattr(Config, "CDC_MIN_CHUNK_SIZE", None),
+            max_size=max_chunk_size or getattr(Config, "CDC_MAX_CHUNK_SIZE", None),
+        )
+        # 按文件大小/类型选择分块参数；关闭时所有文件使用上面的默认分块器
+        self.chunk_policy = ChunkPolicy(
+            self.chunking,
+            self.chunk_size,
+            max_size=getattr(Config, "CHUNK_POLICY_MAX_CHUNK_SIZE", 64 * 1024 * 1024),
+            target_chunks=getattr(Config, "CHUNK_POLICY_TARGET_CHUNKS", 1024),
+            min_chunk_size=min_chunk_size or getattr(Config, "CDC_MIN_CHUNK_SIZE", None),
+            max_chunk_size=max_chunk_size or getattr(Config, "CDC_MAX_CHUNK_SIZE", None),
+        ) if getattr(Config, "CHUNK_POLICY_ENABLED", True) else None
+        # 块指纹算法：非 sha256 的块在 ChunkFingerprint 中记录算法，改换算法后已有的块仍按各自的算法校验，
+        # 但新块只与同一算法的已有块去重；算法未安装时在启动阶段报错
+        self.fingerprint = fingerprint or getattr(Config, "CHUNK_FINGERPRINT", DEFAULT_FINGERPRINT)
+        self.ingest_workers = max(1, ingest_workers or getattr(Config, "INGEST_WORKERS", 1))
+        # 单线程时直接在请求线程内处理，不创建线程池
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.ingest_workers,
+            thread_name_prefix="chunk-ingest"
+        ) if self.ingest_workers > 1 else None
+        self.max_in_flight = 2 * self.ingest_workers
+        self.chunks_dir = chunks_root or getattr(Config, "CHUNK_STORE_ROOT", None) or os.path.join(self.storage_root, ".chunks")
         os.makedirs(self.chunks_dir, exist_ok=True)
+        # 持久写入：块文件、包文件、目录项在数据库提交前批量 fsync（组提交）
+        self.durable_writes = getattr(Config, "DURABLE_WRITES", True)
+        self.sync_batch_size = getattr(Config, "DURABLE_SYNC_BATCH", 256)
+        # 新块按当前布局写入；旧布局（根目录下一级分片）中的块仍按 storage_path 读取，可在线迁移
+        layout = ChunkLayout(
+            self.chunks_dir,
+            depth=getattr(Config, "CHUNK_LAYOUT_DEPTH", 2),
+            width=getattr(Config, "CHUNK_LAYOUT_WIDTH", 2),
+            durable=self.durable_writes
+        )
+        layout.initialize()
+        
+        # 压缩算法按部署配置选择；算法未安装时在启动阶段报错
+        self.compression_codec = get_codec(getattr(Config, "COMPRESSION_CODEC", "gzip")).name
+        self.compression_level = getattr(Config, "COMPRESSION_LEVEL", None)
+        self.chunk_checksum = getattr(Config, "CHUNK_CHECKSUM", True)
+        # 不可压缩数据（图片、视频、压缩包、加密数据）预检后直接存原始数据
+        self.skip_incompressible = getattr(Config, "SKIP_INCOMPRESSIBLE", True)
+        self.entropy_threshold = getattr(Config, "INCOMPRESSIBLE_ENTROPY_THRESHOLD", 7.8)
+        self.compression_stats = CompressionStats()
+        
+        # 相似块增量压缩：新块按超级特征查找相似的已有块，差分足够小时只存差分；
+        # 差分块在读取时透明还原，差分链深度不超过 delta_max_depth（关闭后已有差分块仍可读取）
+        self.delta_enabled = getattr(Config, "DELTA_COMPRESSION_ENABLED", False)
+        self.delta_max_depth = max(1, getattr(Config, "DELTA_MAX_DEPTH", 2))
+        self.delta_min_chunk_size = getattr(Config, "DELTA_MIN_CHUNK_SIZE", 4096)
+        self.delta_max_ratio = getattr(Config, "DELTA_MAX_RATIO", 0.5)
+        self.delta_stats = DeltaStats()
+        
+        # 小块追加写入包文件；包文件目录始终可读，保证关闭该功能后已有数据仍可访问
+        self.pack_store = PackStore(
+            os.path.join(self.storage_root, ".packs"),
+            max_pack_size=getattr(Config, "PACK_MAX_SIZE", 64 * 1024 * 1024),
+            durable=self.durable_writes
+        )
+        self.local_backend = LocalChunkBackend(
+            layout,
+            self.pack_store,
+            pack_small_chunks=getattr(Config, "PACK_SMALL_CHUNKS", True),
+            pack_threshold=getattr(Config, "PACK_CHUNK_THRESHOLD", 512 * 1024),
+            durable=self.durable_writes
+        )
+        
+        # 块哈希的内存过滤器：首次使用时从数据库扫描构建（构造时可能没有应用上下文）
+        self.filter_enabled = getattr(Config, "CHUNK_FILTER_ENABLED", True)
+        self.filter_error_rate = getattr(Config, "CHUNK_FILTER_ERROR_RATE", 0.01)
+        self.filter_rebuild_ratio = getattr(Config, "CHUNK_FILTER_REBUILD_RATIO", 0.2)
+        self._chunk_filter = None
+        self._filter_lock = threading.Lock()
+        self._filter_pending = None  # 重建期间新增的哈希，重建完成后补录
+        self._filter_deletes = 0
+        self._filter_stats = {'hits': 0, 'misses': 0, 'false_positives': 0, 'rebuilds': 0}
+        
+        # 解压后块数据的LRU缓存，热门文件的重复下载不再访问数据库和磁盘
+        self.chunk_cache = ChunkCache(getattr(Config, "CHUNK_CACHE_BYTES", 0))
+        
+        # 顺序读取时在后台线程中预读后续块，隐藏冷盘/对象存储的读取延迟
+        readahead_chunks = getattr(Config, "READAHEAD_CHUNKS", 0)
+        self._readahead_executor = ThreadPoolExecutor(
+            max_workers=max(1, getattr(Config, "READAHEAD_WORKERS", 4)),
+            thread_name_prefix="chunk-readahead"
+        ) if readahead_chunks > 0 else None
+        self.readahead = ReadAhead(
+            self._readahead_executor,
+            depth=readahead_chunks,
+            max_bytes=getattr(Config, "READAHEAD_MAX_BYTES", 64 * 1024 * 1024),
+            trigger=self.READAHEAD_TRIGGER
+        ) if self._readahead_executor is not None else None
+        # 下载时原样存储（未压缩、非差分）的本地块直接按文件区间读取/发送，不经过解压
+        self.zero_copy_reads = getattr(Config, "ZERO_COPY_DOWNLOADS", True)
+        
+        # 块数据后端：新块写入本地（包文件/块文件）或 S3 兼容对象存储；读取和删除按位置找到所属后端，
+        # 切换后端后已有数据仍可访问。本地后端配置了对象存储时，对象存储作为冷层
+        self.chunk_backend = getattr(Config, "CHUNK_BACKEND", "local")
+        if self.chunk_backend not in ("local", "s3"):
+            raise ValueError(f"未知的块数据后端: {self.chunk_backend}")
+        bucket = getattr(Config, "OBJECT_STORE_BUCKET", "")
+        if not bucket and self.chunk_backend == "s3":
+            bucket = getattr(Config, "S3_BUCKET", "")
+        self.object_store = ObjectStore(
+            bucket,
+            prefix=getattr(Config, "OBJECT_STORE_PREFIX", "chunks/"),
+            endpoint_url=getattr(Config, "OBJECT_STORE_ENDPOINT_URL", None),
+            max_concurrency=getattr(Config, "OBJECT_STORE_MAX_CONCURRENCY", 16)
+        ) if bucket else None
+        
+        # 冷热分层：长时间未读取的块由 migrate_cold_chunks 迁移到对象存储冷层；
+        # 读取只在内存中记录访问时间，冷层块读出后放入提升队列，二者由 flush_tier_updates 批量写入
+        self.promote_on_read = getattr(Config, "TIER_PROMOTE_ON_READ", True)
+        self.access_tracker = AccessTracker(
+            flush_interval=getattr(Config, "ACCESS_FLUSH_INTERVAL", 30),
+            max_pending=getattr(Config, "ACCESS_FLUSH_BATCH", 1000)
+        )
+        self.promotions = PromotionQueue(getattr(Config, "TIER_PROMOTE_MAX_BYTES", 64 * 1024 * 1024))
+        self.tier_stats = TierStats()
         
         # 延迟导入避免循环依赖
-        from models.chunk import Chunk, FileChunkMapping
+        from models.chunk import (
+            Chunk, FileChunkMapping, StorageCounters, FileManifest, ChunkSketch, ChunkDelta, ChunkAccess,
+            ChunkDictionary, ChunkFingerprint, ChunkRemovalEpoch, ChunkRemoval
+        )
         self.Chunk = Chunk
         self.FileChunkMapping = FileChunkMapping
+        self.FileManifest = FileManifest
+        self.ChunkSketch = ChunkSketch
+        self.ChunkDelta = ChunkDelta
+        self.ChunkAccess = ChunkAccess
+        self.ChunkDictionary = ChunkDictionary
+        self.ChunkFingerprint = ChunkFingerprint
+        self.ChunkRemovalEpoch = ChunkRemovalEpoch
+        self.ChunkRemoval = ChunkRemoval
+        self.StorageCounters = StorageCounters
+        
+        # 小块使用从已存储数据中训练的 zstd 字典压缩（字典id记录在块头部），字典由 chunk-dict-train 定期重新训练；
+        # 关闭后已用字典压缩的块仍可读取
+        self.dict_enabled = getattr(Config, "COMPRESSION_DICT_ENABLED", False)
+        self.dict_max_chunk_size = getattr(Config, "COMPRESSION_DICT_MAX_CHUNK_SIZE", 64 * 1024)
+        self.dictionaries = DictionarySet(
+            ChunkDictionary, refresh_interval=getattr(Config, "COMPRESSION_DICT_REFRESH_SECONDS", 60)
+        )
+    
+    def close(self):
+        """释放入库/预读工作线程池和包文件句柄"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._readahead_executor is not None:
+            self._readahead_executor.shutdown(wait=True, cancel_futures=True)
+            self._readahead_executor = None
+            self.readahead = None
+        self.local_backend.close()
+        if self.object_store is not None:
+            self.object_store.close()
+    
+    @property
+    def backend(self) -> ChunkBackend:
+        """新块写入的后端"""
+        if self.chunk_backend == "s3":
+            if self.object_store is None:
+                raise ValueError("s3 块数据后端需要配置存储桶（OBJECT_STORE_BUCKET 或 S3_BUCKET）")
+            return self.object_store
+        return self.local_backend
+    
+    @property
+    def fingerprint(self) -> str:
+        return self._fingerprint_name
+    
+    @fingerprint.setter
+    def fingerprint(self, name: str):
+        self._fingerprint = get_fingerprint(name)
+        self._fingerprint_name = name
+    
+    @property
+    def tiering_enabled(self) -> bool:
+        """冷热分层：本地后端且配置了对象存储"""
+        return self.chunk_backend == "local" and self.object_store is not None
+    
+    @property
+    def layout(self) -> ChunkLayout:
+        """新块文件的目录布局"""
+        return self.local_backend.layout
+    
+    @layout.setter
+    def layout(self, value: ChunkLayout):
+        self.local_backend.layout = value
+    
+    @property
+    def pack_small_chunks(self) -> bool:
+        return self.local_backend.pack_small_chunks
+    
+    @pack_small_chunks.setter
+    def pack_small_chunks(self, value: bool):
+        self.local_backend.pack_small_chunks = value
+    
+    @property
+    def pack_threshold(self) -> int:
+        return self.local_backend.pack_threshold
+    
+    @pack_threshold.setter
+    def pack_threshold(self, value: int):
+        self.local_backend.pack_threshold = value
     
     # -------- 文件分块算法 --------
-    def split_file_to_chunks(self, file_data: bytes) -> List[Dict]:
+    def split_file_to_chunks(self, file_data: bytes, filename: Optional[str] = None) -> List[Dict]:
         """
-        将文件数据分割成固定大小的数据块
+        将文件数据分割成数据块（分块器与 store_file 的选择相同）
         
         Args:
             file_data: 文件二进制数据
+            filename: 原始文件名（可选），与 store_file 相同
             
         Returns:
             List[Dict]: 块信息列表 [{'data': bytes, 'hash': str, 'index': int, 'offset': int, 'size': int}, ...]
         """
-        chunks = []
-        offset = 0
-        chunk_index = 0
-        
-        while offset < len(file_data):
-            # 计算当前块的大小
-            current_chunk_size = min(self.chunk_size, len(file_data) - offset)
-            
-            # 提取块数据
-            chunk_data = file_data[offset:offset + current_chunk_size]
-            
-            # 计算块哈希
-            chunk_hash = self._calculate_chunk_hash(chunk_data)
-            
-            chunks.append({
-                'data': chunk_data,
-                'hash': chunk_hash,
-                'index': chunk_index,
-                'offset': offset,
-                'size': current_chunk_size
-            })
-            
-            offset += current_chunk_size
-            chunk_index += 1
-        
-        return chunks
+        return self._with_hashes(self._read_stage(self._chunker_for_data(file_data, filename).split(file_data)))
     
-    def split_file_stream_to_chunks(self, file_stream: BinaryIO) -> List[Dict]:
+    def split_file_stream_to_chunks(self, file_stream: BinaryIO, size: Optional[int] = None,
+                                    filename: Optional[str] = None) -> List[Dict]:
         """
-        从文件流中分割数据块（适用于大文件）
+        从文件流中分割数据块（适用于大文件，分块器与 store_file_stream 的选择相同）
         
         Args:
             file_stream: 文件流对象
+            size / filename: 与 store_file_stream 相同
             
         Returns:
             List[Dict]: 块信息列表
         """
-        chunks = []
-        offset = 0
-        chunk_index = 0
+        return self._with_hashes(self._read_stage(self._chunker_for(size, filename).split_stream(file_stream)))
+    
+    def _chunker_for(self, file_size: Optional[int] = None, filename: Optional[str] = None,
+                     head: Optional[bytes] = None):
+        """按分块策略为文件选择分块器（策略关闭时使用默认分块器）"""
+        if self.chunk_policy is None:
+            return self.chunker
+        return self.chunk_policy.chunker_for(file_size, filename, head)
+    
+    def _chunker_for_data(self, file_data: bytes, filename: Optional[str] = None):
+        """整个文件在内存中时的分块器：按大小、文件名和文件头魔数选择"""
+        return self._chunker_for(len(file_data), filename, file_data[:self.SIGNATURE_HEAD_SIZE])
+    
+    def _with_hashes(self, chunks: Iterator[Dict]) -> List[Dict]:
+        """为每个块补充哈希"""
+        return [dict(chunk, hash=self._calculate_chunk_hash(chunk['data'])) for chunk in chunks]
+    
+    def _calculate_chunk_hash(self, chunk_data: bytes, algorithm: Optional[str] = None) -> str:
+        """计算数据块的指纹（默认使用本存储配置的算法）"""
+        if algorithm is None or algorithm == self.fingerprint:
+            return self._fingerprint(chunk_data)
+        return get_fingerprint(algorithm)(chunk_data)
+    
+    def _save_refs(self, refs: Dict[str, Dict], reused: Set[str], removal_epoch: int):
+        """
+        写入引用计数；使用非默认指纹算法时同时记录这些块的算法（不提交，与文件映射在同一事务中提交）
         
-        while True:
-            # 读取一个块的数据
-            chunk_data = file_stream.read(self.chunk_size)
-            if not chunk_data:
-                break
-            
-            # 计算块哈希
-            chunk_hash = self._calculate_chunk_hash(chunk_data)
-            
-            chunks.append({
-                'data': chunk_data,
-                'hash': chunk_hash,
-                'index': chunk_index,
-                'offset': offset,
-                'size': len(chunk_data)
-            })
-            
-            offset += len(chunk_data)
-            chunk_index += 1
+        存在性检查之后、提交之前，复用的块可能被垃圾回收删除，upsert 会重新插入指向已删除数据的记录：
+        - 复用的块在本事务中更新 updated_at 并重新确认仍然存在，此后回收不会删除它们
+        - 删除纪元与入库开始时不同时，按删除记录确认本次写入的块数据没有被并发的回收删除（位置由哈希决定），
+          不向后端确认存在性
+        有块已被删除时抛出 ChunkReclaimedError，由调用方回滚
         
-        return chunks
-    
-    def _calculate_chunk_hash(self, chunk_data: bytes) -> str:
-        """计算数据块的SHA256哈希值"""
-        return hashlib.sha256(chunk_data).hexdigest()
+        Args:
+            refs: {chunk_hash: Chunk.upsert_refs 的行}
+            reused: 复用已有块（未写入数据）的块哈希
+            removal_epoch: 入库开始时的删除纪元（写入任何块数据之前读取）
+        """
+        lost = reused - self.Chunk.touch(reused)
+        if not lost:
+            self.Chunk.upsert_refs(list(refs.values()), commit=False)
+            # 上面的写语句已取得写锁，进行中的删除提交之后才能读到纪元
+            current = self.ChunkRemovalEpoch.current(lock=True)
+            if current != removal_epoch:
+                lost = self.ChunkRemoval.removed_since(removal_epoch, current, set(refs) - reused)
+        if lost:
+            raise ChunkReclaimedError(f"{len(lost)} 个数据块在入库期间被回收: {sorted(lost)[0]}...")
+        if self.fingerprint != DEFAULT_FINGERPRINT:
+            self.ChunkFingerprint.save_many(list(refs), self.fingerprint, commit=False)
     
     def _calculate_file_hash(self, chunks: List[Dict]) -> str:
-        """根据所有块的哈希计算文件的整体哈希"""
+        """根据所有块的哈希计算文件的整体哈希（固定为 sha256，输入只是块哈希，开销可以忽略）"""
         hasher = hashlib.sha256()
         for chunk in sorted(chunks, key=lambda x: x['index']):
             hasher.update(chunk['hash'].encode('utf-8'))
         return hasher.hexdigest()
     
     # -------- 块存储路径管理 --------
-    def _get_chunk_storage_path(self, chunk_hash: str) -> str:
-        """获取数据块的存储路径"""
-        # 使用哈希的前两位作为子目录，避免单个目录文件过多
-        subdir = chunk_hash[:2]
-        chunk_dir = os.path.join(self.chunks_dir, subdir)
-        os.makedirs(chunk_dir, exist_ok=True)
-        return os.path.join(chunk_dir, chunk_hash)
+    def _get_chunk_storage_path(self, chunk_hash: str, create: bool = True) -> str:
+        """获取数据块在当前布局下的存储路径（create=True 时确保目录存在）"""
+        return self.layout.path_for(chunk_hash, create=create)
+    
+    def _layouts(self) -> List[ChunkLayout]:
+        """块文件可能存在的所有布局：当前布局 + 迁移前的旧布局"""
+        legacy = ChunkLayout.legacy(self.chunks_dir)
+        return [self.layout] if legacy == self.layout else [self.layout, legacy]
+    
+    # -------- 块存在性过滤器 --------
+    def _ensure_chunk_filter(self) -> Optional[BloomFilter]:
+        """
+        返回可用的过滤器，必要时从数据库流式扫描重建（需在应用上下文中调用）
+        
+        首次使用、删除数超过 filter_rebuild_ratio、或元素数超过容量时重建。
+        """
+        if not self.filter_enabled:
+            return None
+        
+        bloom = self._chunk_filter
+        if bloom is not None and bloom.count <= bloom.capacity \
+                and self._filter_deletes <= bloom.count * self.filter_rebuild_ratio:
+            return bloom
+        
+        with self._filter_lock:
+            if self._filter_pending is not None:
+                # 其他线程正在重建，先继续使用旧过滤器（没有则直接查库）
+                return self._chunk_filter
+            self._filter_pending = []
+            self._filter_deletes = 0
+        
+        try:
+            total = db.session.query(func.count(self.Chunk.id)).scalar() or 0
+            bloom = BloomFilter(max(2 * total, self.MIN_FILTER_CAPACITY), self.filter_error_rate)
+            for (chunk_hash,) in db.session.query(self.Chunk.chunk_hash).yield_per(10000):
+                bloom.add(chunk_hash)
+        except Exception:
+            with self._filter_lock:
+                self._filter_pending = None
+            raise
+        
+        with self._filter_lock:
+            for chunk_hash in self._filter_pending:
+                bloom.add(chunk_hash)
+            self._filter_pending = None
+            self._chunk_filter = bloom
+            self._filter_stats['rebuilds'] += 1
+        return bloom
+    
+    def _filter_add(self, chunk_hash: str):
+        """新块写入后登记到过滤器"""
+        with self._filter_lock:
+            if self._chunk_filter is not None:
+                self._chunk_filter.add(chunk_hash)
+            if self._filter_pending is not None:
+                self._filter_pending.append(chunk_hash)
+    
+    def _maybe_stored(self, chunk_hash: str) -> bool:
+        """过滤器判断块是否可能已存在（过滤器未构建时保守返回True；可在工作线程调用）"""
+        bloom = self._chunk_filter
+        return bloom is None or bloom.might_contain(chunk_hash)
+    
+    def _find_existing(self, chunk_hashes) -> set:
+        """
+        查询已存在的块：过滤器确定不存在的哈希不再访问数据库
+        
+        过滤器只在本进程内更新，其他进程新写入的块可能被判为不存在，
+        这种情况只会重复写一次块文件，引用计数由 upsert 保证正确。
+        """
+        chunk_hashes = set(chunk_hashes)
+        bloom = self._ensure_chunk_filter()
+        if bloom is None:
+            return self.Chunk.find_existing(chunk_hashes)
+        
+        candidates = {h for h in chunk_hashes if bloom.might_contain(h)}
+        existing = self.Chunk.find_existing(candidates)
+        
+        stats = self._filter_stats
+        stats['misses'] += len(chunk_hashes) - len(candidates)
+        stats['hits'] += len(existing)
+        stats['false_positives'] += len(candidates) - len(existing)
+        return existing
+    
+    def check_chunks(self, chunk_hashes: List[str]) -> List[str]:
+        """
+        返回尚未存储的块哈希（保持输入顺序），供客户端上传前检查
+        
+        Args:
+            chunk_hashes: 块哈希列表
+            
+        Returns:
+            List[str]: 缺失的块哈希
+        """
+        existing = self._find_existing(chunk_hashes)
+        return [h for h in chunk_hashes if h not in existing]
+    
+    def get_filter_stats(self) -> Dict:
+        """过滤器统计：hits=存在且命中，misses=确定不存在（跳过数据库），false_positives=误判"""
+        bloom = self._chunk_filter
+        return {
+            **self._filter_stats,
+            'enabled': self.filter_enabled,
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'size_bytes': bloom.size_bytes if bloom else 0,
+        }
+    
+    # -------- 块数据读写 --------
+    def _new_sync_batch(self) -> SyncBatch:
+        """一次写入事务的组提交批次：flush() 之后才能提交引用这些块的数据库记录"""
+        return SyncBatch(durable=self.durable_writes, executor=self._executor, max_pending=self.sync_batch_size)
+    
+    def _write_chunk_blobs(self, items: List[Tuple[str, bytes]], sync: Optional[SyncBatch] = None,
+                           backend: Optional[ChunkBackend] = None) -> List[str]:
+        """
+        把一批块 [(块哈希, 存储数据), ...] 交给后端写入，按顺序返回存储位置：本地后端小块追加到包文件、
+        大块使用独立文件（临时文件 + 原子替换）；对象存储后端有界并发上传
+        
+        sync 为调用方的组提交批次，由调用方在提交数据库前 flush；未提供时写完立即落盘
+        """
+        batch = sync if sync is not None else self._new_sync_batch()
+        locations = (backend or self.backend).put_many(items, batch)
+        if sync is None:
+            batch.flush()
+        return locations
+    
+    def _backend_for(self, storage_path: str) -> Optional[ChunkBackend]:
+        """位置所属的后端；未配置对象存储时对象存储中的块没有后端"""
+        if ObjectStore.is_object_location(storage_path):
+            return self.object_store
+        return self.local_backend
+    
+    def _read_chunk_blob(self, storage_path: str) -> Optional[bytes]:
+        """按存储位置读取块数据（兼容包文件、独立文件与对象存储），不存在时返回None"""
+        backend = self._backend_for(storage_path)
+        return backend.read(storage_path) if backend is not None else None
+    
+    def _remove_unreferenced_blobs(self, removed: List[Tuple[str, str]]) -> int:
+        """
+        删除块记录已提交删除的块数据 [(块哈希, 存储位置), ...]，返回删除失败的数量
+        
+        独立文件与对象存储的位置由块哈希决定，记录删除之后并发上传可能已在同一位置重新写入并提交了该块：
+        在推进删除纪元的事务中重新检查，仍被块记录引用的位置不删除，其余的块记入删除记录；尚未提交的上传
+        在提交时发现纪元变化，按删除记录判断自己写入的块数据是否被删除（见 _save_refs）。
+        包内的块只留下死字节，不需要检查。
+        """
+        removed = [(chunk_hash, location) for chunk_hash, location in removed
+                   if location and not PackStore.is_pack_location(location)]
+        if not removed:
+            return 0
+        Chunk = self.Chunk
+        try:
+            epoch = self.ChunkRemovalEpoch.advance()
+            referenced = {tuple(row) for row in db.session.query(Chunk.chunk_hash, Chunk.storage_path).filter(
+                Chunk.chunk_hash.in_({chunk_hash for chunk_hash, _ in removed})
+            )}
+            removed = [(chunk_hash, location) for chunk_hash, location in removed
+                       if (chunk_hash, location) not in referenced]
+            self.ChunkRemoval.record(epoch, [chunk_hash for chunk_hash, _ in removed])
+            errors = self._remove_chunk_blobs([location for _, location in removed])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return errors
+    
+    def _remove_chunk_blob(self, storage_path: str):
+        """删除块数据；包内的块无法单独删除，由 compact_packs 回收空间"""
+        if self._remove_chunk_blobs([storage_path]):
+            raise OSError(f"块数据删除失败: {storage_path}")
+    
+    def _remove_chunk_blobs(self, locations: List[str]) -> int:
+        """按后端分组批量删除块数据（对象存储每次请求最多删除1000个），返回删除失败的数量"""
+        remote = [location for location in locations if ObjectStore.is_object_location(location)]
+        errors = self.local_backend.delete_many(
+            location for location in locations if not ObjectStore.is_object_location(location)
+        )
+        if remote:
+            if self.object_store is None:
+                return errors + len(remote)
+            try:
+                errors += self.object_store.delete_many(remote)
+            except Exception:
+                errors += len(remote)
+        return errors
     
     # -------- 块级去重逻辑 --------
     def store_chunk(self, chunk_data: bytes, chunk_hash: str) -> Tuple[bool, str]:
@@ -133,40 +570,267 @@ class DatabaseChunkStore:
         Returns:
             Tuple[bool, str]: (是否为新块, 存储路径)
         """
-        storage_path = self._get_chunk_storage_path(chunk_hash)
-        
-        # 检查块是否已存在
-        if self.Chunk.exists(chunk_hash):
-            # 块已存在，只需增加引用计数
-            self.Chunk.increment_ref(chunk_hash)
-            return False, storage_path
-        
-        # 块不存在，需要存储
         try:
-            # 压缩并存储块数据
-            compressed_data = compress_for_storage(
-                chunk_data, 
-                enabled=getattr(Config, "ENABLE_COMPRESSION", True)
+            return self._store_chunk(chunk_data, chunk_hash)
+        except ChunkReclaimedError:
+            # 块在存储期间被垃圾回收：数据仍在内存中，重试一次（这次按新块写入）
+            return self._store_chunk(chunk_data, chunk_hash)
+    
+    def _store_chunk(self, chunk_data: bytes, chunk_hash: str) -> Tuple[bool, str]:
+        refs = {}
+        reused = set()
+        delta_rows = self._new_delta_rows()
+        sync = self._new_sync_batch()
+        try:
+            removal_epoch = self.ChunkRemovalEpoch.current()
+            new_chunks = self._store_batch(
+                [{'hash': chunk_hash, 'size': len(chunk_data), 'data': chunk_data}], refs, reused, sync, delta_rows
             )
+            sync.flush()
+            self._save_refs(refs, reused, removal_epoch)
+            self._save_delta_rows(delta_rows)
+            db.session.commit()
+        except Exception:
+            sync.abort()
+            db.session.rollback()
+            raise
+        return new_chunks > 0, refs[chunk_hash]['storage_path']
+    
+    def _store_batch(self, batch: List[Dict], refs: Dict[str, Dict], reused: Set[str], sync: SyncBatch,
+                     delta_rows: Optional[Dict[str, list]] = None) -> int:
+        """
+        写入阶段（在请求线程执行，数据库会话不跨线程）
+        
+        一次 IN 查询确定批内哪些块已存在，只为缺失的块写入数据（整批一次交给块数据后端），
+        并把引用计数累加到 refs 中，留待与文件映射在同一事务中提交。
+        
+        Args:
+            batch: [{'hash': str, 'size': int, 'data': bytes}] 或已由工作线程压缩好的 [{'hash', 'size', 'payload'}]
+            refs: 本文件已处理块的引用记录 {chunk_hash: Chunk.upsert_refs 的行}
+            reused: 收集复用已有块（未写入数据）的块哈希，提交前由 _save_refs 重新确认
+            sync: 组提交批次，调用方在提交数据库前 flush
+            delta_rows: 增量压缩开启时累积新块的特征行和差分行（见 _new_delta_rows），与引用计数一起提交
             
-            with open(storage_path, "wb") as f:
-                f.write(compressed_data)
-            
-            # 在数据库中记录块信息
-            self.Chunk.increment_ref(
-                chunk_hash=chunk_hash,
-                chunk_size=len(chunk_data),
-                storage_path=storage_path,
-                compressed_size=len(compressed_data)
+        Returns:
+            int: 新写入的块数量
+        """
+        existing = self._find_existing(c['hash'] for c in batch if c['hash'] not in refs)
+        new_chunks = 0
+        
+        deltas = {}
+        if delta_rows is not None:
+            candidates = {
+                c['hash']: c for c in batch
+                if c['hash'] not in refs and c['hash'] not in existing and self._wants_sketch(c)
+            }
+            deltas = self._encode_deltas(list(candidates.values()))
+        
+        writes = []
+        for chunk in batch:
+            chunk_hash = chunk['hash']
+            ref = refs.get(chunk_hash)
+            if ref is None:
+                storage_path = self._get_chunk_storage_path(chunk_hash, create=False)
+                compressed_data = chunk.get('payload')
+                
+                if chunk_hash not in existing:
+                    # 块不存在，写入数据（找到相似块且差分足够小时只写差分）
+                    delta = deltas.get(chunk_hash)
+                    if delta is not None:
+                        compressed_data = delta.pop('blob')
+                        delta_rows['deltas'].append(dict(delta, chunk_hash=chunk_hash))
+                    elif compressed_data is None:
+                        compressed_data = self._compress_chunk(chunk['data'])
+                    if delta_rows is not None and 'sketch' in chunk and \
+                            (delta is None or delta['depth'] < self.delta_max_depth):
+                        # 差分链已达最大深度的块不能再作为基准块，不记录特征
+                        delta_rows['sketches'].append(dict(zip(('sf0', 'sf1', 'sf2'), chunk['sketch']),
+                                                           chunk_hash=chunk_hash))
+                    writes.append((chunk_hash, compressed_data))
+                    self._filter_add(chunk_hash)
+                    new_chunks += 1
+                else:
+                    reused.add(chunk_hash)
+                
+                ref = refs[chunk_hash] = {
+                    'chunk_hash': chunk_hash,
+                    'chunk_size': chunk['size'],
+                    'storage_path': storage_path,
+                    'compressed_size': len(compressed_data) if compressed_data is not None else None,
+                    'ref_count': 0,
+                }
+            ref['ref_count'] += 1
+        
+        if writes:
+            # 批内的新块一次交给后端写入（对象存储后端并发上传），位置写回引用记录
+            for (chunk_hash, _), location in zip(writes, self._write_chunk_blobs(writes, sync)):
+                refs[chunk_hash]['storage_path'] = location
+        return new_chunks
+    
+    # -------- 相似块增量压缩 --------
+    def _new_delta_rows(self) -> Optional[Dict[str, list]]:
+        """一次写入事务中新块的特征行与差分行；增量压缩关闭时为 None"""
+        return {'sketches': [], 'deltas': []} if self.delta_enabled else None
+    
+    def _save_delta_rows(self, delta_rows: Optional[Dict[str, list]]):
+        """写入特征行与差分行（不提交，与块的引用计数在同一事务中提交）"""
+        if delta_rows:
+            self.ChunkSketch.save_many(delta_rows['sketches'], commit=False)
+            self.ChunkDelta.save_many(delta_rows['deltas'], commit=False)
+    
+    def _wants_sketch(self, chunk: Dict) -> bool:
+        """是否为该块计算特征：增量压缩开启、块足够大且原始数据仍在内存中"""
+        return self.delta_enabled and chunk['size'] >= self.delta_min_chunk_size and 'data' in chunk
+    
+    def _encode_deltas(self, chunks: List[Dict]) -> Dict[str, Dict]:
+        """
+        为一批新块查找相似的基准块并计算差分
+        
+        特征查询、读取基准块、保护基准块都在请求线程中执行（需要数据库会话），差分编码交给工作线程池。
+        
+        Returns:
+            Dict: {chunk_hash: {'blob', 'base_hash', 'depth', 'full_size', 'delta_size'}}，只包含差分足够小的块
+        """
+        if not chunks:
+            return {}
+        for chunk in chunks:
+            if 'sketch' not in chunk:
+                chunk['sketch'] = compute_sketch(chunk['data'])
+        rows = self.ChunkSketch.find_similar([c['sketch'] for c in chunks], self.delta_max_depth,
+                                             limit=64 * len(chunks))
+        by_feature = {}
+        for row in rows:
+            for i, feature in enumerate((row.sf0, row.sf1, row.sf2)):
+                by_feature.setdefault((i, feature), []).append(row)
+        
+        jobs = []
+        for chunk in chunks:
+            # 相同的超级特征越多越相似；同样相似时选差分链更短的基准块
+            scores = {}
+            for i, feature in enumerate(chunk['sketch']):
+                for row in by_feature.get((i, feature), ()):
+                    matched, _ = scores.get(row.chunk_hash, (0, row))
+                    scores[row.chunk_hash] = (matched + 1, row)
+            best = max(scores.values(), key=lambda item: (item[0], -item[1].depth), default=None)
+            self.delta_stats.record_lookup(best is not None)
+            if best is not None:
+                jobs.append((chunk, best[1]))
+        if not jobs:
+            return {}
+        
+        bases = {}
+        for _, row in jobs:
+            if row.chunk_hash not in bases:
+                bases[row.chunk_hash] = self._load_chunk(row.chunk_hash, row.storage_path)
+        jobs = [(chunk, row, bases[row.chunk_hash]) for chunk, row in jobs if bases[row.chunk_hash] is not None]
+        if self._executor is not None and len(jobs) > 1:
+            results = list(self._executor.map(lambda job: self._try_delta(*job), jobs))
+        else:
+            results = [self._try_delta(*job) for job in jobs]
+        deltas = {chunk['hash']: result for (chunk, _, _), result in zip(jobs, results) if result is not None}
+        
+        # 更新基准块的 updated_at：垃圾回收在宽限期内不会回收它，提交后差分行使其一直保留；
+        # 基准块已被回收时改为完整存储
+        alive = self.Chunk.touch({delta['base_hash'] for delta in deltas.values()})
+        return {h: delta for h, delta in deltas.items() if delta['base_hash'] in alive}
+    
+    def _try_delta(self, chunk: Dict, base_row, base: bytes) -> Optional[Dict]:
+        """计算差分并与完整存储比较（在工作线程执行），差分不够小时返回 None"""
+        started = time.thread_time()
+        full = chunk.get('payload')
+        if full is None:
+            full = chunk['payload'] = self._compress_chunk(chunk['data'])
+        delta = encode_delta(base_row.chunk_hash, base, chunk['data'])
+        blob = compress_for_storage(delta, delta=True, **self._compression_options())
+        accepted = len(blob) <= len(full) * self.delta_max_ratio
+        self.delta_stats.record_encode(len(full), len(blob) if accepted else None, time.thread_time() - started)
+        if not accepted:
+            return None
+        return {
+            'blob': blob,
+            'base_hash': base_row.chunk_hash,
+            'depth': base_row.depth + 1,
+            'full_size': len(full),
+            'delta_size': len(blob),
+        }
+    
+    def _decode_chunk_blob(self, blob: bytes, resolve: bool = True,
+                           base_paths: Optional[Dict[str, str]] = None) -> bytes:
+        """
+        解码块数据；差分块先读取基准块（经过块缓存）再还原
+        
+        Args:
+            resolve: 是否允许查询数据库获取基准块位置（见 _load_chunk）
+            base_paths: 预先查出的基准块位置 {chunk_hash: storage_path}
+        """
+        data = decompress_from_storage(
+            blob, enabled=getattr(Config, "ENABLE_COMPRESSION", True), dictionaries=self.dictionaries
+        )
+        header = read_envelope_header(blob)
+        if header is None or not header.delta:
+            return data
+        started = time.perf_counter()
+        base_hash = delta_base_hash(data)
+        base = self._load_chunk(base_hash, (base_paths or {}).get(base_hash), resolve=resolve, base_paths=base_paths)
+        if base is None:
+            raise ChunkReadError(f"差分块的基准块读取失败: {base_hash}")
+        chunk_data = apply_delta(data, base)
+        self.delta_stats.record_read(time.perf_counter() - started)
+        return chunk_data
+    
+    def _delta_base_paths(self, chunk_hashes: List[str]) -> Dict[str, str]:
+        """查出这些块的差分链上所有基准块的存储位置（每层一次查询）"""
+        paths = {}
+        pending = list(chunk_hashes)
+        while pending:
+            bases = set(self.ChunkDelta.base_of(pending).values()) - set(paths)
+            if not bases:
+                break
+            rows = db.session.query(self.Chunk.chunk_hash, self.Chunk.storage_path).filter(
+                self.Chunk.chunk_hash.in_(bases)
             )
-            
-            return True, storage_path
-            
-        except Exception as e:
-            # 如果存储失败，清理可能创建的文件
-            if os.path.exists(storage_path):
-                os.remove(storage_path)
-            raise e
+            paths.update({row.chunk_hash: row.storage_path for row in rows})
+            pending = list(bases)
+        return paths
+    
+    def _forget_chunks(self, chunk_hashes: List[str]):
+        """删除块记录时一并删除其特征行、差分行、访问记录与指纹算法记录（不提交）"""
+        self.ChunkSketch.delete_for(chunk_hashes, commit=False)
+        self.ChunkDelta.delete_for(chunk_hashes, commit=False)
+        self.ChunkAccess.delete_for(chunk_hashes, commit=False)
+        self.ChunkFingerprint.delete_for(chunk_hashes, commit=False)
+    
+    def get_delta_stats(self) -> Dict:
+        """增量压缩统计：差分块的数量与节省的空间（数据库汇总），以及本进程的查找/编码/读取耗时"""
+        return {
+            **self.ChunkDelta.summary(),
+            'enabled': self.delta_enabled,
+            'max_depth_limit': self.delta_max_depth,
+            'runtime': self.delta_stats.snapshot(),
+        }
+    
+    def _compression_options(self) -> Dict:
+        return {
+            'enabled': getattr(Config, "ENABLE_COMPRESSION", True),
+            'codec': self.compression_codec,
+            'level': self.compression_level,
+            'checksum': self.chunk_checksum,
+        }
+    
+    def _compress_chunk(self, chunk_data: bytes) -> bytes:
+        """按配置压缩块数据并加上自描述头部（算法、原始长度、校验和，使用字典时还有字典id）"""
+        options = self._compression_options()
+        if self.dict_enabled and len(chunk_data) <= self.dict_max_chunk_size:
+            # 当前字典由请求线程刷新，这里只读属性（可能在工作线程中执行）
+            options['dictionary'] = self.dictionaries.current
+        if not self.skip_incompressible:
+            return compress_for_storage(chunk_data, **options)
+        return compress_with_detection(
+            chunk_data,
+            stats=self.compression_stats,
+            entropy_threshold=self.entropy_threshold,
+            **options
+        )
     
     def read_chunk(self, chunk_hash: str) -> Optional[bytes]:
         """
@@ -178,141 +842,335 @@ class DatabaseChunkStore:
         Returns:
             Optional[bytes]: 块数据，如果不存在则返回None
         """
-        chunk = self.Chunk.query.filter_by(chunk_hash=chunk_hash).first()
-        if not chunk:
+        self.flush_tier_updates()
+        return self._load_chunk(chunk_hash)
+    
+    def _load_chunk(self, chunk_hash: str, storage_path: Optional[str] = None,
+                    resolve: bool = True, base_paths: Optional[Dict[str, str]] = None) -> Optional[bytes]:
+        """
+        读取并解压数据块（差分块透明还原）；storage_path 为清单中已查出的位置，未提供时查询数据库
+        
+        resolve=False 时不访问数据库（预读线程中没有应用上下文），位置失效时直接返回None；
+        此时差分块的基准块只能来自块缓存或 base_paths
+        """
+        if self.chunk_cache.enabled:
+            cached = self.chunk_cache.get(chunk_hash)
+            if cached is not None:
+                self._record_access(chunk_hash)
+                return cached
+        
+        if not storage_path and resolve:
+            storage_path = self._lookup_storage_path(chunk_hash)
+        if not storage_path:
             return None
         
-        storage_path = chunk.storage_path
-        if not os.path.exists(storage_path):
+        compressed_data = self._read_chunk_blob(storage_path)
+        if compressed_data is None and resolve:
+            # 位置可能刚被包压缩、冷层迁移等维护任务改写，重新查询一次
+            latest_path = self._lookup_storage_path(chunk_hash)
+            if not latest_path or latest_path == storage_path:
+                return None
+            storage_path = latest_path
+            compressed_data = self._read_chunk_blob(latest_path)
+        if compressed_data is None:
             return None
         
         try:
-            with open(storage_path, "rb") as f:
-                compressed_data = f.read()
-            
-            # 解压缩数据
-            chunk_data = decompress_from_storage(
-                compressed_data,
-                enabled=getattr(Config, "ENABLE_COMPRESSION", True)
-            )
+            # 解压缩数据（差分块还原）
+            chunk_data = self._decode_chunk_blob(compressed_data, resolve=resolve, base_paths=base_paths)
+            self.chunk_cache.put(chunk_hash, chunk_data)
+            self._record_access(chunk_hash, storage_path, compressed_data)
             
             return chunk_data
             
         except Exception:
             return None
     
-    def delete_chunk(self, chunk_hash: str) -> bool:
+    # -------- 冷热分层 --------
+    def _record_access(self, chunk_hash: str, storage_path: Optional[str] = None, blob: Optional[bytes] = None):
+        """记录一次读取（只写内存，可在预读线程中调用）；从冷层读出的块放入提升队列"""
+        if not self.tiering_enabled:
+            return
+        self.access_tracker.record(chunk_hash)
+        if ObjectStore.is_object_location(storage_path):
+            self.tier_stats.add('cold_reads')
+            if self.promote_on_read and blob is not None:
+                self.promotions.add(chunk_hash, storage_path, blob)
+    
+    def flush_tier_updates(self, force: bool = False) -> Dict:
         """
-        删除数据块（减少引用计数，如果为0则物理删除）
+        把缓冲的访问时间和待提升的块批量写入（需要应用上下文，由读取入口在请求线程中调用）
+        
+        访问时间按间隔/条数攒批写入；有待提升的块时立即处理：先写回本地并落盘，再条件更新
+        storage_path（仍指向原冷层位置时），与访问时间一次提交，提交后批量删除冷层对象。
+        写入失败时访问时间放回缓冲，待提升的块放弃（块仍在冷层，下次读取时再提升）。
         
         Args:
-            chunk_hash: 块哈希
+            force: 不等待间隔/条数阈值，立即写入
             
         Returns:
-            bool: 是否实际删除了块文件
+            Dict: {'accessed': 写入的访问记录数, 'promoted': 提升的块数, 'skipped': 位置已改写未提升的块数}
         """
-        result = self.Chunk.decrement_ref(chunk_hash)
-        if isinstance(result, tuple):
-            ref_count, storage_path = result
-            if ref_count == 0 and storage_path:
-                # 引用计数为0，删除物理文件
+        report = {'accessed': 0, 'promoted': 0, 'skipped': 0}
+        if not self.tiering_enabled or not (force or len(self.promotions) or self.access_tracker.due()):
+            return report
+        
+        accessed = self.access_tracker.drain()
+        promotions = self.promotions.drain()
+        if not accessed and not promotions:
+            return report
+        promoted, skipped = [], []
+        sync = self._new_sync_batch()
+        try:
+            self.ChunkAccess.record_many(accessed, commit=False)
+            for chunk_hash, location, blob in promotions:
+                local = self._write_chunk_blobs([(chunk_hash, blob)], sync, backend=self.local_backend)[0]
+                updated = self.Chunk.query.filter_by(chunk_hash=chunk_hash, storage_path=location).update(
+                    {'storage_path': local}, synchronize_session=False
+                )
+                (promoted if updated else skipped).append((chunk_hash, location, local))
+            sync.flush()
+            db.session.commit()
+        except Exception:
+            sync.abort()
+            db.session.rollback()
+            self.access_tracker.restore(accessed)
+            self.tier_stats.add('flush_errors')
+            return report
+        
+        if promoted:
+            self.tier_stats.add('remove_errors', self._remove_chunk_blobs([location for _, location, _ in promoted]))
+        for chunk_hash, _, local in skipped:
+            # 块已被回收或位置被改写：删除刚写回的副本（其他进程已提升到同一位置时保留）
+            if self._lookup_storage_path(chunk_hash) != local:
                 try:
-                    if os.path.exists(storage_path):
-                        os.remove(storage_path)
-                    return True
-                except Exception:
-                    pass
+                    self._remove_chunk_blob(local)
+                except OSError:
+                    self.tier_stats.add('remove_errors')
         
-        return False
+        self.tier_stats.add('flushes')
+        self.tier_stats.add('access_records', len(accessed))
+        self.tier_stats.add('promoted', len(promoted))
+        self.tier_stats.add('promote_skipped', len(skipped))
+        report.update(accessed=len(accessed), promoted=len(promoted), skipped=len(skipped))
+        return report
+    
+    def get_tier_stats(self) -> Dict:
+        """冷热分层统计：冷层块数与字节数（数据库汇总）、缓冲中的访问记录/待提升块数，以及本进程的读取/提升计数"""
+        count, nbytes = db.session.query(func.count(self.Chunk.id), func.sum(self.Chunk.compressed_size)).filter(
+            self.Chunk.storage_path.like(ObjectStore.LOCATION_PREFIX + '%')
+        ).one()
+        totals = self.Chunk.get_storage_stats()
+        return {
+            'enabled': self.tiering_enabled,
+            'bucket': self.object_store.bucket if self.object_store is not None else None,
+            'cold_chunks': count or 0,
+            'cold_bytes': int(nbytes or 0),
+            'hot_chunks': totals['total_chunks'] - (count or 0),
+            'hot_bytes': totals['total_compressed_size'] - int(nbytes or 0),
+            'pending_access_records': len(self.access_tracker),
+            'pending_promotions': len(self.promotions),
+            'runtime': self.tier_stats.snapshot(),
+        }
+    
+    def _lookup_storage_path(self, chunk_hash: str) -> Optional[str]:
+        """查询块的存储位置（列查询，不受会话中缓存对象影响）"""
+        return db.session.query(self.Chunk.storage_path).filter_by(chunk_hash=chunk_hash).scalar()
+    
+    def delete_chunk(self, chunk_hash: str) -> bool:
+        """
+        释放数据块的一个引用：引用计数减一（不低于 0），不删除块记录和块数据
+        
+        引用计数可能与文件映射不一致（巡检会报告），块是否仍被引用以文件映射为准：
+        与 delete_file 相同，没有文件映射和差分块引用的块由垃圾回收（collect_garbage）回收。
+        
+        Args:
+            chunk_hash: 块哈希
+            
+        Returns:
+            bool: 引用计数是否已归零（等待回收）
+        """
+        Chunk = self.Chunk
+        try:
+            db.session.query(Chunk).filter(Chunk.chunk_hash == chunk_hash, Chunk.ref_count > 0).update(
+                {Chunk.ref_count: Chunk.ref_count - 1}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return Chunk.exists(chunk_hash) and Chunk.get_ref_count(chunk_hash) == 0
     
     # -------- 文件级操作 --------
-    def store_file(self, file_data: bytes) -> Dict:
+    def store_file(self, file_data: bytes, filename: Optional[str] = None) -> Dict:
         """
         存储文件（分块去重）
         
         Args:
             file_data: 文件二进制数据
+            filename: 原始文件名（可选），分块策略按扩展名判断文件类型
             
         Returns:
-            Dict: 文件存储信息 {'file_hash': str, 'total_size': int, 'chunk_count': int, 'new_chunks': int}
+            Dict: 文件存储信息 {'file_hash': str, 'total_size': int, 'chunk_count': int, 'new_chunks': int,
+                                'chunking': 本文件使用的分块参数}
         """
-        # 分割文件为数据块
-        chunks = self.split_file_to_chunks(file_data)
-        
-        # 计算文件整体哈希
-        file_hash = self._calculate_file_hash(chunks)
+        chunker = self._chunker_for_data(file_data, filename)
+        try:
+            return self._ingest(chunker.split(file_data), chunker)
+        except ChunkReclaimedError:
+            # 复用的块在入库期间被垃圾回收：数据仍在内存中，重新入库一次（这次按新块写入）
+            return self._ingest(chunker.split(file_data), chunker)
+    
+    def store_file_stream(self, file_stream: BinaryIO, size: Optional[int] = None,
+                          filename: Optional[str] = None) -> Dict:
+        """
+        从文件流存储文件（适用于大文件）
         
-        # 存储每个数据块
-        new_chunks_count = 0
-        chunk_mappings = []
+        边读边存，同一时刻只持有固定数量的数据块，内存占用与文件大小无关。
+        数据流无法重读，复用的块在入库期间被垃圾回收时抛出 ChunkReclaimedError（已回滚），由客户端重新上传。
         
-        for chunk in chunks:
-            is_new_chunk, storage_path = self.store_chunk(chunk['data'], chunk['hash'])
-            if is_new_chunk:
-                new_chunks_count += 1
+        Args:
+            file_stream: 文件流对象
+            size: 文件大小（可选，如来自 Content-Length），未提供时使用默认分块参数
+            filename: 原始文件名（可选）
             
-            # 记录块映射信息
-            chunk_mappings.append({
-                'chunk_hash': chunk['hash'],
-                'chunk_index': chunk['index'],
-                'chunk_offset': chunk['offset'],
-                'chunk_size': chunk['size']
-            })
+        Returns:
+            Dict: 文件存储信息
+        """
+        chunker = self._chunker_for(size, filename)
+        return self._ingest(chunker.split_stream(file_stream), chunker)
+    
+    # -------- 入库流水线 --------
+    def _read_stage(self, pieces: Iterator[bytes]) -> Iterator[Dict]:
+        """读取阶段：为每个数据块附加序号和偏移量"""
+        offset = 0
+        for chunk_index, chunk_data in enumerate(pieces):
+            yield {
+                'data': chunk_data,
+                'index': chunk_index,
+                'offset': offset,
+                'size': len(chunk_data)
+            }
+            offset += len(chunk_data)
+    
+    def _prepare_chunk(self, chunk: Dict) -> Dict:
+        """哈希+压缩（在工作线程执行；hashlib和zlib在处理大块数据时会释放GIL）"""
+        chunk_data = chunk['data']
+        chunk['hash'] = self._calculate_chunk_hash(chunk_data)
+        if not self._maybe_stored(chunk['hash']):
+            # 过滤器确定是新块才提前压缩；可能已存在的块留到写入阶段按需压缩
+            chunk['payload'] = self._compress_chunk(chunk_data)
+            if self._wants_sketch(chunk):
+                # 增量压缩在写入阶段用原始数据做差分，保留数据
+                chunk['sketch'] = compute_sketch(chunk_data)
+            else:
+                del chunk['data']
+        return chunk
+    
+    def _in_flight_for(self, chunker) -> int:
+        """
+        本文件同时在途的块数：按默认块大小下的在途字节数折算，
+        分块策略选了更大的块时减少在途块数，内存占用不随块大小增长
+        """
+        chunk_size = getattr(chunker, 'avg_size', None) or getattr(chunker, 'chunk_size', self.chunk_size)
+        if chunk_size <= self.chunk_size:
+            return self.max_in_flight
+        return max(2, self.max_in_flight * self.chunk_size // chunk_size)
+    
+    def _prepare_stage(self, chunks: Iterator[Dict], max_in_flight: Optional[int] = None) -> Iterator[Dict]:
+        """
+        哈希+压缩阶段：由工作线程池并发处理，按原顺序产出
         
-        # 创建文件-块映射关系
-        self.FileChunkMapping.create_mapping(file_hash, chunk_mappings)
+        同时在途的块数不超过 max_in_flight（默认 self.max_in_flight），保证内存占用有上限。
+        """
+        max_in_flight = max_in_flight or self.max_in_flight
+        if self._executor is None:
+            for chunk in chunks:
+                yield self._prepare_chunk(chunk)
+            return
         
-        return {
-            'file_hash': file_hash,
-            'total_size': len(file_data),
-            'chunk_count': len(chunks),
-            'new_chunks': new_chunks_count
-        }
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self._executor.submit(self._prepare_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
     
-    def store_file_stream(self, file_stream: BinaryIO) -> Dict:
+    def _ingest(self, pieces: Iterator[bytes], chunker=None) -> Dict:
         """
-        从文件流存储文件（适用于大文件）
+        入库流水线：读取 -> 哈希+压缩（工作线程池） -> 写入 -> 记录（请求线程）
+        
+        每个数据块处理完即释放，只保留块哈希等元数据；文件哈希在最后一个块之后确定。
         
         Args:
-            file_stream: 文件流对象
+            pieces: 分块器产生的数据块迭代器
+            chunker: 产生 pieces 的分块器，其参数记录到文件清单头中（默认分块器）
             
         Returns:
             Dict: 文件存储信息
         """
-        # 分割文件流为数据块
-        chunks = self.split_file_stream_to_chunks(file_stream)
-        
-        # 计算文件整体哈希
-        file_hash = self._calculate_file_hash(chunks)
-        
-        # 存储每个数据块
+        file_hasher = hashlib.sha256()
         new_chunks_count = 0
-        chunk_mappings = []
         total_size = 0
+        chunk_mappings = []
+        refs = {}
+        reused = set()
+        batch = []
+        delta_rows = self._new_delta_rows()
+        sync = self._new_sync_batch()
+        chunker = chunker or self.chunker
+        in_flight = self._in_flight_for(chunker)
         
-        for chunk in chunks:
-            is_new_chunk, storage_path = self.store_chunk(chunk['data'], chunk['hash'])
-            if is_new_chunk:
-                new_chunks_count += 1
+        try:
+            # 在请求线程中准备好过滤器和压缩字典，工作线程只读
+            self._ensure_chunk_filter()
+            if self.dict_enabled:
+                self.dictionaries.refresh()
+            removal_epoch = self.ChunkRemovalEpoch.current()
             
-            total_size += chunk['size']
+            for chunk in self._prepare_stage(self._read_stage(pieces), in_flight):
+                # 与 _calculate_file_hash 相同：按块顺序累加块哈希
+                file_hasher.update(chunk['hash'].encode('utf-8'))
+                total_size += chunk['size']
+                
+                # 记录块映射信息
+                chunk_mappings.append({
+                    'chunk_hash': chunk['hash'],
+                    'chunk_index': chunk['index'],
+                    'chunk_offset': chunk['offset'],
+                    'chunk_size': chunk['size']
+                })
+                
+                batch.append(chunk)
+                if len(batch) >= in_flight:
+                    new_chunks_count += self._store_batch(batch, refs, reused, sync, delta_rows)
+                    batch = []
+            if batch:
+                new_chunks_count += self._store_batch(batch, refs, reused, sync, delta_rows)
             
-            # 记录块映射信息
-            chunk_mappings.append({
-                'chunk_hash': chunk['hash'],
-                'chunk_index': chunk['index'],
-                'chunk_offset': chunk['offset'],
-                'chunk_size': chunk['size']
-            })
-        
-        # 创建文件-块映射关系
-        self.FileChunkMapping.create_mapping(file_hash, chunk_mappings)
+            file_hash = file_hasher.hexdigest()
+            
+            # 块数据全部落盘后才提交：已提交的块记录不会指向崩溃后不完整的文件
+            sync.flush()
+            # 块引用计数与文件-块映射在同一事务中提交，每个文件只提交一次
+            self._save_refs(refs, reused, removal_epoch)
+            self._save_delta_rows(delta_rows)
+            self.FileChunkMapping.create_mapping(file_hash, chunk_mappings, commit=False)
+            self.FileManifest.save(file_hash, total_size, len(chunk_mappings), chunker.describe(), commit=False)
+            db.session.commit()
+        except Exception:
+            # 未落盘的临时文件直接删除；已写入的数据文件没有数据库记录，留给孤立块清理处理
+            sync.abort()
+            db.session.rollback()
+            raise
         
         return {
             'file_hash': file_hash,
             'total_size': total_size,
-            'chunk_count': len(chunks),
-            'new_chunks': new_chunks_count
+            'chunk_count': len(chunk_mappings),
+            'new_chunks': new_chunks_count,
+            'chunking': chunker.describe()
         }
     
     # -------- 文件组装功能 --------
@@ -326,59 +1184,218 @@ class DatabaseChunkStore:
         Returns:
             Optional[bytes]: 文件数据，如果不存在则返回None
         """
-        # 获取文件的块映射信息
-        chunk_mappings = self.FileChunkMapping.get_file_chunks(file_hash)
-        if not chunk_mappings:
+        stream = self.open_file(file_hash)
+        if stream is None:
             return None
         
-        # 按顺序读取并组装数据块
-        file_data = bytearray()
+        try:
+            return b"".join(stream)
+        except ChunkReadError:
+            # 如果任何一个块读取失败，整个文件读取失败
+            return None
+    
+    def read_range(self, file_hash: str, start: int, end: int) -> Optional[bytes]:
+        """
+        读取文件的字节区间 [start, end)，只读取与区间重叠的数据块
         
-        for mapping in chunk_mappings:
-            chunk_data = self.read_chunk(mapping.chunk_hash)
-            if chunk_data is None:
-                # 如果任何一个块读取失败，整个文件读取失败
-                return None
+        Args:
+            file_hash: 文件哈希
+            start: 起始偏移（包含）
+            end: 结束偏移（不包含），超出文件末尾时截断
             
-            # 验证块大小
-            if len(chunk_data) != mapping.chunk_size:
-                return None
+        Returns:
+            Optional[bytes]: 区间数据，文件不存在或块读取失败时返回None
+        """
+        stream = self.open_file(file_hash, start, end)
+        if stream is None:
+            return None
+        
+        try:
+            return b"".join(stream)
+        except ChunkReadError:
+            return None
+    
+    def open_file(self, file_hash: str, start: int = 0, end: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        """
+        按块流式读取文件（或字节区间 [start, end)），每次产出一个解压后的块
+        
+        块清单在调用时立即查出（文件不存在时返回None），数据在迭代时才逐块读取，
+        内存占用约为一个块，与文件大小无关。迭代中块读取失败会抛出 ChunkReadError。
+        
+        Args:
+            file_hash: 文件哈希
+            start: 起始偏移（包含）
+            end: 结束偏移（不包含），默认到文件末尾
             
-            file_data.extend(chunk_data)
+        Returns:
+            Optional[Iterator[bytes]]: 块数据迭代器
+        """
+        if start < 0 or (end is not None and end < start):
+            raise ValueError("非法的字节区间")
         
-        return bytes(file_data)
+        # 迭代可能在请求上下文之外进行，缓冲的分层更新在这里（有应用上下文时）写入
+        self.flush_tier_updates()
+        manifest = self.FileChunkMapping.get_manifest(file_hash, start or None, end)
+        if not manifest and not self.file_exists(file_hash):
+            return None
+        return self._iter_manifest(manifest, start, end)
+    
+    def open_file_for_send(self, file_hash: str, start: int = 0, end: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        """
+        下载用的流式读取：产出的数据与 open_file 相同，原样存储（未压缩、非差分）的本地块不经过解压
+        
+        - 请求区间落在单个原样块内时返回 RegionStream，路由层可交给 wsgi.file_wrapper，由服务器 sendfile
+        - 否则原样块按区间一次 pread 读出（不解压、不进块缓存），其余块走 open_file 的解压路径（含预读）
+        
+        原样块的 CRC32 不在下载时校验，由巡检（chunk-scrub）定期校验。
+        """
+        if start < 0 or (end is not None and end < start):
+            raise ValueError("非法的字节区间")
+        
+        self.flush_tier_updates()
+        manifest = self.FileChunkMapping.get_manifest(file_hash, start or None, end)
+        if not manifest and not self.file_exists(file_hash):
+            return None
+        if not self.zero_copy_reads:
+            return self._iter_manifest(manifest, start, end)
+        if len(manifest) == 1:
+            chunk_hash, chunk_offset, chunk_size, storage_path = manifest[0]
+            raw = self._open_raw_chunk(storage_path, chunk_size)
+            if raw is not None:
+                f, data_offset = raw
+                lo, hi = self._chunk_overlap(chunk_offset, chunk_size, start, end)
+                self._record_access(chunk_hash, storage_path)
+                return RegionStream(f, data_offset + lo, hi - lo)
+        return self._iter_manifest_for_send(manifest, start, end)
+    
+    def _iter_manifest_for_send(self, manifest, start: int, end: Optional[int]) -> Iterator[bytes]:
+        run = []  # 连续的非原样块，整批交给 _iter_manifest 以保留预读
+        for chunk_hash, chunk_offset, chunk_size, storage_path in manifest:
+            raw = self._open_raw_chunk(storage_path, chunk_size)
+            if raw is None:
+                run.append((chunk_hash, chunk_offset, chunk_size, storage_path))
+                if len(run) >= self.SEND_RUN_CHUNKS:
+                    yield from self._iter_manifest(run, start, end)
+                    run = []
+                continue
+            
+            f, data_offset = raw
+            with f:
+                if run:
+                    yield from self._iter_manifest(run, start, end)
+                    run = []
+                lo, hi = self._chunk_overlap(chunk_offset, chunk_size, start, end)
+                data = os.pread(f.fileno(), hi - lo, data_offset + lo)
+            if len(data) != hi - lo:
+                raise ChunkReadError(f"数据块读取失败: {chunk_hash}")
+            self._record_access(chunk_hash, storage_path)
+            yield data
+        if run:
+            yield from self._iter_manifest(run, start, end)
+    
+    def _open_raw_chunk(self, storage_path: Optional[str], chunk_size: int) -> Optional[Tuple[BinaryIO, int]]:
+        """
+        打开原样存储的本地块，返回 (文件对象, 原始数据在文件中的偏移)；只读取封装头部
+        
+        压缩块、差分块、冷层中的块、旧格式数据以及文件已不存在（位置刚被维护任务改写）时返回 None，
+        由调用方走解压路径（会重新查询位置）
+        """
+        if not storage_path:
+            return None
+        backend = self._backend_for(storage_path)
+        span = backend.locate(storage_path) if backend is not None else None
+        if span is None:
+            return None
+        path, offset = span
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            header = read_envelope_header(os.pread(f.fileno(), ENVELOPE_MAX_HEADER_SIZE, offset))
+        except (OSError, CorruptBlobError):
+            header = None
+        if header is None or header.codec != "none" or header.delta or header.raw_size != chunk_size:
+            f.close()
+            return None
+        return f, offset + header.header_size
+    
+    @staticmethod
+    def _chunk_overlap(chunk_offset: int, chunk_size: int, start: int, end: Optional[int]) -> Tuple[int, int]:
+        """块内与请求区间 [start, end) 重叠的部分 [lo, hi)"""
+        lo = max(start - chunk_offset, 0)
+        hi = chunk_size if end is None else min(end - chunk_offset, chunk_size)
+        return lo, hi
+    
+    def _iter_manifest(self, manifest, start: int, end: Optional[int]) -> Iterator[bytes]:
+        if self.readahead is not None and len(manifest) > 1:
+            loaded = self.readahead.iterate(
+                manifest,
+                fetch=lambda row: self._load_chunk(row[0], row[3], resolve=False),
+                size_of=lambda row: row[2]
+            )
+        else:
+            loaded = ((row, None) for row in manifest)
+        
+        for (chunk_hash, chunk_offset, chunk_size, storage_path), chunk_data in loaded:
+            if chunk_data is None:
+                # 未预读或预读失败（位置被维护任务改写等），在当前线程中同步读取
+                chunk_data = self._load_chunk(chunk_hash, storage_path)
+            # 验证块大小
+            if chunk_data is None or len(chunk_data) != chunk_size:
+                raise ChunkReadError(f"数据块读取失败: {chunk_hash}")
+            
+            # 只截取块内与请求区间重叠的部分
+            lo, hi = self._chunk_overlap(chunk_offset, chunk_size, start, end)
+            yield chunk_data if (lo, hi) == (0, chunk_size) else chunk_data[lo:hi]
+    
+    def get_file_size(self, file_hash: str) -> Optional[int]:
+        """获取文件大小（来自块映射），文件不存在时返回None"""
+        return self.FileChunkMapping.get_file_size(file_hash)
     
     def delete_file(self, file_hash: str) -> Dict:
         """
-        删除文件（减少所有相关块的引用计数）
+        删除文件：只删除块清单并批量减少引用计数（一次提交），不删除块数据
+        
+        不再被任何文件引用的块由后台垃圾回收（collect_garbage）分批回收。
         
         Args:
             file_hash: 文件哈希
             
         Returns:
-            Dict: 删除统计信息 {'deleted_chunks': int, 'remaining_chunks': int}
+            Dict: 删除统计信息 {'deleted_chunks': 引用归零、等待回收的块数, 'remaining_chunks': 仍被其他文件引用的块数}
         """
-        # 获取文件使用的所有块
-        chunk_hashes = self.FileChunkMapping.delete_file_mapping(file_hash)
-        
-        # 减少每个块的引用计数
-        deleted_chunks = 0
-        remaining_chunks = 0
+        try:
+            chunk_hashes = self.FileChunkMapping.delete_file_mapping(file_hash, commit=False)
+            self.FileManifest.delete_manifest(file_hash, commit=False)
+            ref_deltas = {}
+            for chunk_hash in chunk_hashes:
+                ref_deltas[chunk_hash] = ref_deltas.get(chunk_hash, 0) - 1
+            self.Chunk.add_refs(ref_deltas, commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
         
-        for chunk_hash in chunk_hashes:
-            if self.delete_chunk(chunk_hash):
-                deleted_chunks += 1
-            else:
-                remaining_chunks += 1
+        released = 0
+        hashes = list(ref_deltas)
+        for i in range(0, len(hashes), 500):
+            released += db.session.query(func.count(self.Chunk.id)).filter(
+                self.Chunk.chunk_hash.in_(hashes[i:i + 500]),
+                self.Chunk.ref_count <= 0
+            ).scalar()
         
         return {
-            'deleted_chunks': deleted_chunks,
-            'remaining_chunks': remaining_chunks
+            'deleted_chunks': released,
+            'remaining_chunks': len(hashes) - released
         }
     
     def get_file_info(self, file_hash: str) -> Optional[Dict]:
-        """获取文件信息"""
-        return self.FileChunkMapping.get_file_info(file_hash)
+        """获取文件信息（含入库时使用的分块参数，旧数据为 None）"""
+        info = self.FileChunkMapping.get_file_info(file_hash)
+        if info is not None:
+            info['chunking'] = self.FileManifest.get_chunking(file_hash)
+        return info
     
     def file_exists(self, file_hash: str) -> bool:
         """检查文件是否存在"""
@@ -386,61 +1403,261 @@ class DatabaseChunkStore:
     
     # -------- 统计和维护功能 --------
     def get_storage_stats(self) -> Dict:
-        """获取存储统计信息"""
+        """获取存储统计信息（块数、引用数、字节数、文件数均读取触发器维护的计数器，不扫描全表）"""
         chunk_stats = self.Chunk.get_storage_stats()
-        
-        # 获取文件统计
-        file_count = self.FileChunkMapping.query.with_entities(
-            self.FileChunkMapping.file_hash
-        ).distinct().count()
+        file_count = chunk_stats['total_files']
         
         return {
             **chunk_stats,
-            'total_files': file_count,
-            'avg_chunks_per_file': chunk_stats['total_refs'] / file_count if file_count > 0 else 0
+            'avg_chunks_per_file': chunk_stats['total_refs'] / file_count if file_count > 0 else 0,
+            'chunk_filter': self.get_filter_stats(),
+            'compression': self.compression_stats.snapshot(),
+            'delta': self.delta_stats.snapshot(),
+            'chunk_cache': self.chunk_cache.get_stats()
         }
+
+    def reconcile_stats(self, dry_run: bool = False) -> Dict:
+        """全表重新计算存储统计并修正计数器，返回偏差（计数器只会因绕过触发器的手工修改而偏离）"""
+        return self.StorageCounters.reconcile(dry_run=dry_run)
     
     def cleanup_orphaned_chunks(self) -> int:
-        """清理孤立的数据块文件（数据库中没有记录的文件）"""
-        if not os.path.exists(self.chunks_dir):
-            return 0
+        """清理孤立的数据块文件（数据库中没有记录的文件），返回删除的文件数"""
+        return self.sweep_orphaned_chunks()['removed']
+    
+    def sweep_orphaned_chunks(self, grace_seconds: float = None, dry_run: bool = False) -> Dict:
+        """
+        扫描块目录并删除数据库中没有记录的块文件（并行扫描 + 有序归并求差）
         
-        cleaned_count = 0
+        Args:
+            grace_seconds: 宽限期（秒），修改时间更新的文件视为正在写入，不删除；默认取 Config.ORPHAN_GRACE_SECONDS
+            dry_run: 只统计不删除
+            
+        Returns:
+            Dict: {'scanned', 'orphans', 'removed', 'skipped_recent', 'runtime_seconds', 'files_per_second', 'dry_run'}
+        """
+        if grace_seconds is None:
+            grace_seconds = getattr(Config, "ORPHAN_GRACE_SECONDS", 3600)
+        report = {'scanned': 0, 'orphans': 0, 'removed': 0, 'skipped_recent': 0,
+                  'stale_tmp': 0, 'stale_tmp_removed': 0, 'runtime_seconds': 0.0}
+        # 每个布局各自是一个有序的文件名序列，分别与数据库哈希流归并
+        for layout in self._layouts():
+            sweeper = OrphanSweeper(
+                layout.base_dir,
+                self.Chunk.iter_hashes(batch_size=getattr(Config, "SWEEP_DB_BATCH_SIZE", 10000)),
+                grace_seconds=grace_seconds,
+                workers=getattr(Config, "SWEEP_WORKERS", 4),
+                depth=layout.depth,
+                width=layout.width
+            )
+            layout_report = sweeper.sweep(dry_run=dry_run)
+            for key in report:
+                report[key] += layout_report[key]
+        runtime = report['runtime_seconds']
+        report['files_per_second'] = report['scanned'] / runtime if runtime > 0 else 0.0
+        report['dry_run'] = dry_run
+        return report
+    
+    def migrate_layout(self, dry_run: bool = False, max_batches: int = None, resume: bool = True) -> Dict:
+        """
+        在线把独立块文件迁移到当前布局（详见 LayoutMigrator），迁移期间读写照常进行
         
-        # 遍历所有子目录
-        for subdir in os.listdir(self.chunks_dir):
-            subdir_path = os.path.join(self.chunks_dir, subdir)
-            if not os.path.isdir(subdir_path):
-                continue
+        Args:
+            dry_run: 只统计待迁移的块
+            max_batches: 本次最多处理的批数，未完成时保留断点供下次继续
+            resume: 是否从上次的断点继续
+        """
+        migrator = LayoutMigrator(
+            self,
+            self.layout,
+            batch_size=getattr(Config, "LAYOUT_MIGRATE_BATCH_SIZE", 500),
+            max_chunks_per_second=getattr(Config, "LAYOUT_MIGRATE_MAX_CHUNKS_PER_SECOND", 0)
+        )
+        return migrator.run(dry_run=dry_run, max_batches=max_batches, resume=resume)
+
+    def migrate_cold_chunks(self, dry_run: bool = False, max_batches: int = None, resume: bool = True,
+                            cold_after_seconds: float = None) -> Dict:
+        """
+        把长时间未读取的块迁移到对象存储冷层（详见 TierMigrator），迁移期间读写照常进行
+
+        Args:
+            dry_run: 只统计待迁移的块
+            max_batches: 本次最多处理的批数，未完成时保留断点供下次继续
+            resume: 是否从上次的断点继续
+            cold_after_seconds: 未读取多久的块视为冷块，默认取 Config.TIER_COLD_AFTER_SECONDS
+        """
+        migrator = TierMigrator(
+            self,
+            cold_after_seconds=getattr(Config, "TIER_COLD_AFTER_SECONDS", 30 * 24 * 3600)
+            if cold_after_seconds is None else cold_after_seconds,
+            batch_size=getattr(Config, "TIER_MIGRATE_BATCH_SIZE", 200),
+            max_bytes_per_second=getattr(Config, "TIER_MIGRATE_MAX_BYTES_PER_SECOND", 0),
+            workers=getattr(Config, "TIER_MIGRATE_WORKERS", 4)
+        )
+        return migrator.run(dry_run=dry_run, max_batches=max_batches, resume=resume)
+
+    def train_dictionary(self, force: bool = False, dry_run: bool = False) -> Dict:
+        """
+        从已存储的小块中训练新版本压缩字典，比当前版本更好时发布（详见 DictionaryTrainer）
+        
+        Args:
+            force: 不检查距上一版本的间隔
+            dry_run: 只训练和评估，不发布
+        """
+        trainer = DictionaryTrainer(
+            self,
+            sample_chunks=getattr(Config, "COMPRESSION_DICT_SAMPLE_CHUNKS", 2000),
+            dict_size=getattr(Config, "COMPRESSION_DICT_SIZE", 112640),
+            max_chunk_size=self.dict_max_chunk_size,
+            retrain_seconds=getattr(Config, "COMPRESSION_DICT_RETRAIN_SECONDS", 24 * 3600)
+        )
+        return trainer.run(force=force, dry_run=dry_run)
+    
+    def collect_garbage(self, dry_run: bool = False, max_batches: int = None, resume: bool = True,
+                        grace_seconds: float = None) -> Dict:
+        """
+        标记-清除垃圾回收：回收不被任何文件引用的块（详见 GarbageCollector）
+        
+        Args:
+            dry_run: 只统计不删除
+            max_batches: 本次最多处理的批数，未完成时保留断点供下次继续
+            resume: 是否从上次的断点继续
+            grace_seconds: 宽限期，默认取 Config.GC_GRACE_SECONDS
+        """
+        collector = GarbageCollector(
+            self,
+            batch_size=getattr(Config, "GC_BATCH_SIZE", 1000),
+            grace_seconds=getattr(Config, "GC_GRACE_SECONDS", 3600) if grace_seconds is None else grace_seconds,
+            max_deletes_per_second=getattr(Config, "GC_MAX_DELETES_PER_SECOND", 0)
+        )
+        return collector.run(dry_run=dry_run, max_batches=max_batches, resume=resume)
+    
+    def scrub(self, repair: bool = False, max_batches: int = None, resume: bool = True,
+              check_refcounts: bool = True) -> Dict:
+        """
+        完整性校验：并行校验块内容（可续跑），完成后校验引用计数（详见 Scrubber）
+        
+        Args:
+            repair: 修复引用计数，删除损坏/丢失的块（相同内容再次上传时重新写入）
+            max_batches: 本次最多校验的批数，未完成时保留断点供下次继续
+            resume: 是否从上次的断点继续
+            check_refcounts: 内容校验完成后是否校验引用计数
+        """
+        scrubber = Scrubber(
+            self,
+            workers=getattr(Config, "SCRUB_WORKERS", 4),
+            max_bytes_per_second=getattr(Config, "SCRUB_MAX_BYTES_PER_SECOND", 0),
+            batch_size=getattr(Config, "SCRUB_BATCH_SIZE", 256)
+        )
+        return scrubber.run(repair=repair, max_batches=max_batches, resume=resume,
+                            check_refcounts=check_refcounts)
+    
+    def compact_packs(self, threshold: float = None, min_age: float = None) -> Dict:
+        """
+        压缩包文件：把死字节比例超过阈值的包中仍被引用的块追加到新包，更新存储位置后删除旧包
+        
+        只处理已封存的包：追加中的包由写入进程（包括其他进程，如 Web 工作进程）持有文件锁，
+        取不到锁的包跳过（计入 packs_busy），取得锁后在锁内完成统计、迁移和删除。
+        
+        Args:
+            threshold: 死字节比例阈值，默认取 Config.PACK_COMPACT_THRESHOLD
+            min_age: 只处理最后修改时间早于该秒数的包（额外的保护，如不持有包锁的旧版本进程写入的包）
             
-            # 遍历子目录中的文件
-            for filename in os.listdir(subdir_path):
-                file_path = os.path.join(subdir_path, filename)
-                
-                # 检查是否是有效的哈希文件名
-                if len(filename) == 64 and all(c in '0123456789abcdef' for c in filename.lower()):
-                    if not self.Chunk.exists(filename):
-                        # 数据库中没有记录，删除孤立文件
-                        try:
-                            os.remove(file_path)
-                            cleaned_count += 1
-                        except FileNotFoundError:
-                            pass
-        
-        return cleaned_count
+        Returns:
+            Dict: {'packs_scanned', 'packs_busy', 'packs_compacted', 'chunks_moved', 'bytes_reclaimed'}
+        """
+        if threshold is None:
+            threshold = getattr(Config, "PACK_COMPACT_THRESHOLD", 0.5)
+        if min_age is None:
+            min_age = getattr(Config, "PACK_COMPACT_MIN_AGE", 600)
+        
+        report = {'packs_scanned': 0, 'packs_busy': 0, 'packs_compacted': 0, 'chunks_moved': 0,
+                  'bytes_reclaimed': 0}
+        
+        # 一次扫描统计每个包的存活字节数
+        live_bytes = {}
+        pack_rows = db.session.query(self.Chunk.storage_path).filter(
+            self.Chunk.storage_path.like(PackStore.LOCATION_PREFIX + '%')
+        ).yield_per(10000)
+        for (location,) in pack_rows:
+            pack_name, _, length = PackStore.parse_location(location)
+            live_bytes[pack_name] = live_bytes.get(pack_name, 0) + length
+        
+        cutoff = time.time() - min_age
+        active = self.pack_store.active_pack()
+        for pack_name in self.pack_store.list_packs():
+            pack_path = self.pack_store.pack_path(pack_name)
+            try:
+                if pack_name == active or os.path.getmtime(pack_path) > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            with self.pack_store.lock_sealed(pack_name) as sealed:
+                if not sealed:
+                    report['packs_busy'] += 1
+                    continue
+                report['packs_scanned'] += 1
+                self._compact_pack(pack_name, live_bytes.get(pack_name, 0), threshold, report)
+        
+        return report
+    
+    def _compact_pack(self, pack_name: str, live: int, threshold: float, report: Dict):
+        """压缩一个已封存的包（调用方持有包锁）"""
+        size = self.pack_store.pack_size(pack_name)
+        if size == 0 or (size - live) / size < threshold:
+            return
+        
+        rows = db.session.query(self.Chunk.id, self.Chunk.chunk_hash, self.Chunk.storage_path).filter(
+            self.Chunk.storage_path.like(f"{PackStore.LOCATION_PREFIX}{pack_name}:%")
+        ).all()
+        
+        sync = self._new_sync_batch()
+        try:
+            # 存活的块按 COMPACT_BATCH_BYTES 分批读出并写入新包，内存中只保留一批数据；
+            # 包是本地的块，始终写回本地后端：块数据后端为对象存储时也不把包内的块上传到对象存储
+            locations = []
+            batch, batch_bytes = [], 0
+            for row in rows:
+                blob = self.pack_store.read(row.storage_path)
+                if blob is None:
+                    # 包内有损坏的块，保留原包等待修复（已写入的副本成为死字节）
+                    sync.abort()
+                    return
+                batch.append((row.chunk_hash, blob))
+                batch_bytes += len(blob)
+                if batch_bytes >= self.COMPACT_BATCH_BYTES:
+                    locations += self._write_chunk_blobs(batch, sync, backend=self.local_backend)
+                    batch, batch_bytes = [], 0
+            locations += self._write_chunk_blobs(batch, sync, backend=self.local_backend)
+            for row, new_location in zip(rows, locations):
+                # 条件更新：位置在此期间被其他任务改写时不覆盖
+                self.Chunk.query.filter_by(id=row.id, storage_path=row.storage_path).update(
+                    {'storage_path': new_location}, synchronize_session=False
+                )
+            sync.flush()
+            db.session.commit()
+        except Exception:
+            sync.abort()
+            db.session.rollback()
+            raise
+        
+        self.pack_store.remove_pack(pack_name)
+        report['packs_compacted'] += 1
+        report['chunks_moved'] += len(rows)
+        report['bytes_reclaimed'] += size - live
     
     # -------- 兼容性接口（用于替换md5_store） --------
-    def ensure_blob(self, data: bytes) -> str:
+    def ensure_blob(self, data: bytes, filename: Optional[str] = None) -> str:
         """
         兼容md5_store的接口：存储数据并返回标识符
         
         Args:
             data: 文件数据
+            filename: 原始文件名（可选），用于选择分块参数
             
         Returns:
             str: 文件哈希标识符
         """
-        result = self.store_file(data)
+        result = self.store_file(data, filename)
         return result['file_hash']
     
     def read_blob(self, file_hash: str) -> Optional[bytes]:
@@ -455,6 +1672,19 @@ class DatabaseChunkStore:
         """
         return self.read_file(file_hash)
     
+    def open_blob(self, file_hash: str, start: int = 0, end: int = None) -> Optional[Iterator[bytes]]:
+        """
+        兼容md5_store的接口（下载路径）：按块流式读取数据（或字节区间 [start, end)），
+        原样存储的块直接按文件区间读取，见 open_file_for_send
+        """
+        return self.open_file_for_send(file_hash, start, end)
+    
+    def blob_size(self, file_hash: str) -> Optional[int]:
+        """
+        兼容md5_store的接口：获取数据大小
+        """
+        return self.get_file_size(file_hash)
+    
     def inc_ref(self, file_hash: str, blob_size: int = None) -> int:
         """
         兼容md5_store的接口：增加引用计数
@@ -464,9 +1694,11 @@ class DatabaseChunkStore:
         if not chunk_mappings:
             return 0
         
-        # 对所有块增加引用计数
+        # 对所有块增加引用计数（一条批量UPDATE，一次提交）
+        ref_deltas = {}
         for mapping in chunk_mappings:
-            self.Chunk.increment_ref(mapping.chunk_hash)
+            ref_deltas[mapping.chunk_hash] = ref_deltas.get(mapping.chunk_hash, 0) + 1
+        self.Chunk.add_refs(ref_deltas)
         
         return len(chunk_mappings)  # 返回块数量作为引用计数
     
@@ -0,0 +1,185 @@
+import hashlib
+import math
+from typing import BinaryIO, Iterator, Optional
+
+import numpy as np
+
+
+def _build_gear_table() -> np.ndarray:
+    """生成固定的Gear随机表（由SHA256派生，保证不同进程/机器上的切分点一致）"""
+    values = [
+        int.from_bytes(hashlib.sha256(b"gear" + bytes([i])).digest()[:4], "little")
+        for i in range(256)
+    ]
+    return np.array(values, dtype=np.uint32)
+
+
+GEAR_TABLE = _build_gear_table()
+GEAR_WINDOW = 32  # 32位Gear哈希的有效窗口（字节）
+
+
+def gear_hashes(buf) -> np.ndarray:
+    """
+    计算buf中每个位置的Gear滚动哈希
+
+    h[i] = sum(GEAR[b[i-k]] << k, k=0..31) mod 2^32
+    通过窗口倍增（1→2→4→8→16→32）用5次向量化运算求出全部位置的值，
+    而不是逐字节的Python循环。
+
+    Args:
+        buf: bytes / bytearray / memoryview
+
+    Returns:
+        np.ndarray: uint32数组，长度与buf相同
+    """
+    h = GEAR_TABLE.take(np.frombuffer(buf, dtype=np.uint8))
+    n = len(h)
+    shifted = np.empty_like(h)
+    width = 1
+    while width < min(GEAR_WINDOW, n):
+        np.left_shift(h[:-width], width, out=shifted[:n - width])
+        np.add(h[width:], shifted[:n - width], out=h[width:])
+        width *= 2
+    return h
+
+
+def _high_bits_mask(bits: int) -> np.uint32:
+    """取32位哈希的高bits位作为判定掩码（高位覆盖完整的32字节窗口）"""
+    bits = max(1, min(32, bits))
+    return np.uint32(((1 << bits) - 1) << (32 - bits))
+
+
+class FixedSizeChunker:
+    """固定大小分块"""
+
+    name = "fixed"
+
+    def __init__(self, chunk_size: int):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size必须为正数")
+        self.chunk_size = chunk_size
+
+    def split(self, data: bytes) -> Iterator[bytes]:
+        """按固定大小切分内存中的数据"""
+        for offset in range(0, len(data), self.chunk_size):
+            yield data[offset:offset + self.chunk_size]
+
+    def split_stream(self, stream: BinaryIO) -> Iterator[bytes]:
+        """按固定大小切分文件流"""
+        while True:
+            chunk_data = stream.read(self.chunk_size)
+            if not chunk_data:
+                break
+            yield chunk_data
+
+    def describe(self) -> dict:
+        return {"algorithm": self.name, "chunk_size": self.chunk_size}
+
+
+class FastCDCChunker:
+    """
+    内容定义分块（FastCDC风格）
+    - Gear滚动哈希决定切分点，插入/删除字节只影响附近的块
+    - 归一化分块：avg之前用更严格的掩码，avg之后用更宽松的掩码，使块大小集中在avg附近
+    - 小于min_size的位置不做判定（跳过），超过max_size强制切分
+    - 切分点只取决于当前块起点之后的内容，与读缓冲区如何划分无关
+    """
+
+    name = "cdc"
+    SCAN_BLOCK = 1024 * 1024  # 每次向量化扫描的字节数，限制临时数组大小
+    NORMALIZATION_LEVEL = 2
+
+    def __init__(self, avg_size: int, min_size: Optional[int] = None, max_size: Optional[int] = None):
+        self.avg_size = avg_size
+        self.min_size = min_size or max(avg_size // 4, 2 * GEAR_WINDOW)
+        self.max_size = max_size or avg_size * 4
+        if self.min_size < 2 * GEAR_WINDOW:
+            raise ValueError(f"min_size不能小于{2 * GEAR_WINDOW}字节")
+        if not (self.min_size <= self.avg_size <= self.max_size):
+            raise ValueError("需要满足 min_size <= avg_size <= max_size")
+
+        bits = int(round(math.log2(self.avg_size)))
+        self.mask_s = _high_bits_mask(bits + self.NORMALIZATION_LEVEL)
+        self.mask_l = _high_bits_mask(bits - self.NORMALIZATION_LEVEL)
+
+    def _find_first(self, buf: memoryview, lo: int, hi: int, mask: np.uint32) -> int:
+        """在[lo, hi)中查找第一个满足 hash & mask == 0 的位置，未找到返回-1"""
+        pos = lo
+        while pos < hi:
+            stop = min(pos + self.SCAN_BLOCK, hi)
+            ctx = max(pos - (GEAR_WINDOW - 1), 0)
+            h = gear_hashes(buf[ctx:stop])
+            hits = np.flatnonzero((h[pos - ctx:] & mask) == 0)
+            if hits.size:
+                return pos + int(hits[0])
+            pos = stop
+        return -1
+
+    def _next_cut(self, buf: memoryview, start: int, end: int) -> int:
+        """
+        计算从start开始的块的结束位置
+
+        调用方保证 end - start >= max_size，或者buf[start:end]已是全部剩余数据。
+        """
+        limit = min(start + self.max_size, end)
+        if limit - start <= self.min_size:
+            return limit
+
+        # 块的最后一个字节下标i，块长度为 i + 1 - start
+        normal = min(start + self.avg_size, limit)
+        i = self._find_first(buf, start + self.min_size - 1, normal - 1, self.mask_s)
+        if i < 0:
+            i = self._find_first(buf, normal - 1, limit - 1, self.mask_l)
+        return i + 1 if i >= 0 else limit
+
+    def split(self, data: bytes) -> Iterator[bytes]:
+        """切分内存中的数据"""
+        view = memoryview(data)
+        start, n = 0, len(data)
+        while start < n:
+            end = self._next_cut(view, start, n)
+            yield data[start:end]
+            start = end
+
+    def split_stream(self, stream: BinaryIO) -> Iterator[bytes]:
+        """切分文件流，缓冲区最多保留max_size字节"""
+        buf = b""
+        eof = False
+        while True:
+            while not eof and len(buf) < self.max_size:
+                data = stream.read(self.max_size - len(buf))
+                if not data:
+                    eof = True
+                else:
+                    buf += data
+            if not buf:
+                break
+
+            end = self._next_cut(memoryview(buf), 0, len(buf))
+            yield buf[:end]
+            buf = buf[end:]
+
+    def describe(self) -> dict:
+        return {
+            "algorithm": self.name,
+            "min_size": self.min_size,
+            "avg_size": self.avg_size,
+            "max_size": self.max_size,
+        }
+
+
+def make_chunker(algorithm: str, chunk_size: int, min_size: Optional[int] = None, max_size: Optional[int] = None):
+    """
+    根据算法名创建分块器
+
+    Args:
+        algorithm: 'fixed' 或 'cdc'
+        chunk_size: 固定分块的块大小；CDC的平均块大小
+        min_size: CDC最小块大小（默认 chunk_size // 4）
+        max_size: CDC最大块大小（默认 chunk_size * 4）
+    """
+    if algorithm == FixedSizeChunker.name:
+        return FixedSizeChunker(chunk_size)
+    if algorithm == FastCDCChunker.name:
+        return FastCDCChunker(chunk_size, min_size, max_size)
+    raise ValueError(f"未知的分块算法: {algorithm}")
@@ -0,0 +1,237 @@
+import hashlib
+import struct
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.dedup.chunker import gear_hashes
+from utils.compress import CorruptBlobError
+
+# -------- 相似度特征（超级特征） --------
+SKETCH_FEATURES = 12  # 特征数：每个特征是一个线性变换下Gear哈希的最大值
+SUPER_FEATURES = 3  # 超级特征数：每 SKETCH_FEATURES // SUPER_FEATURES 个特征合并为一个
+SKETCH_SAMPLE_MASK = np.uint32(0xE0000000)  # 只在高3位为0的位置（约1/8）取样，与内容相关、不受偏移影响
+
+
+def _build_transforms():
+    """固定的线性变换参数 (a, b)（由SHA256派生，保证不同进程/机器上的特征一致；a 为奇数）"""
+    a, b = [], []
+    for i in range(SKETCH_FEATURES):
+        digest = hashlib.sha256(b"sketch" + bytes([i])).digest()
+        a.append(int.from_bytes(digest[:4], "little") | 1)
+        b.append(int.from_bytes(digest[4:8], "little"))
+    return np.array(a, dtype=np.uint32), np.array(b, dtype=np.uint32)
+
+
+_TRANSFORM_A, _TRANSFORM_B = _build_transforms()
+
+
+def compute_sketch(data: bytes) -> Tuple[int, ...]:
+    """
+    计算数据块的超级特征
+
+    特征 i 为所有取样位置上 (a_i * h + b_i) mod 2^32 的最大值（h 为Gear滚动哈希），
+    只改动少量字节的两个块大概率得到相同的最大值；相邻的若干特征再合并为一个超级特征，
+    两个块只要有一个超级特征相同即视为相似。结果取31位非负整数，便于各数据库按整数列存储。
+    """
+    h = gear_hashes(data)
+    sample = h[(h & SKETCH_SAMPLE_MASK) == 0]
+    if sample.size == 0:
+        sample = h
+    features = np.empty(SKETCH_FEATURES, dtype=np.uint32)
+    for i in range(SKETCH_FEATURES):
+        features[i] = (sample * _TRANSFORM_A[i] + _TRANSFORM_B[i]).max()
+    group = SKETCH_FEATURES // SUPER_FEATURES
+    return tuple(
+        zlib.crc32(features[j * group:(j + 1) * group].tobytes()) & 0x7FFFFFFF
+        for j in range(SUPER_FEATURES)
+    )
+
+
+# -------- 差分编码 --------
+# 差分格式（再经过封装格式压缩，封装头部带 FLAG_DELTA）:
+#   magic(4) | 基准块哈希(64, ASCII) | 目标长度(8) | 目标CRC32(4) | 操作...
+#   COPY:   0x01 | 基准块偏移(4) | 长度(4)
+#   INSERT: 0x02 | 长度(4) | 数据
+DELTA_MAGIC = b"CKD1"
+_DELTA_HEADER = struct.Struct("<4s64sQI")
+_OP = struct.Struct("<BII")
+_INSERT = struct.Struct("<BI")
+OP_COPY = 0x01
+OP_INSERT = 0x02
+
+ANCHOR_MASK = np.uint32(0xFC000000)  # 锚点：Gear哈希高6位为0，平均约64字节一段
+MIN_MATCH = 16  # 短于该长度的段不建索引
+
+
+def _segments(data: bytes) -> List[Tuple[int, int]]:
+    """按内容定义的锚点把数据切成小段（插入/删除只影响附近的段，其余段在两个版本中对齐）"""
+    if not data:
+        return []
+    cuts = np.flatnonzero((gear_hashes(data) & ANCHOR_MASK) == 0) + 1
+    bounds = [0] + cuts.tolist()
+    if bounds[-1] != len(data):
+        bounds.append(len(data))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _match_forward(a: bytes, ai: int, b: bytes, bi: int, limit: int) -> int:
+    """a[ai:] 与 b[bi:] 的公共前缀长度（不超过limit），按块向量化比较"""
+    n = min(len(a) - ai, len(b) - bi, limit)
+    matched, step = 0, 256
+    while matched < n:
+        k = min(step, n - matched)
+        x = np.frombuffer(a, dtype=np.uint8, count=k, offset=ai + matched)
+        y = np.frombuffer(b, dtype=np.uint8, count=k, offset=bi + matched)
+        diff = np.flatnonzero(x != y)
+        if diff.size:
+            return matched + int(diff[0])
+        matched += k
+        step = min(step * 2, 1 << 20)
+    return n
+
+
+def _match_backward(a: bytes, ai: int, b: bytes, bi: int, limit: int) -> int:
+    """a[:ai] 与 b[:bi] 的公共后缀长度（不超过limit）"""
+    n = min(ai, bi, limit)
+    if n <= 0:
+        return 0
+    x = np.frombuffer(a, dtype=np.uint8, count=n, offset=ai - n)[::-1]
+    y = np.frombuffer(b, dtype=np.uint8, count=n, offset=bi - n)[::-1]
+    diff = np.flatnonzero(x != y)
+    return int(diff[0]) if diff.size else n
+
+
+def encode_delta(base_hash: str, base: bytes, target: bytes) -> bytes:
+    """
+    计算 target 相对 base 的差分
+
+    两边都按内容锚点切段；target 的段在 base 中找到相同内容时，向前、向后逐字节扩展成尽量长的
+    COPY，其余字节作为 INSERT。扩展会吞并后续相同的段，连续相同的区域只产生一个 COPY。
+    """
+    index: Dict[bytes, int] = {}
+    for start, end in _segments(base):
+        if end - start >= MIN_MATCH:
+            index.setdefault(base[start:end], start)
+
+    out = bytearray(_DELTA_HEADER.pack(DELTA_MAGIC, base_hash.encode("ascii"), len(target), zlib.crc32(target)))
+    literal = 0  # 尚未输出的字节起点
+    for start, end in _segments(target):
+        if start < literal or end - start < MIN_MATCH:
+            continue
+        offset = index.get(target[start:end])
+        if offset is None:
+            continue
+        back = _match_backward(target, start, base, offset, start - literal)
+        fwd = _match_forward(target, end, base, offset + end - start, len(target))
+        copy_start, copy_len = start - back, end - start + back + fwd
+        if copy_start > literal:
+            out += _INSERT.pack(OP_INSERT, copy_start - literal) + target[literal:copy_start]
+        out += _OP.pack(OP_COPY, offset - back, copy_len)
+        literal = copy_start + copy_len
+    if literal < len(target):
+        out += _INSERT.pack(OP_INSERT, len(target) - literal) + target[literal:]
+    return bytes(out)
+
+
+def delta_base_hash(delta: bytes) -> str:
+    """差分引用的基准块哈希"""
+    if len(delta) < _DELTA_HEADER.size:
+        raise CorruptBlobError("差分头部不完整")
+    magic, base_hash, _, _ = _DELTA_HEADER.unpack_from(delta)
+    if magic != DELTA_MAGIC:
+        raise CorruptBlobError("不是差分数据")
+    return base_hash.decode("ascii")
+
+
+def apply_delta(delta: bytes, base: bytes) -> bytes:
+    """用基准块数据还原目标数据，并校验长度与CRC32"""
+    delta_base_hash(delta)
+    _, _, size, checksum = _DELTA_HEADER.unpack_from(delta)
+    view = memoryview(delta)
+    out = bytearray()
+    pos = _DELTA_HEADER.size
+    try:
+        while pos < len(delta):
+            op = delta[pos]
+            if op == OP_COPY:
+                _, offset, length = _OP.unpack_from(delta, pos)
+                if offset + length > len(base):
+                    raise CorruptBlobError("差分引用超出基准块范围")
+                out += base[offset:offset + length]
+                pos += _OP.size
+            elif op == OP_INSERT:
+                _, length = _INSERT.unpack_from(delta, pos)
+                pos += _INSERT.size
+                out += view[pos:pos + length]
+                pos += length
+            else:
+                raise CorruptBlobError(f"未知的差分操作: {op}")
+    except struct.error as e:
+        raise CorruptBlobError(f"差分数据不完整: {e}") from e
+    if len(out) != size:
+        raise CorruptBlobError(f"差分还原长度不符: 记录 {size}，实际 {len(out)}")
+    if zlib.crc32(out) != checksum:
+        raise CorruptBlobError("差分还原CRC32校验失败")
+    return bytes(out)
+
+
+class DeltaStats:
+    """
+    增量压缩统计（线程安全，进程内累计）
+    - lookups: 计算了特征并查找基准块的新块；no_base 为没有找到相似块的
+    - encoded: 以差分存储的块；rejected 为差分不够小、仍完整存储的块
+    - delta_bytes / full_bytes: 差分块的实际存储字节数 / 完整存储时的字节数
+    - delta_reads / delta_read_seconds: 读取差分块的次数与还原耗时（含读取基准块），即读取延迟代价
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.no_base = 0
+        self.encoded = 0
+        self.rejected = 0
+        self.delta_bytes = 0
+        self.full_bytes = 0
+        self.encode_seconds = 0.0
+        self.delta_reads = 0
+        self.delta_read_seconds = 0.0
+
+    def record_lookup(self, found: bool):
+        with self._lock:
+            self.lookups += 1
+            if not found:
+                self.no_base += 1
+
+    def record_encode(self, full_size: int, delta_size: Optional[int], seconds: float):
+        """delta_size 为 None 表示差分不够小，仍完整存储"""
+        with self._lock:
+            self.encode_seconds += seconds
+            if delta_size is None:
+                self.rejected += 1
+                return
+            self.encoded += 1
+            self.delta_bytes += delta_size
+            self.full_bytes += full_size
+
+    def record_read(self, seconds: float):
+        with self._lock:
+            self.delta_reads += 1
+            self.delta_read_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'no_base': self.no_base,
+                'encoded': self.encoded,
+                'rejected': self.rejected,
+                'delta_bytes': self.delta_bytes,
+                'full_bytes': self.full_bytes,
+                'saved_bytes': self.full_bytes - self.delta_bytes,
+                'encode_cpu_seconds': self.encode_seconds,
+                'delta_reads': self.delta_reads,
+                'avg_delta_read_ms': 1000 * self.delta_read_seconds / self.delta_reads if self.delta_reads else 0.0,
+            }
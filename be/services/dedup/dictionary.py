@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from flask import has_app_context
+from sqlalchemy import func
+
+from common.db import db
+from utils.compress import TrainedDictionary, compress_for_storage, train_dictionary
+
+
+class DictionarySet:
+    """
+    压缩字典的进程内缓存
+    - current 为新的小块使用的字典（最新版本），由请求线程中的 refresh() 按间隔从数据库刷新，
+      入库工作线程只读这个属性，不访问数据库
+    - get(dict_id) 供解码时按头部的字典id取字典：不在缓存中且有应用上下文时从数据库加载；
+      没有应用上下文的线程（预读、校验）取不到时返回 None，由调用方在请求线程中重试或预先 load_all()
+    """
+
+    def __init__(self, model, refresh_interval: float = 60):
+        """
+        Args:
+            model: ChunkDictionary
+            refresh_interval: 检查新版本字典的间隔（秒）
+        """
+        self.model = model
+        self.refresh_interval = refresh_interval
+        self.current: Optional[TrainedDictionary] = None
+        self._by_id: Dict[int, TrainedDictionary] = {}
+        self._lock = threading.Lock()
+        self._checked_at = None
+
+    def _add(self, dict_id: int, data: bytes) -> TrainedDictionary:
+        with self._lock:
+            dictionary = self._by_id.get(dict_id)
+            if dictionary is None:
+                dictionary = self._by_id[dict_id] = TrainedDictionary(dict_id, data)
+            return dictionary
+
+    def get(self, dict_id: int) -> Optional[TrainedDictionary]:
+        dictionary = self._by_id.get(dict_id)
+        if dictionary is None and has_app_context():
+            data = self.model.load_many([dict_id]).get(dict_id)
+            if data is not None:
+                dictionary = self._add(dict_id, data)
+        return dictionary
+
+    def load_all(self):
+        """加载所有版本的字典（在启动工作线程前调用）"""
+        loaded = set(self._by_id)
+        for dict_id, data in self.model.load_many().items():
+            if dict_id not in loaded:
+                self._add(dict_id, data)
+
+    def refresh(self, force: bool = False) -> Optional[TrainedDictionary]:
+        """按间隔检查是否有新版本字典（需要应用上下文），返回当前使用的字典"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return self.current
+        self._checked_at = now
+        latest_id = self.model.latest_id()
+        if latest_id is not None and (self.current is None or self.current.dict_id != latest_id):
+            self.current = self.get(latest_id)
+        return self.current
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+class DictionaryTrainer:
+    """
+    压缩字典的后台训练任务（由定时任务执行 flask chunk-dict-train）
+    - 从已存储的小块（原始大小不超过 max_chunk_size）中随机抽样，解码后训练 zstd 字典
+    - 样本按 8:2 划分训练/留出，留出样本上比当前配置（当前版本字典，没有时为不用字典的压缩）更小才发布
+    - 距上一版本不足 retrain_seconds 时跳过（force 除外）；发布后本进程立即切换，其他进程在刷新间隔内切换
+    - 已发布的字典永不删除：块头部记录的字典id始终可以解码
+    """
+
+    MIN_SAMPLES = 20  # 样本太少时 zstd 无法训练出有效字典
+
+    def __init__(self, store, sample_chunks: int = 2000, dict_size: int = 112640,
+                 max_chunk_size: int = 64 * 1024, retrain_seconds: float = 24 * 3600):
+        """
+        Args:
+            store: DatabaseChunkStore
+            sample_chunks: 抽样的块数上限
+            dict_size: 字典大小（字节）
+            max_chunk_size: 参与抽样的块的最大原始大小
+            retrain_seconds: 两个版本之间的最短间隔
+        """
+        self.store = store
+        self.Chunk = store.Chunk
+        self.ChunkDictionary = store.ChunkDictionary
+        self.sample_chunks = max(self.MIN_SAMPLES, sample_chunks)
+        self.dict_size = dict_size
+        self.max_chunk_size = max_chunk_size
+        self.retrain_seconds = retrain_seconds
+
+    def _samples(self) -> List[bytes]:
+        """随机抽样小块并解码（ORDER BY random() 扫描一遍块表，按天执行的任务可以接受）"""
+        Chunk = self.Chunk
+        rows = db.session.query(Chunk.chunk_hash, Chunk.storage_path).filter(
+            Chunk.chunk_size > 0, Chunk.chunk_size <= self.max_chunk_size
+        ).order_by(func.random()).limit(self.sample_chunks).all()
+        samples = []
+        for chunk_hash, storage_path in rows:
+            blob = self.store._read_chunk_blob(storage_path)
+            if blob is None:
+                continue
+            try:
+                samples.append(self.store._decode_chunk_blob(blob))
+            except Exception:
+                continue
+        return samples
+
+    def _ratio(self, samples: Iterable[bytes], dictionary: Optional[TrainedDictionary]) -> float:
+        """按当前压缩配置封装后的总大小 / 原始总大小"""
+        options = self.store._compression_options()
+        raw = stored = 0
+        for data in samples:
+            raw += len(data)
+            stored += len(compress_for_storage(data, dictionary=dictionary, **options))
+        return stored / raw if raw else 1.0
+
+    def run(self, force: bool = False, dry_run: bool = False) -> Dict:
+        """
+        Returns:
+            Dict: {'samples', 'sample_bytes', 'dict_bytes', 'baseline_ratio', 'current_ratio', 'candidate_ratio',
+                   'published', 'dict_id', 'skipped', 'runtime_seconds', 'dry_run'}
+        """
+        started = time.perf_counter()
+        report = {'samples': 0, 'sample_bytes': 0, 'dict_bytes': 0, 'baseline_ratio': None,
+                  'current_ratio': None, 'candidate_ratio': None, 'published': False,
+                  'dict_id': None, 'skipped': None, 'dry_run': dry_run}
+
+        def done(skipped=None):
+            report['skipped'] = skipped
+            report['runtime_seconds'] = round(time.perf_counter() - started, 3)
+            return report
+
+        latest = self.ChunkDictionary.latest()
+        if latest is not None and not force:
+            age = datetime.now(timezone.utc).replace(tzinfo=None) - latest.created_at
+            if age.total_seconds() < self.retrain_seconds:
+                report['dict_id'] = latest.id
+                return done('recent')
+
+        samples = self._samples()
+        report['samples'] = len(samples)
+        report['sample_bytes'] = sum(len(data) for data in samples)
+        if len(samples) < self.MIN_SAMPLES:
+            return done('not_enough_samples')
+
+        holdout, training = samples[:len(samples) // 5], samples[len(samples) // 5:]
+        level = self.store.compression_level if self.store.compression_codec == "zstd" else None
+        try:
+            data = train_dictionary(training, self.dict_size, level)
+        except Exception:
+            return done('training_failed')
+        report['dict_bytes'] = len(data)
+
+        current = self.store.dictionaries.refresh(force=True)
+        report['baseline_ratio'] = self._ratio(holdout, None)
+        report['current_ratio'] = self._ratio(holdout, current) if current is not None else None
+        report['candidate_ratio'] = self._ratio(holdout, TrainedDictionary(0, data))
+        best = min(ratio for ratio in (report['baseline_ratio'], report['current_ratio']) if ratio is not None)
+        if report['candidate_ratio'] >= best:
+            return done('no_improvement')
+        if dry_run:
+            return done()
+
+        report['dict_id'] = self.ChunkDictionary.publish(
+            data, len(training), sum(len(sample) for sample in training), report['candidate_ratio']
+        )
+        report['published'] = True
+        self.store.dictionaries.refresh(force=True)
+        return done()
@@ -0,0 +1,169 @@
+import heapq
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import exists
+
+from common.db import db
+
+
+def _sorted_difference(left: Iterator[str], right: Iterator[str]) -> Iterator[str]:
+    """两个升序序列的差集 left - right（归并，不加载到内存）"""
+    current = next(right, None)
+    for item in left:
+        while current is not None and current < item:
+            current = next(right, None)
+        if current != item:
+            yield item
+
+
+class GarbageCollector:
+    """
+    块存储的标记-清除垃圾回收
+    - 标记：被任意 FileChunkMapping 引用的块、以及作为差分块基准的块为存活块；
+      按哈希升序流式读取块表、映射表和差分表，归并求差得到候选块
+    - 清除：按批次删除候选块的数据库记录，提交后再删除块文件（包内的块只留下死字节，由包压缩回收；
+      对象存储中的块批量删除）
+    - 删除语句重新校验“无映射引用、不是基准块且超过宽限期未更新”，已提交引用的块不会被删除；
+      上传在存在性检查之后才提交引用，提交前在同一事务中重新确认复用的块仍然存在，被回收时回滚重试
+    - 块文件/对象的位置由哈希决定，删除前在推进删除纪元的事务中重新检查，并发上传已重新写入并提交的块不删除
+      （见 DatabaseChunkStore._remove_unreferenced_blobs）
+    - 差分块被回收后，其基准块在下一轮（或本轮稍后的批次）中才成为候选块
+    - 每批提交时在同一事务中保存断点，中断后从断点继续；可限制每秒删除数，支持只统计不删除
+    """
+
+    CHECKPOINT_TASK = "chunk_gc"
+
+    def __init__(self, store, batch_size: int = 1000, grace_seconds: float = 3600,
+                 max_deletes_per_second: float = 0):
+        """
+        Args:
+            store: DatabaseChunkStore
+            batch_size: 每批回收的块数（一批一次提交）
+            grace_seconds: 块记录在该时间内有更新（刚写入/刚减少引用）时不回收
+            max_deletes_per_second: 每秒最多回收的块数，0表示不限制
+        """
+        self.store = store
+        self.Chunk = store.Chunk
+        self.FileChunkMapping = store.FileChunkMapping
+        self.ChunkDelta = store.ChunkDelta
+        # 延迟导入避免循环依赖
+        from models.chunk import MaintenanceCheckpoint
+        self.MaintenanceCheckpoint = MaintenanceCheckpoint
+        self.batch_size = max(1, batch_size)
+        self.grace_seconds = grace_seconds
+        self.max_deletes_per_second = max_deletes_per_second
+
+    def _garbage_filter(self, cutoff: datetime):
+        Chunk, FileChunkMapping, ChunkDelta = self.Chunk, self.FileChunkMapping, self.ChunkDelta
+        return (
+            Chunk.updated_at < cutoff,
+            ~exists().where(FileChunkMapping.chunk_hash == Chunk.chunk_hash),
+            ~exists().where(ChunkDelta.base_hash == Chunk.chunk_hash),
+        )
+
+    def _candidates(self, after: str) -> Iterator[str]:
+        batch_size = self.batch_size * 10
+        return _sorted_difference(
+            self.Chunk.iter_hashes(batch_size=batch_size, after=after),
+            heapq.merge(
+                self.FileChunkMapping.iter_chunk_hashes(batch_size=batch_size, after=after),
+                self.ChunkDelta.iter_base_hashes(batch_size=batch_size, after=after),
+            ),
+        )
+
+    def _sweep_batch(self, batch: List[str], cutoff: datetime, dry_run: bool, stats: Dict) -> List:
+        """回收一批候选块，返回已删除记录的 [(chunk_hash, storage_path), ...]（调用方负责提交）"""
+        Chunk = self.Chunk
+        conditions = self._garbage_filter(cutoff)
+        rows = db.session.query(Chunk.id, Chunk.chunk_hash, Chunk.storage_path, Chunk.compressed_size).filter(
+            Chunk.chunk_hash.in_(batch), *conditions
+        ).all()
+        stats['candidates'] += len(batch)
+        stats['skipped_recent'] += len(batch) - len(rows)
+        if dry_run or not rows:
+            stats['reclaimable'] += len(rows)
+            return []
+
+        ids = [row.id for row in rows]
+        Chunk.query.filter(Chunk.id.in_(ids), *conditions).delete(synchronize_session=False)
+        # 查询与删除之间被重新引用的块不会被删除，剔除后才是真正删除的记录
+        survivors = {row[0] for row in db.session.query(Chunk.id).filter(Chunk.id.in_(ids))}
+        deleted = [row for row in rows if row.id not in survivors]
+        stats['skipped_recent'] += len(survivors)
+        stats['reclaimed_chunks'] += len(deleted)
+        stats['reclaimed_bytes'] += sum(row.compressed_size or 0 for row in deleted)
+        self.store._forget_chunks([row.chunk_hash for row in deleted])
+        return [(row.chunk_hash, row.storage_path) for row in deleted]
+
+    def _remove_blobs(self, deleted: List, stats: Dict):
+        for chunk_hash, _ in deleted:
+            self.store.chunk_cache.discard(chunk_hash)
+        # 按后端批量删除（对象存储每次请求最多1000个）；本地文件残留由孤立块清理回收
+        stats['remove_errors'] += self.store._remove_unreferenced_blobs(deleted)
+        # 过滤器不支持删除，累计到一定数量后重建
+        self.store._filter_deletes += len(deleted)
+
+    def _throttle(self, started: float, deleted: int):
+        """按本轮已删除的块数限速，避免回收的删除I/O挤占前台读写"""
+        if self.max_deletes_per_second and deleted:
+            expected = deleted / self.max_deletes_per_second
+            elapsed = time.perf_counter() - started
+            if expected > elapsed:
+                time.sleep(expected - elapsed)
+
+    def run(self, dry_run: bool = False, max_batches: Optional[int] = None, resume: bool = True) -> Dict:
+        """
+        执行一轮回收
+
+        Args:
+            dry_run: 只统计可回收的块，不删除、不保存断点
+            max_batches: 最多处理的批数（增量运行），未处理完时保留断点，下次从断点继续
+            resume: 是否从上次的断点继续，False时从头开始
+
+        Returns:
+            Dict: {'candidates', 'reclaimed_chunks', 'reclaimed_bytes', 'reclaimable', 'skipped_recent',
+                   'remove_errors', 'batches', 'completed', 'resumed_from', 'runtime_seconds', 'dry_run'}
+        """
+        started = time.perf_counter()
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.grace_seconds)
+        MaintenanceCheckpoint = self.MaintenanceCheckpoint
+
+        cursor, saved = MaintenanceCheckpoint.load(self.CHECKPOINT_TASK) if resume else ('', {})
+        stats = {key: saved.get(key, 0) if not dry_run else 0 for key in (
+            'candidates', 'reclaimed_chunks', 'reclaimed_bytes', 'reclaimable', 'skipped_recent', 'remove_errors'
+        )}
+        report = {'batches': 0, 'completed': False, 'resumed_from': cursor, 'dry_run': dry_run}
+        deleted_this_run = 0
+
+        candidates = self._candidates(cursor)
+        try:
+            while max_batches is None or report['batches'] < max_batches:
+                batch = [h for _, h in zip(range(self.batch_size), candidates)]
+                if not batch:
+                    report['completed'] = True
+                    break
+
+                deleted = self._sweep_batch(batch, cutoff, dry_run, stats)
+                if not dry_run:
+                    MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, batch[-1], stats, commit=False)
+                    db.session.commit()
+                    errors = stats['remove_errors']
+                    self._remove_blobs(deleted, stats)
+                    if stats['remove_errors'] != errors:
+                        # 块文件在提交后才删除，删除失败的计数补记到断点中
+                        MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, batch[-1], stats)
+                    deleted_this_run += len(deleted)
+                report['batches'] += 1
+                self._throttle(started, deleted_this_run)
+
+            if report['completed'] and not dry_run:
+                MaintenanceCheckpoint.clear(self.CHECKPOINT_TASK)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        report.update(stats)
+        report['runtime_seconds'] = time.perf_counter() - started
+        return report
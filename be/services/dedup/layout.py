@@ -0,0 +1,284 @@
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional
+
+from common.db import db
+from services.dedup.durability import fsync_dir, tmp_path_for
+from services.dedup.packfile import PackStore
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def iter_shard_dirs(base_dir: str, depth: int = 1, width: int = 2) -> Iterator[str]:
+    """按名称顺序产出 base_dir 下叶子分片目录的相对路径（逐层惰性遍历，不一次列出全部目录）"""
+    def walk(relative: str, level: int):
+        try:
+            with os.scandir(os.path.join(base_dir, relative)) as entries:
+                names = sorted(
+                    e.name for e in entries
+                    if len(e.name) == width and _HEX_DIGITS.issuperset(e.name) and e.is_dir(follow_symlinks=False)
+                )
+        except FileNotFoundError:
+            return
+        for name in names:
+            child = os.path.join(relative, name) if relative else name
+            if level + 1 == depth:
+                yield child
+            else:
+                yield from walk(child, level + 1)
+
+    return walk("", 0)
+
+
+class ChunkLayout:
+    """
+    块文件的目录布局描述
+    - 版本 1（旧布局）：直接位于根目录下，哈希前两位一级分片，<root>/ab/<hash>
+    - 版本 2：位于根目录下的 v2-<层数>x<每层字符数> 子目录，分片层数可配置，
+      如 2x2 为 <root>/v2-2x2/ab/cd/<hash>（65536 个叶子目录，1亿块时每目录约1500项）
+    - 版本 2 的布局目录中写入 layout.json 描述文件，参数与描述文件不一致时拒绝启动
+    - 已创建的目录在进程内缓存，写入块时不再每次调用 makedirs
+    """
+
+    CURRENT_VERSION = 2
+    DESCRIPTOR_NAME = "layout.json"
+
+    def __init__(self, root: str, depth: int = 2, width: int = 2, version: int = CURRENT_VERSION,
+                 durable: bool = False):
+        if version not in (1, 2):
+            raise ValueError(f"不支持的块布局版本: {version}")
+        if version == 1 and (depth, width) != (1, 2):
+            raise ValueError("版本 1 布局固定为一级两位分片")
+        if depth < 1 or width < 1 or depth * width > 8:
+            raise ValueError(f"无效的分片参数: depth={depth}, width={width}")
+        self.root = root
+        self.version = version
+        self.depth = depth
+        self.width = width
+        self.base_dir = root if version == 1 else os.path.join(root, f"v{version}-{depth}x{width}")
+        self.durable = durable  # 新建分片目录后 fsync 上级目录，保证目录项落盘
+        self._created_dirs = set()
+
+    @classmethod
+    def legacy(cls, root: str) -> "ChunkLayout":
+        return cls(root, depth=1, width=2, version=1)
+
+    def describe(self) -> Dict:
+        return {'version': self.version, 'depth': self.depth, 'width': self.width, 'path': self.base_dir}
+
+    def __eq__(self, other):
+        return isinstance(other, ChunkLayout) and self.base_dir == other.base_dir
+
+    def __hash__(self):
+        return hash(self.base_dir)
+
+    # -------- 描述文件 --------
+    def initialize(self):
+        """创建布局目录并写入/校验描述文件"""
+        os.makedirs(self.base_dir, exist_ok=True)
+        if self.version == 1:
+            return
+        descriptor_path = os.path.join(self.base_dir, self.DESCRIPTOR_NAME)
+        descriptor = {'version': self.version, 'depth': self.depth, 'width': self.width}
+        try:
+            with open(descriptor_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+        except FileNotFoundError:
+            tmp_path = f"{descriptor_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(descriptor, f)
+            os.replace(tmp_path, descriptor_path)
+            return
+        if existing != descriptor:
+            raise ValueError(f"块布局描述文件与配置不一致: {descriptor_path} {existing} != {descriptor}")
+
+    # -------- 路径 --------
+    def shard_parts(self, chunk_hash: str) -> List[str]:
+        return [chunk_hash[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+
+    def chunk_dir(self, chunk_hash: str) -> str:
+        return os.path.join(self.base_dir, *self.shard_parts(chunk_hash))
+
+    def path_for(self, chunk_hash: str, create: bool = True) -> str:
+        """块文件路径；create=True 时确保目录存在（每个目录每进程只创建一次）"""
+        chunk_dir = self.chunk_dir(chunk_hash)
+        if create and chunk_dir not in self._created_dirs:
+            if self.durable and not os.path.isdir(chunk_dir):
+                self._make_dirs_durable(chunk_dir)
+            else:
+                os.makedirs(chunk_dir, exist_ok=True)
+            self._created_dirs.add(chunk_dir)
+        return os.path.join(chunk_dir, chunk_hash)
+
+    def _make_dirs_durable(self, chunk_dir: str):
+        """逐级创建分片目录，每新建一级就 fsync 其上级目录（分片目录总数有限，只发生在首次写入时）"""
+        missing = []
+        path = chunk_dir
+        while not os.path.isdir(path):
+            missing.append(path)
+            path = os.path.dirname(path)
+        for path in reversed(missing):
+            os.makedirs(path, exist_ok=True)
+            fsync_dir(os.path.dirname(path))
+
+    def forget_dir(self, chunk_hash: str):
+        """目录被外部删除后清除缓存，下次写入时重新创建"""
+        self._created_dirs.discard(self.chunk_dir(chunk_hash))
+
+    def contains(self, storage_path: str) -> bool:
+        """storage_path 是否就是该布局下的位置"""
+        name = os.path.basename(storage_path)
+        return os.path.normpath(storage_path) == os.path.normpath(self.path_for(name, create=False))
+
+    def iter_shards(self) -> Iterator[str]:
+        """按名称顺序产出叶子分片目录的相对路径"""
+        return iter_shard_dirs(self.base_dir, self.depth, self.width)
+
+
+class LayoutMigrator:
+    """
+    在线迁移块文件到新布局
+    - 按哈希顺序分批处理不在目标布局中的独立块文件（包内、冷层中的块不受布局影响）
+    - 每个块：硬链接（跨文件系统时复制）到新位置 → 条件更新 storage_path（位置未被其他任务改写时）
+      → 提交后删除旧文件；提交前读取旧位置的请求照常成功，提交后读取失败时会重新查询位置
+    - 每批提交时在同一事务中保存断点，中断后从断点继续；可限制每秒迁移的块数
+    """
+
+    CHECKPOINT_TASK = "chunk_layout_migrate"
+
+    def __init__(self, store, target: ChunkLayout, batch_size: int = 500, max_chunks_per_second: float = 0):
+        """
+        Args:
+            store: DatabaseChunkStore
+            target: 目标布局
+            batch_size: 每批迁移的块数（一批一次提交）
+            max_chunks_per_second: 每秒最多迁移的块数，0表示不限制
+        """
+        self.store = store
+        self.Chunk = store.Chunk
+        # 延迟导入避免循环依赖
+        from models.chunk import MaintenanceCheckpoint
+        from services.dedup.object_store import ObjectStore
+        self.MaintenanceCheckpoint = MaintenanceCheckpoint
+        self.object_prefix = ObjectStore.LOCATION_PREFIX
+        self.target = target
+        self.batch_size = max(1, batch_size)
+        self.max_chunks_per_second = max_chunks_per_second
+
+    def _next_batch(self, after: str) -> List:
+        Chunk = self.Chunk
+        return db.session.query(Chunk.id, Chunk.chunk_hash, Chunk.storage_path).filter(
+            Chunk.chunk_hash > after,
+            ~Chunk.storage_path.like(PackStore.LOCATION_PREFIX + '%'),
+            ~Chunk.storage_path.like(self.object_prefix + '%'),
+        ).order_by(Chunk.chunk_hash).limit(self.batch_size).all()
+
+    def _place(self, source: str, destination: str):
+        """把块文件放到新位置（优先硬链接，不复制数据）"""
+        try:
+            os.link(source, destination)
+        except FileExistsError:
+            # 上次中断留下的副本或相同内容的新写入，内容由哈希决定，直接复用
+            pass
+        except OSError:
+            tmp_path = tmp_path_for(destination)
+            shutil.copyfile(source, tmp_path)
+            if self.target.durable:
+                with open(tmp_path, "rb") as f:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, destination)
+
+    def _migrate_batch(self, rows: List, dry_run: bool, stats: Dict) -> List[str]:
+        """迁移一批块，返回提交后需要删除的旧文件路径（调用方负责提交）"""
+        Chunk = self.Chunk
+        stale = []
+        new_dirs = set()
+        for row in rows:
+            if self.target.contains(row.storage_path):
+                stats['already_migrated'] += 1
+                continue
+            if not os.path.exists(row.storage_path):
+                stats['missing'] += 1
+                continue
+            if dry_run:
+                stats['pending'] += 1
+                continue
+
+            destination = self.target.path_for(row.chunk_hash)
+            self._place(row.storage_path, destination)
+            new_dirs.add(os.path.dirname(destination))
+            updated = Chunk.query.filter_by(id=row.id, storage_path=row.storage_path).update(
+                {'storage_path': destination}, synchronize_session=False
+            )
+            if updated:
+                stale.append(row.storage_path)
+                stats['migrated'] += 1
+            else:
+                # 块在此期间被回收或位置被改写，新副本由孤立块清理回收
+                stats['skipped_changed'] += 1
+        if self.target.durable:
+            # 新位置的目录项落盘后才提交位置更新
+            for directory in new_dirs:
+                fsync_dir(directory)
+        return stale
+
+    def run(self, dry_run: bool = False, max_batches: Optional[int] = None, resume: bool = True) -> Dict:
+        """
+        执行迁移
+
+        Returns:
+            Dict: {'migrated', 'already_migrated', 'missing', 'skipped_changed', 'pending', 'remove_errors',
+                   'batches', 'completed', 'resumed_from', 'target', 'runtime_seconds', 'dry_run'}
+        """
+        started = time.perf_counter()
+        MaintenanceCheckpoint = self.MaintenanceCheckpoint
+        cursor, saved = MaintenanceCheckpoint.load(self.CHECKPOINT_TASK) if resume and not dry_run else ('', {})
+        stats = {key: saved.get(key, 0) for key in (
+            'migrated', 'already_migrated', 'missing', 'skipped_changed', 'pending', 'remove_errors'
+        )}
+        report = {'batches': 0, 'completed': False, 'resumed_from': cursor,
+                  'target': self.target.describe(), 'dry_run': dry_run}
+        self.target.initialize()
+        migrated_this_run = 0
+
+        try:
+            while max_batches is None or report['batches'] < max_batches:
+                rows = self._next_batch(cursor)
+                if not rows:
+                    report['completed'] = True
+                    break
+
+                stale = self._migrate_batch(rows, dry_run, stats)
+                cursor = rows[-1].chunk_hash
+                if not dry_run:
+                    MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, cursor, stats, commit=False)
+                    db.session.commit()
+                    errors = stats['remove_errors']
+                    for path in stale:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            stats['remove_errors'] += 1
+                    if stats['remove_errors'] != errors:
+                        # 块文件在提交后才删除，删除失败的计数补记到断点中
+                        MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, cursor, stats)
+                    migrated_this_run += len(stale)
+                report['batches'] += 1
+
+                if self.max_chunks_per_second and migrated_this_run:
+                    expected = migrated_this_run / self.max_chunks_per_second
+                    elapsed = time.perf_counter() - started
+                    if expected > elapsed:
+                        time.sleep(expected - elapsed)
+
+            if report['completed'] and not dry_run:
+                MaintenanceCheckpoint.clear(self.CHECKPOINT_TASK)
+        except Exception:
+            db.session.rollback()
+            raise
+
+        report.update(stats)
+        report['runtime_seconds'] = time.perf_counter() - started
+        return report
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Iterator, Optional
 from services.dedup.chunk_store import DatabaseChunkStore
 
 
@@ -48,15 +48,23 @@ class Md5Store:
         return self.chunk_store.exists_ref(file_hash)
 
     # -------- blob ops --------
-    def ensure_blob(self, data: bytes) -> str:
+    def ensure_blob(self, data: bytes, filename: Optional[str] = None) -> str:
         """Ensure blob exists for data; returns file hash."""
-        # 使用块存储系统存储数据
-        return self.chunk_store.ensure_blob(data)
+        # 使用块存储系统存储数据（文件名用于选择分块参数）
+        return self.chunk_store.ensure_blob(data, filename)
 
     def read_blob(self, file_hash: str) -> Optional[bytes]:
         """读取文件数据"""
         return self.chunk_store.read_blob(file_hash)
 
+    def open_blob(self, file_hash: str, start: int = 0, end: int = None) -> Optional[Iterator[bytes]]:
+        """按块流式读取文件数据（或字节区间 [start, end)），只读取重叠的数据块"""
+        return self.chunk_store.open_blob(file_hash, start, end)
+
+    def blob_size(self, file_hash: str) -> Optional[int]:
+        """获取文件大小，不读取数据"""
+        return self.chunk_store.blob_size(file_hash)
+
     # -------- additional utility methods --------
     def get_storage_stats(self):
         """获取存储统计信息"""
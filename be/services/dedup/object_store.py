@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+
+from services.dedup.backend import ChunkBackend
+from services.dedup.durability import SyncBatch
+
+
+class ObjectStore(ChunkBackend):
+    """
+    S3 兼容对象存储（AWS S3 / MinIO / moto）上的块数据
+    - 每个块一个对象，键为 prefix + 块哈希；块位置编码为 "s3:<键>" 存在 Chunk.storage_path 中
+    - 块是否存在以数据库记录为准，读写都不发 HEAD 请求；读取不存在的对象时返回 None
+    - 同时进行的请求数不超过 max_concurrency（所有线程共享，包括预读、校验线程）；
+      put_many 在内部线程池中并发上传，PUT 返回即已持久化，不需要组提交
+    - 删除使用批量删除接口（每次请求最多 1000 个键）
+    - 客户端在首次使用时创建（boto3 客户端线程安全，连接池大小与并发上限一致）
+    """
+
+    LOCATION_PREFIX = "s3:"
+    DELETE_BATCH = 1000  # DeleteObjects 单次请求的键数上限
+
+    def __init__(self, bucket: str, prefix: str = "chunks/", endpoint_url: Optional[str] = None, client=None,
+                 max_concurrency: int = 16):
+        """
+        Args:
+            bucket: 存储桶
+            prefix: 对象键前缀
+            endpoint_url: 自定义端点（MinIO 等），默认使用 AWS
+            client: 已创建的 S3 客户端，默认按 endpoint_url 创建
+            max_concurrency: 同时进行的请求数上限
+        """
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.max_concurrency = max(1, max_concurrency)
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client('s3', endpoint_url=self.endpoint_url, config=BotoConfig(
+                        max_pool_connections=self.max_concurrency
+                    ))
+        return self._client
+
+    @classmethod
+    def is_object_location(cls, storage_path: Optional[str]) -> bool:
+        return bool(storage_path) and storage_path.startswith(cls.LOCATION_PREFIX)
+
+    @classmethod
+    def make_location(cls, key: str) -> str:
+        return f"{cls.LOCATION_PREFIX}{key}"
+
+    @classmethod
+    def parse_location(cls, location: str) -> str:
+        """解析位置，返回对象键"""
+        return location[len(cls.LOCATION_PREFIX):]
+
+    def key_for(self, chunk_hash: str) -> str:
+        return f"{self.prefix}{chunk_hash}"
+
+    def put(self, chunk_hash: str, blob: bytes) -> str:
+        """上传块数据（相同内容的重复上传直接覆盖），返回存储位置"""
+        key = self.key_for(chunk_hash)
+        with self._slots:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=blob)
+        return self.make_location(key)
+
+    def put_many(self, items: List[Tuple[str, bytes]], sync: Optional[SyncBatch] = None) -> List[str]:
+        """并发上传一批块，按顺序返回存储位置；任一上传失败时抛出异常（已上传的对象留给重试覆盖）"""
+        if len(items) <= 1:
+            return [self.put(chunk_hash, blob) for chunk_hash, blob in items]
+        if self._executor is None:
+            with self._client_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency, thread_name_prefix="chunk-s3"
+                    )
+        return list(self._executor.map(lambda item: self.put(*item), items))
+
+    def read(self, location: str) -> Optional[bytes]:
+        """按位置读取块数据，对象不存在时返回 None"""
+        with self._slots:
+            try:
+                response = self.client.get_object(Bucket=self.bucket, Key=self.parse_location(location))
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                    return None
+                raise
+            return response['Body'].read()
+
+    def delete_many(self, locations: Iterable[str]) -> int:
+        """批量删除对象（不存在的键视为删除成功），返回删除失败的对象数"""
+        keys = [self.parse_location(location) for location in locations]
+        errors = 0
+        for i in range(0, len(keys), self.DELETE_BATCH):
+            with self._slots:
+                response = self.client.delete_objects(Bucket=self.bucket, Delete={
+                    'Objects': [{'Key': key} for key in keys[i:i + self.DELETE_BATCH]],
+                    'Quiet': True,
+                })
+            errors += len(response.get('Errors', []))
+        return errors
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
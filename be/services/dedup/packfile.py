@@ -0,0 +1,262 @@
+import fcntl
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from services.dedup.durability import fsync_dir
+
+
+class _ReadFd:
+    """缓存的只读文件描述符：移出缓存后由最后一个使用者关闭，不会关闭其他线程正在 pread 的描述符"""
+
+    __slots__ = ("fd", "users", "retired")
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.users = 0
+        self.retired = False
+
+
+class PackStore:
+    """
+    小块的追加写包文件存储
+    - 多个块顺序追加到同一个 .pack 文件，避免每个块占用一个文件/inode
+    - 每个包文件配一个 .idx 索引文件，逐条追加 (块哈希, 偏移, 长度)
+    - 块位置编码为 "pack:<包名>:<偏移>:<长度>" 存在 Chunk.storage_path 中，读取时一次 pread
+    - 每个进程只向自己创建的包追加，包名包含时间戳/进程号，多进程写入互不干扰
+    - 追加中的包由写入进程持有文件独占锁（flock，进程退出时自动释放），换包或 seal() 后释放；
+      释放后的包不会再被追加（已封存），压缩只处理取得锁的包（见 lock_sealed）
+    - 读取用的文件描述符按 LRU 缓存，最多 max_read_fds 个
+    - 持久模式下由 sync() 在数据库提交前统一 fsync 当前包（SyncBatch 组提交），换包时先 fsync 旧包
+    """
+
+    LOCATION_PREFIX = "pack:"
+    PACK_SUFFIX = ".pack"
+    INDEX_SUFFIX = ".idx"
+    _INDEX_RECORD = struct.Struct("<32sQI")  # 哈希(32字节) + 偏移 + 长度
+
+    MAX_READ_FDS = 256
+
+    def __init__(self, packs_dir: str, max_pack_size: int = 64 * 1024 * 1024, durable: bool = False,
+                 max_read_fds: int = MAX_READ_FDS):
+        self.packs_dir = packs_dir
+        self.max_pack_size = max_pack_size
+        self.durable = durable
+        self.max_read_fds = max(1, max_read_fds)
+        os.makedirs(self.packs_dir, exist_ok=True)
+        self._dir_dirty = False
+
+        self._write_lock = threading.Lock()
+        self._active_name = None
+        self._active_fd = None
+        self._active_index_fd = None
+        self._active_size = 0
+
+        self._read_lock = threading.Lock()
+        self._read_fds: "OrderedDict[str, _ReadFd]" = OrderedDict()
+
+    # -------- 位置编码 --------
+    @classmethod
+    def is_pack_location(cls, storage_path: Optional[str]) -> bool:
+        return bool(storage_path) and storage_path.startswith(cls.LOCATION_PREFIX)
+
+    @classmethod
+    def make_location(cls, pack_name: str, offset: int, length: int) -> str:
+        return f"{cls.LOCATION_PREFIX}{pack_name}:{offset}:{length}"
+
+    @classmethod
+    def parse_location(cls, location: str) -> Tuple[str, int, int]:
+        """解析位置，返回 (包名, 偏移, 长度)"""
+        pack_name, offset, length = location[len(cls.LOCATION_PREFIX):].rsplit(":", 2)
+        return pack_name, int(offset), int(length)
+
+    def pack_path(self, pack_name: str) -> str:
+        return os.path.join(self.packs_dir, pack_name + self.PACK_SUFFIX)
+
+    def index_path(self, pack_name: str) -> str:
+        return os.path.join(self.packs_dir, pack_name + self.INDEX_SUFFIX)
+
+    # -------- 写入 --------
+    def _open_new_pack(self):
+        """关闭当前包并新建一个（调用方持有写锁）"""
+        self._close_active()
+        pack_name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self._active_fd = os.open(self.pack_path(pack_name), flags, 0o644)
+        # 持有独占锁直到换包/关闭：其他进程的压缩任务取不到锁就不会处理这个包；
+        # 压缩任务可能恰好锁住了刚创建的空包，它会跳过空包并很快释放
+        fcntl.flock(self._active_fd, fcntl.LOCK_EX)
+        self._active_index_fd = os.open(self.index_path(pack_name), flags, 0o644)
+        self._active_name = pack_name
+        self._active_size = 0
+        self._dir_dirty = True
+
+    def _sync_active(self):
+        """fsync 当前包和索引，以及新建包的目录项（调用方持有写锁）"""
+        for fd in (self._active_fd, self._active_index_fd):
+            if fd is not None:
+                os.fsync(fd)
+        if self._dir_dirty:
+            fsync_dir(self.packs_dir)
+            self._dir_dirty = False
+
+    def _close_active(self):
+        if self.durable:
+            # 换包后旧包的文件描述符不再可用，先落盘
+            self._sync_active()
+        for fd in (self._active_fd, self._active_index_fd):
+            if fd is not None:
+                os.close(fd)
+        self._active_name = self._active_fd = self._active_index_fd = None
+        self._active_size = 0
+
+    @staticmethod
+    def _write_all(fd: int, data: bytes):
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+    def append(self, chunk_hash: str, blob: bytes) -> str:
+        """
+        追加一个块到当前包文件
+
+        Returns:
+            str: 块位置 "pack:<包名>:<偏移>:<长度>"
+        """
+        with self._write_lock:
+            if self._active_fd is None or self._active_size + len(blob) > self.max_pack_size:
+                self._open_new_pack()
+
+            offset = self._active_size
+            self._write_all(self._active_fd, blob)
+            self._active_size += len(blob)
+            self._write_all(
+                self._active_index_fd,
+                self._INDEX_RECORD.pack(bytes.fromhex(chunk_hash), offset, len(blob))
+            )
+            return self.make_location(self._active_name, offset, len(blob))
+
+    def sync(self):
+        """把已追加的数据持久化到磁盘（其他线程同时期的追加一并落盘）"""
+        with self._write_lock:
+            self._sync_active()
+
+    def seal(self):
+        """结束当前包并释放其锁（之后可被压缩），之后的写入会新建包"""
+        with self._write_lock:
+            self._close_active()
+
+    def active_pack(self) -> Optional[str]:
+        """当前进程正在追加的包名"""
+        return self._active_name
+
+    # -------- 读取 --------
+    def _retire(self, handle: _ReadFd):
+        """描述符移出缓存（调用方持有读锁），没有使用者时立即关闭"""
+        handle.retired = True
+        if handle.users == 0:
+            os.close(handle.fd)
+
+    def _acquire_read_fd(self, pack_name: str) -> _ReadFd:
+        with self._read_lock:
+            handle = self._read_fds.get(pack_name)
+            if handle is None:
+                handle = self._read_fds[pack_name] = _ReadFd(os.open(self.pack_path(pack_name), os.O_RDONLY))
+                while len(self._read_fds) > self.max_read_fds:
+                    self._retire(self._read_fds.popitem(last=False)[1])
+            else:
+                self._read_fds.move_to_end(pack_name)
+            handle.users += 1
+            return handle
+
+    def _release_read_fd(self, handle: _ReadFd):
+        with self._read_lock:
+            handle.users -= 1
+            if handle.retired and handle.users == 0:
+                os.close(handle.fd)
+
+    def read(self, location: str) -> Optional[bytes]:
+        """按位置读取块数据（一次 pread），包文件不存在或数据不完整时返回 None"""
+        pack_name, offset, length = self.parse_location(location)
+        try:
+            handle = self._acquire_read_fd(pack_name)
+        except FileNotFoundError:
+            return None
+        try:
+            data = os.pread(handle.fd, length, offset)
+        finally:
+            self._release_read_fd(handle)
+        return data if len(data) == length else None
+
+    def _forget_read_fd(self, pack_name: str):
+        with self._read_lock:
+            handle = self._read_fds.pop(pack_name, None)
+            if handle is not None:
+                self._retire(handle)
+
+    # -------- 维护 --------
+    def list_packs(self) -> List[str]:
+        """列出所有包名（按创建时间排序）"""
+        return sorted(
+            name[:-len(self.PACK_SUFFIX)]
+            for name in os.listdir(self.packs_dir)
+            if name.endswith(self.PACK_SUFFIX)
+        )
+
+    @contextmanager
+    def lock_sealed(self, pack_name: str) -> Iterator[bool]:
+        """
+        尝试取得包的独占锁（不阻塞），产出是否取得：取不到说明仍有进程在向该包追加。
+        持有锁期间写入进程不会再追加这个包（写入进程只追加自己新建的包），压缩在锁内完成并删除包
+        """
+        try:
+            fd = os.open(self.pack_path(pack_name), os.O_RDONLY)
+        except FileNotFoundError:
+            yield False
+            return
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+            except BlockingIOError:
+                locked = False
+            yield locked
+        finally:
+            os.close(fd)
+
+    def pack_size(self, pack_name: str) -> int:
+        return os.path.getsize(self.pack_path(pack_name))
+
+    def read_index(self, pack_name: str) -> Iterator[Tuple[str, int, int]]:
+        """遍历包索引，产出 (块哈希, 偏移, 长度)；忽略末尾不完整的记录"""
+        record_size = self._INDEX_RECORD.size
+        with open(self.index_path(pack_name), "rb") as f:
+            while True:
+                record = f.read(record_size)
+                if len(record) < record_size:
+                    break
+                digest, offset, length = self._INDEX_RECORD.unpack(record)
+                yield digest.hex(), offset, length
+
+    def remove_pack(self, pack_name: str):
+        """删除包文件及其索引（压缩完成后调用）"""
+        self._forget_read_fd(pack_name)
+        for path in (self.pack_path(pack_name), self.index_path(pack_name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self._write_lock:
+            self._close_active()
+        with self._read_lock:
+            handles, self._read_fds = list(self._read_fds.values()), OrderedDict()
+            for handle in handles:
+                self._retire(handle)
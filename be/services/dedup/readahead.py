@@ -0,0 +1,62 @@
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterator, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ReadAhead:
+    """
+    顺序读取的预读器
+    - 按清单顺序产出 (条目, 数据)，后续最多 depth 个条目在线程池中提前读取+解压
+    - 预读中的数据总量不超过 max_bytes（至少预读一个条目，保证单个大块也能推进）
+    - 连续消费 trigger 个条目后才开始预读，只读一两个块的区间请求不产生额外I/O
+    - 迭代中途停止（客户端断开）时取消尚未开始的预读
+    """
+
+    def __init__(self, executor: Executor, depth: int, max_bytes: int, trigger: int = 1):
+        self.executor = executor
+        self.depth = max(1, depth)
+        self.max_bytes = max_bytes
+        self.trigger = max(0, trigger)
+
+    def iterate(self, items: Sequence[T], fetch: Callable[[T], bytes],
+                size_of: Callable[[T], int]) -> Iterator[Tuple[T, bytes]]:
+        """
+        Args:
+            items: 按读取顺序排列的条目
+            fetch: 读取单个条目的函数（在工作线程中执行，不能依赖请求上下文）
+            size_of: 条目的字节数，用于限制预读缓冲
+
+        Yields:
+            (条目, fetch结果)；预读失败时结果为None，由调用方决定是否同步重试
+        """
+        pending = deque()  # [(条目, future)]
+        buffered = 0
+        next_index = 0
+        consumed = 0
+        try:
+            while consumed < len(items):
+                if consumed >= self.trigger:
+                    while (next_index < len(items) and len(pending) < self.depth
+                           and (not pending or buffered + size_of(items[next_index]) <= self.max_bytes)):
+                        item = items[next_index]
+                        pending.append((item, self.executor.submit(fetch, item)))
+                        buffered += size_of(item)
+                        next_index += 1
+
+                if pending:
+                    item, future = pending.popleft()
+                    buffered -= size_of(item)
+                else:
+                    item, future = items[next_index], None
+                    next_index += 1
+                try:
+                    data = future.result() if future is not None else fetch(item)
+                except Exception:
+                    data = None
+                consumed += 1
+                yield item, data
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,248 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, update
+
+from common.db import db
+from utils.hash import DEFAULT_FINGERPRINT
+
+MAX_REPORTED_DAMAGED = 100  # 报告中最多列出的损坏块数
+
+
+class RateLimiter:
+    """按字节数限速（线程安全），bytes_per_second 为 0 时不限速"""
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def acquire(self, nbytes: int):
+        if not self.bytes_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_time, now)
+            self._next_time = start + nbytes / self.bytes_per_second
+        if start > now:
+            time.sleep(start - now)
+
+
+class Scrubber:
+    """
+    块存储完整性校验（fsck）
+    - 内容校验：按哈希顺序分批读取块记录，在线程池中并行读取+解压+重新计算哈希，读取速率受限；
+      差分块按批预先查出差分链上基准块的位置，还原后再校验（基准块损坏时差分块也报告为损坏）
+    - 引用计数校验：一条聚合查询算出每个块在 FileChunkMapping 中的引用次数，与 ref_count 比较
+    - 修复模式：引用计数批量改为实际值；损坏/丢失的块删除记录和文件，相同内容再次上传时会重新写入
+    - 校验期间块可能被迁移（布局迁移、冷热分层、包压缩）：未通过校验的块重新查询位置，位置变化时按新位置重新校验，
+      删除记录也以位置未变为条件，不会把迁移走的健康块当作丢失删除
+    - 每批校验完成后保存断点，进程重启后从断点继续
+    """
+
+    CHECKPOINT_TASK = "chunk_scrub"
+    STAT_KEYS = ('scanned', 'bytes_read', 'ok', 'missing', 'corrupt', 'hash_mismatch', 'size_mismatch', 'removed')
+
+    def __init__(self, store, workers: int = 4, max_bytes_per_second: float = 0, batch_size: int = 256):
+        """
+        Args:
+            store: DatabaseChunkStore
+            workers: 并行校验的线程数
+            max_bytes_per_second: 读取速率上限（按存储字节计），0表示不限制
+            batch_size: 每批校验的块数（每批保存一次断点）
+        """
+        self.store = store
+        self.Chunk = store.Chunk
+        self.FileChunkMapping = store.FileChunkMapping
+        # 延迟导入避免循环依赖
+        from models.chunk import MaintenanceCheckpoint
+        self.MaintenanceCheckpoint = MaintenanceCheckpoint
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.limiter = RateLimiter(max_bytes_per_second)
+
+    # -------- 内容校验 --------
+    def _verify(self, row, base_paths: Optional[Dict[str, str]] = None,
+                algorithms: Optional[Dict[str, str]] = None) -> Tuple[str, int]:
+        """
+        校验单个块（在工作线程中执行，不访问数据库），返回 (结果, 读取字节数)
+        algorithms 为块的指纹算法（ChunkFingerprint），不在其中的块按 sha256 校验
+        """
+        blob = self.store._read_chunk_blob(row.storage_path) if row.storage_path else None
+        if blob is None:
+            return 'missing', 0
+        self.limiter.acquire(len(blob))
+        try:
+            data = self.store._decode_chunk_blob(blob, resolve=False, base_paths=base_paths)
+        except Exception:
+            return 'corrupt', len(blob)
+        if len(data) != row.chunk_size:
+            return 'size_mismatch', len(blob)
+        algorithm = (algorithms or {}).get(row.chunk_hash, DEFAULT_FINGERPRINT)
+        if self.store._calculate_chunk_hash(data, algorithm) != row.chunk_hash:
+            return 'hash_mismatch', len(blob)
+        return 'ok', len(blob)
+
+    def _next_batch(self, after: str) -> List:
+        Chunk = self.Chunk
+        return db.session.query(Chunk.id, Chunk.chunk_hash, Chunk.storage_path, Chunk.chunk_size).filter(
+            Chunk.chunk_hash > after
+        ).order_by(Chunk.chunk_hash).limit(self.batch_size).all()
+
+    def _recheck_failed(self, rows: List, results: List[Tuple[str, int]], base_paths: Dict[str, str],
+                        algorithms: Dict[str, str]) -> List[Tuple[object, Optional[Tuple[str, int]]]]:
+        """
+        重新查询未通过校验的块的位置（在请求线程执行）：位置已变化的按新位置重新校验，
+        记录已被删除（如被垃圾回收）的结果为 None，不计入统计
+
+        Returns:
+            List: [(row, (结果, 读取字节数) 或 None), ...]，row 的 storage_path 为校验时使用的位置
+        """
+        failed = [row.id for row, (result, _) in zip(rows, results) if result != 'ok']
+        if not failed:
+            return list(zip(rows, results))
+        Chunk = self.Chunk
+        current = dict(db.session.query(Chunk.id, Chunk.storage_path).filter(Chunk.id.in_(failed)))
+        checked = []
+        for row, outcome in zip(rows, results):
+            if outcome[0] != 'ok':
+                if row.id not in current:
+                    outcome = None
+                elif current[row.id] != row.storage_path:
+                    row = SimpleNamespace(**dict(row._asdict(), storage_path=current[row.id]))
+                    outcome = self._verify(row, base_paths, algorithms)
+            checked.append((row, outcome))
+        return checked
+
+    def _remove_damaged(self, rows: List) -> List:
+        """
+        删除损坏块的记录（调用方负责提交，提交后再删除块数据），返回实际删除的行；文件清单保留，
+        相同内容再次上传时重新写入该块。删除以位置未变为条件：校验之后被迁移的块不删除
+        """
+        Chunk = self.Chunk
+        deleted = [
+            row for row in rows
+            if Chunk.query.filter_by(id=row.id, storage_path=row.storage_path).delete(synchronize_session=False)
+        ]
+        self.store._forget_chunks([row.chunk_hash for row in deleted])
+        return deleted
+
+    def _remove_damaged_blobs(self, rows: List):
+        for row in rows:
+            self.store.chunk_cache.discard(row.chunk_hash)
+        self.store._remove_unreferenced_blobs([(row.chunk_hash, row.storage_path) for row in rows])
+        self.store._filter_deletes += len(rows)
+
+    def verify_chunks(self, repair: bool = False, max_batches: Optional[int] = None,
+                      resume: bool = True) -> Dict:
+        """
+        并行校验块内容
+
+        Returns:
+            Dict: {'scanned', 'bytes_read', 'ok', 'missing', 'corrupt', 'hash_mismatch', 'size_mismatch',
+                   'removed', 'damaged': [{'chunk_hash', 'problem'}, ...], 'completed', 'resumed_from'}
+        """
+        cursor, saved = self.MaintenanceCheckpoint.load(self.CHECKPOINT_TASK) if resume else ('', {})
+        stats = {key: saved.get(key, 0) for key in self.STAT_KEYS}
+        damaged = list(saved.get('damaged', []))
+        report = {'completed': False, 'resumed_from': cursor, 'batches': 0}
+        # 工作线程不访问数据库，先加载所有版本的压缩字典，避免字典压缩的块被误判为损坏
+        self.store.dictionaries.load_all()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chunk-scrub") as executor:
+            while max_batches is None or report['batches'] < max_batches:
+                rows = self._next_batch(cursor)
+                if not rows:
+                    report['completed'] = True
+                    break
+
+                bad_rows = []
+                hashes = [row.chunk_hash for row in rows]
+                base_paths = self.store._delta_base_paths(hashes)
+                algorithms = self.store.ChunkFingerprint.algorithms_of(hashes)
+                results = list(executor.map(lambda row: self._verify(row, base_paths, algorithms), rows))
+                for row, outcome in self._recheck_failed(rows, results, base_paths, algorithms):
+                    if outcome is None:
+                        continue
+                    result, nbytes = outcome
+                    stats['scanned'] += 1
+                    stats['bytes_read'] += nbytes
+                    stats[result] += 1
+                    if result != 'ok':
+                        bad_rows.append(row)
+                        if len(damaged) < MAX_REPORTED_DAMAGED:
+                            damaged.append({'chunk_hash': row.chunk_hash, 'problem': result})
+
+                cursor = rows[-1].chunk_hash
+                removed = []
+                try:
+                    if repair and bad_rows:
+                        removed = self._remove_damaged(bad_rows)
+                        stats['removed'] += len(removed)
+                    self.MaintenanceCheckpoint.save(
+                        self.CHECKPOINT_TASK, cursor, dict(stats, damaged=damaged), commit=False
+                    )
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                if removed:
+                    self._remove_damaged_blobs(removed)
+                report['batches'] += 1
+
+        if report['completed']:
+            self.MaintenanceCheckpoint.clear(self.CHECKPOINT_TASK)
+        report.update(stats)
+        report['damaged'] = damaged
+        return report
+
+    # -------- 引用计数校验 --------
+    def check_refcounts(self, repair: bool = False) -> Dict:
+        """
+        用一条聚合查询重新计算每个块被 FileChunkMapping 引用的次数，与 ref_count 比较
+
+        Returns:
+            Dict: {'mismatched', 'repaired', 'samples': [{'chunk_hash', 'ref_count', 'actual'}, ...]}
+        """
+        Chunk, FileChunkMapping = self.Chunk, self.FileChunkMapping
+        actual = func.count(FileChunkMapping.id)
+        mismatched = db.session.query(Chunk.id, Chunk.chunk_hash, Chunk.ref_count, actual.label('actual')).outerjoin(
+            FileChunkMapping, FileChunkMapping.chunk_hash == Chunk.chunk_hash
+        ).group_by(Chunk.id, Chunk.chunk_hash, Chunk.ref_count).having(Chunk.ref_count != actual).all()
+
+        report = {
+            'mismatched': len(mismatched),
+            'repaired': 0,
+            'samples': [
+                {'chunk_hash': row.chunk_hash, 'ref_count': row.ref_count, 'actual': row.actual}
+                for row in mismatched[:MAX_REPORTED_DAMAGED]
+            ],
+        }
+        if repair and mismatched:
+            stmt = (
+                update(Chunk.__table__)
+                .where(Chunk.__table__.c.id == bindparam('b_id'))
+                .values(ref_count=bindparam('b_actual'))
+            )
+            try:
+                db.session.execute(stmt, [{'b_id': row.id, 'b_actual': row.actual} for row in mismatched])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            report['repaired'] = len(mismatched)
+        return report
+
+    def run(self, repair: bool = False, max_batches: Optional[int] = None, resume: bool = True,
+            check_refcounts: bool = True) -> Dict:
+        """完整校验：内容校验（可分批、可续跑）完成后再校验引用计数"""
+        started = time.perf_counter()
+        report = {'chunks': self.verify_chunks(repair=repair, max_batches=max_batches, resume=resume)}
+        if check_refcounts and report['chunks']['completed']:
+            report['refcounts'] = self.check_refcounts(repair=repair)
+        report['repair'] = repair
+        report['runtime_seconds'] = time.perf_counter() - started
+        return report
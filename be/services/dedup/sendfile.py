@@ -0,0 +1,61 @@
+import os
+from typing import BinaryIO, Iterator
+
+
+class RegionStream:
+    """
+    本地文件中一段字节 [offset, offset + length) 的只读流（原样存储的块数据）
+    - 迭代时按块产出字节，可以像 open_file 的迭代器一样用于普通流式响应、多区间响应
+    - 交给 wsgi.file_wrapper 时作为文件对象：fileno() 的当前位置就是区间起点，支持 sendfile 的服务器
+      （gunicorn 等）按 Content-Length 直接从页缓存发往套接字，数据不进入 Python；其他服务器按块 read()
+    - 文件在创建前已打开，之后包压缩、布局迁移删除文件也不影响发送；迭代结束或 close() 时关闭
+    """
+
+    BLOCK_SIZE = 256 * 1024
+
+    def __init__(self, file: BinaryIO, offset: int, length: int):
+        self._file = file
+        self._file.seek(offset)
+        self.offset = offset
+        self.length = length
+        self.remaining = length
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            while self.remaining:
+                data = self.read(self.BLOCK_SIZE)
+                if not data:
+                    raise IOError(f"文件区间不完整: 还差 {self.remaining} 字节")
+                yield data
+        finally:
+            self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def sendfile_region(out_fd: int, stream: RegionStream) -> int:
+    """用 os.sendfile 把区间发往 out_fd（套接字或文件），返回发送的字节数；服务器的 sendfile 路径与此相同"""
+    sent = 0
+    while sent < stream.length:
+        n = os.sendfile(out_fd, stream.fileno(), stream.offset + sent, stream.length - sent)
+        if n == 0:
+            break
+        sent += n
+    return sent
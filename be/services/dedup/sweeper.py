@@ -0,0 +1,141 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+from services.dedup.durability import TMP_SUFFIX
+from services.dedup.layout import iter_shard_dirs
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def _is_chunk_name(name: str) -> bool:
+    return len(name) == 64 and _HEX_DIGITS.issuperset(name)
+
+
+def _scan_shard(shard_path: str, prefix: str) -> Tuple[List[str], List[str]]:
+    """
+    列出一个分片目录中的块文件名（只读目录项，不逐个stat），按名称排序；同时返回写入中断残留的临时文件名
+
+    只返回以分片名开头的文件：放错分片的文件会破坏全局顺序，使归并误判后续文件为孤立
+    """
+    names, tmp_names = [], []
+    try:
+        with os.scandir(shard_path) as entries:
+            for e in entries:
+                if not e.name.startswith(prefix) or not e.is_file(follow_symlinks=False):
+                    continue
+                if _is_chunk_name(e.name):
+                    names.append(e.name)
+                elif e.name.endswith(TMP_SUFFIX) and _is_chunk_name(e.name[:64]):
+                    tmp_names.append(e.name)
+    except FileNotFoundError:
+        return [], []
+    names.sort()
+    return names, tmp_names
+
+
+class OrphanSweeper:
+    """
+    基于集合差的孤立块文件清理
+    - 并行 os.scandir 扫描各叶子分片目录，分片按名称逐层有序，拼接后即为全局有序的文件名序列
+    - 从数据库按哈希升序分批流式读取已知块哈希
+    - 两个有序序列归并求差，得到磁盘上有、数据库中没有的文件，查询次数为 块数 / batch_size
+    - 只对差集中的文件做 stat，修改时间在宽限期内的跳过（可能是尚未提交的写入）
+    - 原子写入中断后残留的临时文件超过宽限期后一并删除
+    """
+
+    def __init__(self, chunks_dir: str, known_hashes: Iterator[str], grace_seconds: float = 3600,
+                 workers: int = 4, depth: int = 1, width: int = 2):
+        """
+        Args:
+            chunks_dir: 块布局目录（其下为 depth 层、每层 width 位十六进制的分片目录）
+            known_hashes: 按升序产出的数据库中所有块哈希
+            grace_seconds: 宽限期（秒），更新的文件不删除
+            workers: 并行扫描分片的线程数
+            depth: 分片层数
+            width: 每层分片目录名的字符数
+        """
+        self.chunks_dir = chunks_dir
+        self.known_hashes = known_hashes
+        self.grace_seconds = grace_seconds
+        self.workers = max(1, workers)
+        self.depth = depth
+        self.width = width
+
+    def _shards(self) -> Iterator[str]:
+        return iter_shard_dirs(self.chunks_dir, self.depth, self.width)
+
+    def _submit(self, executor: ThreadPoolExecutor, shard: str):
+        return executor.submit(_scan_shard, os.path.join(self.chunks_dir, shard), shard.replace(os.sep, ""))
+
+    def _scanned_names(self, executor: ThreadPoolExecutor, stale_tmp: List[str]) -> Iterator[tuple]:
+        """按全局顺序产出 (分片, 文件名)；最多 2 * workers 个分片同时在扫描或等待归并；临时文件收集到 stale_tmp"""
+        shards = self._shards()
+        in_flight = deque()
+        for shard in shards:
+            in_flight.append((shard, self._submit(executor, shard)))
+            if len(in_flight) >= 2 * self.workers:
+                break
+        while in_flight:
+            shard, future = in_flight.popleft()
+            next_shard = next(shards, None)
+            if next_shard is not None:
+                in_flight.append((next_shard, self._submit(executor, next_shard)))
+            names, tmp_names = future.result()
+            stale_tmp.extend(os.path.join(self.chunks_dir, shard, name) for name in tmp_names)
+            for name in names:
+                yield shard, name
+
+    def _remove_if_old(self, path: str, cutoff: float, dry_run: bool) -> str:
+        """删除修改时间早于 cutoff 的文件，返回 'removed' / 'recent' / 'kept'（dry_run）/ 'gone'"""
+        try:
+            if os.lstat(path).st_mtime > cutoff:
+                return 'recent'
+            if dry_run:
+                return 'kept'
+            os.remove(path)
+            return 'removed'
+        except FileNotFoundError:
+            return 'gone'
+
+    def sweep(self, dry_run: bool = False) -> Dict:
+        """
+        执行一次清理
+
+        Returns:
+            Dict: {'scanned', 'orphans', 'removed', 'skipped_recent', 'stale_tmp', 'stale_tmp_removed',
+                   'runtime_seconds', 'files_per_second'}
+        """
+        started = time.perf_counter()
+        cutoff = time.time() - self.grace_seconds
+        report = {'scanned': 0, 'orphans': 0, 'removed': 0, 'skipped_recent': 0, 'dry_run': dry_run}
+
+        known = iter(self.known_hashes)
+        current = next(known, None)
+        stale_tmp = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="orphan-scan") as executor:
+            for shard, name in self._scanned_names(executor, stale_tmp):
+                report['scanned'] += 1
+                # 有序归并：跳过数据库中小于当前文件名的哈希
+                while current is not None and current < name:
+                    current = next(known, None)
+                if current == name:
+                    continue
+
+                report['orphans'] += 1
+                result = self._remove_if_old(os.path.join(self.chunks_dir, shard, name), cutoff, dry_run)
+                if result == 'recent':
+                    report['skipped_recent'] += 1
+                elif result == 'removed':
+                    report['removed'] += 1
+
+        report['stale_tmp'] = len(stale_tmp)
+        report['stale_tmp_removed'] = sum(
+            self._remove_if_old(path, cutoff, dry_run) == 'removed' for path in stale_tmp
+        )
+        runtime = time.perf_counter() - started
+        report['runtime_seconds'] = runtime
+        report['files_per_second'] = report['scanned'] / runtime if runtime > 0 else 0.0
+        return report
@@ -0,0 +1,260 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from common.db import db
+from services.dedup.object_store import ObjectStore
+from services.dedup.scrub import RateLimiter
+
+
+class AccessTracker:
+    """
+    块访问时间的内存缓冲（线程安全）
+    - 读取只记录到内存，同一块多次读取只保留最近一次，由请求线程定期批量写入数据库
+    - 缓冲条数超过上限的数倍（长时间没有写入机会）时丢弃新的记录：
+      丢失的访问时间最多导致热块被迁移到冷层，下次读取时再提升回来
+    """
+
+    def __init__(self, flush_interval: float = 30, max_pending: int = 1000):
+        """
+        Args:
+            flush_interval: 距上次写入超过该秒数时应写入
+            max_pending: 缓冲条数达到该值时应写入
+        """
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, datetime] = {}
+        self._last_flush = time.monotonic()
+        self.dropped = 0
+
+    def record(self, chunk_hash: str):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            if chunk_hash not in self._pending and len(self._pending) >= 4 * self.max_pending:
+                self.dropped += 1
+                return
+            self._pending[chunk_hash] = now
+
+    def due(self) -> bool:
+        with self._lock:
+            return bool(self._pending) and (
+                len(self._pending) >= self.max_pending
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+
+    def drain(self) -> Dict[str, datetime]:
+        """取出全部缓冲的 {块哈希: 访问时间}"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            return pending
+
+    def restore(self, pending: Dict[str, datetime]):
+        """写入失败时放回缓冲（保留较新的时间）"""
+        with self._lock:
+            for chunk_hash, accessed_at in pending.items():
+                if self._pending.get(chunk_hash, accessed_at) <= accessed_at:
+                    self._pending[chunk_hash] = accessed_at
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class PromotionQueue:
+    """
+    从冷层读出、等待写回本地的块（线程安全）
+    - 保存读取到的原始存储数据（压缩后），写回时不需要再次下载
+    - 总字节数超过上限时放弃新的提升，块留在冷层，下次读取时再尝试
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, bytes]] = {}
+        self._bytes = 0
+        self.dropped = 0
+
+    def add(self, chunk_hash: str, location: str, blob: bytes) -> bool:
+        with self._lock:
+            if chunk_hash in self._pending:
+                return True
+            if self._bytes + len(blob) > self.max_bytes:
+                self.dropped += 1
+                return False
+            self._pending[chunk_hash] = (location, blob)
+            self._bytes += len(blob)
+            return True
+
+    def drain(self) -> List[Tuple[str, str, bytes]]:
+        """取出全部待提升的块 [(块哈希, 冷层位置, 存储数据), ...]"""
+        with self._lock:
+            pending, self._pending, self._bytes = self._pending, {}, 0
+        return [(chunk_hash, location, blob) for chunk_hash, (location, blob) in pending.items()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+
+class TierStats:
+    """冷热分层的运行统计（线程安全，进程内累计）"""
+
+    KEYS = ('cold_reads', 'promoted', 'promote_skipped', 'access_records', 'flushes', 'flush_errors',
+            'remove_errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {key: 0 for key in self.KEYS}
+
+    def add(self, key: str, count: int = 1):
+        with self._lock:
+            self._counts[key] += count
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+class TierMigrator:
+    """
+    把长时间未访问的块从本地迁移到对象存储冷层
+    - 按哈希顺序分批选出本地块中最近访问时间（ChunkAccess）与最近更新时间（写入/去重命中）
+      都早于阈值的块，在线程池中并行读取并上传，上传速率受限
+    - 上传后条件更新 storage_path（位置未被其他任务改写时），提交后再删除本地文件；
+      提交前读取本地位置的请求照常成功，包内的块只留下死字节，由包压缩回收
+    - 位置已被改写（块被回收、包压缩等）的块，其对象在提交后删除
+    - 每批提交时在同一事务中保存断点，中断后从断点继续；支持只统计不迁移
+    """
+
+    CHECKPOINT_TASK = "chunk_tier_migrate"
+    STAT_KEYS = ('migrated', 'migrated_bytes', 'skipped_changed', 'missing', 'pending', 'pending_bytes',
+                 'remove_errors')
+
+    def __init__(self, store, cold_after_seconds: float, batch_size: int = 200,
+                 max_bytes_per_second: float = 0, workers: int = 4):
+        """
+        Args:
+            store: DatabaseChunkStore（需要配置冷层）
+            cold_after_seconds: 超过该秒数未访问的块迁移到冷层
+            batch_size: 每批迁移的块数（一批一次提交）
+            max_bytes_per_second: 上传速率上限（按存储字节计），0表示不限制
+            workers: 并行上传的线程数
+        """
+        if not store.tiering_enabled:
+            raise ValueError("冷热分层需要本地块数据后端并配置对象存储（OBJECT_STORE_BUCKET）")
+        self.store = store
+        self.Chunk = store.Chunk
+        self.ChunkAccess = store.ChunkAccess
+        # 延迟导入避免循环依赖
+        from models.chunk import MaintenanceCheckpoint
+        self.MaintenanceCheckpoint = MaintenanceCheckpoint
+        self.cold_after_seconds = cold_after_seconds
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(max_bytes_per_second)
+
+    def _next_batch(self, after: str, cutoff: datetime) -> List:
+        Chunk, ChunkAccess = self.Chunk, self.ChunkAccess
+        return db.session.query(Chunk.id, Chunk.chunk_hash, Chunk.storage_path, Chunk.compressed_size).outerjoin(
+            ChunkAccess, ChunkAccess.chunk_hash == Chunk.chunk_hash
+        ).filter(
+            Chunk.chunk_hash > after,
+            ~Chunk.storage_path.like(ObjectStore.LOCATION_PREFIX + '%'),
+            Chunk.updated_at < cutoff,
+            or_(ChunkAccess.accessed_at.is_(None), ChunkAccess.accessed_at < cutoff),
+        ).order_by(Chunk.chunk_hash).limit(self.batch_size).all()
+
+    def _upload(self, row) -> Tuple[Optional[str], int]:
+        """读取本地块并上传（在工作线程中执行，不访问数据库），返回 (冷层位置, 字节数)，本地数据丢失时位置为 None"""
+        blob = self.store._read_chunk_blob(row.storage_path)
+        if blob is None:
+            return None, 0
+        self.limiter.acquire(len(blob))
+        return self.store.object_store.put(row.chunk_hash, blob), len(blob)
+
+    def _migrate_batch(self, executor, rows: List, stats: Dict) -> Tuple[List[str], List[str]]:
+        """迁移一批块（调用方负责提交），返回 (提交后删除的本地位置, 提交后删除的对象位置)"""
+        Chunk = self.Chunk
+        stale, orphaned = [], []
+        for row, (location, nbytes) in zip(rows, executor.map(self._upload, rows)):
+            if location is None:
+                # 本地数据丢失，留给完整性校验处理
+                stats['missing'] += 1
+                continue
+            updated = Chunk.query.filter_by(id=row.id, storage_path=row.storage_path).update(
+                {'storage_path': location}, synchronize_session=False
+            )
+            if updated:
+                stale.append(row.storage_path)
+                stats['migrated'] += 1
+                stats['migrated_bytes'] += nbytes
+            else:
+                stats['skipped_changed'] += 1
+                if self.store._lookup_storage_path(row.chunk_hash) != location:
+                    orphaned.append(location)
+        return stale, orphaned
+
+    def run(self, dry_run: bool = False, max_batches: Optional[int] = None, resume: bool = True) -> Dict:
+        """
+        执行迁移
+
+        Returns:
+            Dict: {'migrated', 'migrated_bytes', 'skipped_changed', 'missing', 'pending', 'pending_bytes',
+                   'remove_errors', 'batches', 'completed', 'resumed_from', 'cold_after_seconds',
+                   'runtime_seconds', 'dry_run'}
+        """
+        started = time.perf_counter()
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.cold_after_seconds)
+        MaintenanceCheckpoint = self.MaintenanceCheckpoint
+        # 内存中尚未写入的访问时间先落库，刚被读取的块不会被选中
+        self.store.flush_tier_updates(force=True)
+
+        cursor, saved = MaintenanceCheckpoint.load(self.CHECKPOINT_TASK) if resume and not dry_run else ('', {})
+        stats = {key: saved.get(key, 0) for key in self.STAT_KEYS}
+        report = {'batches': 0, 'completed': False, 'resumed_from': cursor,
+                  'cold_after_seconds': self.cold_after_seconds, 'dry_run': dry_run}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chunk-tier") as executor:
+            try:
+                while max_batches is None or report['batches'] < max_batches:
+                    rows = self._next_batch(cursor, cutoff)
+                    if not rows:
+                        report['completed'] = True
+                        break
+                    cursor = rows[-1].chunk_hash
+                    report['batches'] += 1
+                    if dry_run:
+                        stats['pending'] += len(rows)
+                        stats['pending_bytes'] += sum(row.compressed_size or 0 for row in rows)
+                        continue
+
+                    stale, orphaned = self._migrate_batch(executor, rows, stats)
+                    MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, cursor, stats, commit=False)
+                    db.session.commit()
+                    errors = stats['remove_errors']
+                    for location in stale:
+                        try:
+                            self.store._remove_chunk_blob(location)
+                        except OSError:
+                            stats['remove_errors'] += 1
+                    if orphaned:
+                        stats['remove_errors'] += self.store._remove_chunk_blobs(orphaned)
+                    if stats['remove_errors'] != errors:
+                        # 块文件在提交后才删除，删除失败的计数补记到断点中
+                        MaintenanceCheckpoint.save(self.CHECKPOINT_TASK, cursor, stats)
+
+                if report['completed'] and not dry_run:
+                    MaintenanceCheckpoint.clear(self.CHECKPOINT_TASK)
+            except Exception:
+                db.session.rollback()
+                raise
+
+        report.update(stats)
+        report['runtime_seconds'] = time.perf_counter() - started
+        return report
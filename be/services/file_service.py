@@ -39,9 +39,14 @@ class FileService:
         return {"filename": file_obj.filename, "status": "上传成功", "md5": md5_hex}
 
     @staticmethod
-    def download(user_id, filename, folder=''):
-        content = storage.download_file(user_id, filename, folder)
-        return {"filename": filename, "content": content, "folder": folder}
+    def download(user_id, filename, folder='', start=0, end=None):
+        """按块产出文件（或字节区间 [start, end)）数据的迭代器，文件不存在时返回 None"""
+        return storage.iter_file(user_id, filename, folder, start, end)
+
+    @staticmethod
+    def stat(user_id, filename, folder=''):
+        """文件元信息 {"size", "etag", "mtime"}，不读取文件数据"""
+        return storage.stat_file(user_id, filename, folder)
 
     @staticmethod
     def list_files(user_id, folder=''):
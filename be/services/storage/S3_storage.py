@@ -3,6 +3,8 @@ from botocore.exceptions import ClientError
 
 
 class S3Storage:
+    RAW_SIZE_METADATA = 'raw-size'  # 对象元数据：压缩前的原始大小，stat_file 只需一次 HEAD
+
     def __init__(self, bucket_name):
         self.s3 = boto3.client('s3')
         self.bucket = bucket_name
@@ -14,7 +16,8 @@ class S3Storage:
         raw = file_obj.read()
         compressed = compress_for_storage(raw, enabled=getattr(Config, "ENABLE_COMPRESSION", True))
         key = f"{user_id}/{folder}/{file_obj.filename}" if folder else f"{user_id}/{file_obj.filename}"
-        self.s3.put_object(Bucket=self.bucket, Key=key, Body=compressed)
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=compressed,
+                           Metadata={self.RAW_SIZE_METADATA: str(len(raw))})
         return key
 
     def download_file(self, user_id, filename, folder=''):
@@ -26,6 +29,43 @@ class S3Storage:
         blob = obj['Body'].read()
         return decompress_from_storage(blob, enabled=getattr(Config, "ENABLE_COMPRESSION", True))
 
+    def stat_file(self, user_id, filename, folder=''):
+        """HEAD 取原始大小（上传时写入的元数据）、ETag 与修改时间，不下载对象；对象不存在时返回 None"""
+        key = f"{user_id}/{folder}/{filename}" if folder else f"{user_id}/{filename}"
+        try:
+            head = self.s3.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return None
+        size = head.get('Metadata', {}).get(self.RAW_SIZE_METADATA)
+        size = int(size) if size is not None else self._legacy_raw_size(key, head['ContentLength'])
+        return {"size": size, "etag": head['ETag'].strip('"'), "mtime": head['LastModified'].timestamp()}
+
+    def _legacy_raw_size(self, key, stored_size):
+        """没有原始大小元数据的旧对象：Range GET 读取封装头部，不是封装格式时才下载整个对象解码"""
+        from config import Config
+        from utils.compress import (
+            CorruptBlobError, ENVELOPE_MAX_HEADER_SIZE, decompress_from_storage, read_envelope_header
+        )
+        if stored_size == 0:
+            return 0
+        obj = self.s3.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{ENVELOPE_MAX_HEADER_SIZE - 1}")
+        try:
+            header = read_envelope_header(obj['Body'].read())
+        except CorruptBlobError:
+            header = None
+        if header is not None:
+            return header.raw_size
+        blob = self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        return len(decompress_from_storage(blob, enabled=getattr(Config, "ENABLE_COMPRESSION", True)))
+
+    def iter_file(self, user_id, filename, folder='', start=0, end=None):
+        # 压缩后的对象无法按原始偏移做 Range GET，解压后截取
+        try:
+            data = self.download_file(user_id, filename, folder)
+        except ClientError:
+            return None
+        return iter((data[start:end],))
+
     def list_files(self, user_id, folder=''):
         prefix = f"{user_id}/{folder}/" if folder else f"{user_id}/"
         resp = self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
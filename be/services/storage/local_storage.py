@@ -25,7 +25,7 @@ class LocalStorage:
         file_path = os.path.join(user_dir, file_obj.filename)
         # 读原始数据，通过 Md5Store 去重
         data = file_obj.read()
-        md5_hex = self._md5_store.ensure_blob(data)
+        md5_hex = self._md5_store.ensure_blob(data, file_obj.filename)
         self._md5_store.inc_ref(md5_hex)
 
         # 在用户目录写入“指针文件”，内容为 REF:<md5>
@@ -47,6 +47,36 @@ class LocalStorage:
             # 兼容旧文件：直接按以前的方式处理
             return decompress_from_storage(content, enabled=getattr(Config, "ENABLE_COMPRESSION", True))
 
+    def stat_file(self, user_id, filename, folder=''):
+        """返回 {"size", "etag", "mtime"}，文件不存在时返回 None；指针文件的大小取自块映射，不读取数据"""
+        file_path = os.path.join(self._get_user_dir(user_id, folder), filename)
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        mtime = os.path.getmtime(file_path)
+        if self._md5_store.is_pointer(content):
+            md5_hex = self._md5_store.parse_pointer(content)
+            size = self._md5_store.blob_size(md5_hex)
+            return {"size": size or 0, "etag": md5_hex, "mtime": mtime}
+        # 兼容旧文件：需要解压后才知道大小，没有内容哈希可用作 etag
+        data = decompress_from_storage(content, enabled=getattr(Config, "ENABLE_COMPRESSION", True))
+        return {"size": len(data), "etag": None, "mtime": mtime}
+
+    def iter_file(self, user_id, filename, folder='', start=0, end=None):
+        """按块流式读取文件（或字节区间 [start, end)）；指针文件只读取重叠的数据块，文件不存在时返回 None"""
+        file_path = os.path.join(self._get_user_dir(user_id, folder), filename)
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        if self._md5_store.is_pointer(content):
+            md5_hex = self._md5_store.parse_pointer(content)
+            return self._md5_store.open_blob(md5_hex, start, end)
+        # 兼容旧文件：整体压缩存储，只能解压后截取
+        data = decompress_from_storage(content, enabled=getattr(Config, "ENABLE_COMPRESSION", True))
+        return iter((data[start:end],))
+
     def list_files(self, user_id, folder=''):
         user_dir = self._get_user_dir(user_id, folder)
         if not os.path.exists(user_dir):
@@ -0,0 +1,76 @@
+import hashlib
+import shutil
+import tempfile
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.bloom import BloomFilter
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+def _hash(i: int) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+class TestBloomFilter:
+    """测试布隆过滤器及其在块存储中的使用"""
+
+    def test_no_false_negatives_and_low_error_rate(self):
+        """已加入的元素一定命中，误判率接近设定值"""
+        bloom = BloomFilter(10000, error_rate=0.01)
+        for i in range(10000):
+            bloom.add(_hash(i))
+
+        assert all(_hash(i) in bloom for i in range(10000))
+        false_positives = sum(1 for i in range(10000, 30000) if _hash(i) in bloom)
+        assert false_positives / 20000 < 0.03
+
+    def test_store_filter_counters(self, test_app):
+        """新块走确定不存在路径，重复块命中，统计数据正确"""
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                data = b"".join(f"{i:08d}".encode() * 128 for i in range(4))
+                store.store_file(data)
+                stats = store.get_filter_stats()
+                assert stats['rebuilds'] == 1
+                assert stats['misses'] == 4
+                assert stats['hits'] == 0
+                assert stats['entries'] == 4
+
+                store.store_file(data)
+                stats = store.get_filter_stats()
+                assert stats['hits'] == 4
+                assert stats['misses'] == 4
+
+                missing = _hash("missing")
+                assert store.check_chunks([missing, store._calculate_chunk_hash(data[:1024])]) == [missing]
+                assert store.get_storage_stats()['chunk_filter']['entries'] == 4
+        finally:
+            store.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_filter_rebuilt_from_database(self, test_app):
+        """新实例启动时从数据库扫描重建，已有块不会被判为不存在"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                data = b"rebuild test " * 300
+                first = DatabaseChunkStore(temp_dir, chunk_size=1024)
+                first.store_file(data)
+
+                second = DatabaseChunkStore(temp_dir, chunk_size=1024)
+                result = second.store_file(data)
+                assert result['new_chunks'] == 0
+                assert second.get_filter_stats()['entries'] == len(first.split_file_to_chunks(data))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+class TestChunkCache:
+    """测试块缓存"""
+
+    def test_lru_eviction_by_bytes(self):
+        """按字节容量淘汰最久未使用的块"""
+        cache = ChunkCache(1000)
+        cache.put("a", b"a" * 200)
+        cache.put("b", b"b" * 200)
+        cache.put("c", b"c" * 200)
+        assert cache.get("a") == b"a" * 200  # a变为最近使用
+        cache.put("d", b"d" * 250)
+        cache.put("e", b"e" * 250)
+
+        assert "b" not in cache
+        assert "a" in cache and "e" in cache
+        assert cache.size_bytes <= 1000
+        stats = cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['hits'] == 1
+
+    def test_oversized_and_disabled(self):
+        """超大块不缓存；容量为0时关闭"""
+        cache = ChunkCache(1000)
+        cache.put("big", b"x" * 600)
+        assert "big" not in cache
+        assert cache.get_stats()['rejected'] == 1
+
+        disabled = ChunkCache(0)
+        disabled.put("a", b"a")
+        assert not disabled.enabled
+        assert len(disabled) == 0
+
+    def test_concurrent_access(self):
+        """多线程读写后容量统计保持一致"""
+        cache = ChunkCache(64 * 1024)
+
+        def worker(seed):
+            for i in range(500):
+                key = f"{(seed * 7 + i) % 97}"
+                if cache.get(key) is None:
+                    cache.put(key, key.encode() * 100)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert cache.size_bytes == sum(len(k.encode()) * 100 for k in list(cache._entries))
+        assert cache.size_bytes <= cache.max_bytes
+
+    def test_store_read_path_uses_cache(self, test_app):
+        """重复读取命中缓存，块被回收后缓存项同时移除"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+                store.chunk_cache = ChunkCache(1024 * 1024)
+                data = os.urandom(4096)
+                info = store.store_file(data)
+
+                assert store.read_file(info['file_hash']) == data
+                assert store.read_file(info['file_hash']) == data
+                stats = store.get_storage_stats()['chunk_cache']
+                assert stats['misses'] == 4
+                assert stats['hits'] == 4
+
+                store.delete_file(info['file_hash'])
+                assert store.read_file(info['file_hash']) is None
+                store.collect_garbage(grace_seconds=0)
+                assert len(store.chunk_cache) == 0
+                store.close()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
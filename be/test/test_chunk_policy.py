@@ -0,0 +1,122 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping, FileManifest
+from services.dedup.chunk_policy import ChunkPolicy, chunker_from_params
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+class TestChunkPolicy:
+    """测试分块参数选择"""
+
+    def test_size_tiers(self):
+        """小文件使用基础块大小；大文件按 2 的幂增大块大小，块数不超过目标值，且有上限"""
+        policy = ChunkPolicy("cdc", 1024, max_size=64 * 1024, target_chunks=16)
+        assert policy.chunk_size_for(None) == 1024
+        assert policy.chunk_size_for(10) == 1024
+        assert policy.chunk_size_for(16 * 1024) == 1024
+        assert policy.chunk_size_for(16 * 1024 + 1) == 2048
+        assert policy.chunk_size_for(100 * 1024) == 8192
+        assert policy.chunk_size_for(1 << 30) == 64 * 1024
+        # 大小相近的文件使用相同参数（同一分块器实例）
+        assert policy.chunker_for(90 * 1024) is policy.chunker_for(100 * 1024)
+
+    def test_compressed_types_use_fixed(self):
+        """已压缩格式（按扩展名或文件头魔数）使用固定分块"""
+        policy = ChunkPolicy("cdc", 1024, max_size=64 * 1024, target_chunks=16)
+        assert policy.chunker_for(4096, "notes.txt").describe()["algorithm"] == "cdc"
+        assert policy.chunker_for(4096, "IMG_0001.JPG").describe() == {"algorithm": "fixed", "chunk_size": 1024}
+        assert policy.chunker_for(4096, "blob.bin", b"PK\x03\x04rest").describe()["algorithm"] == "fixed"
+
+    def test_params_round_trip(self):
+        """清单中记录的参数可以重建出相同的分块器"""
+        policy = ChunkPolicy("cdc", 1024, max_size=64 * 1024, target_chunks=16)
+        data = os.urandom(200 * 1024)
+        chunker = policy.chunker_for(len(data))
+        rebuilt = chunker_from_params(chunker.describe())
+        assert list(rebuilt.split(data)) == list(chunker.split(data))
+
+
+class TestStoreChunkPolicy:
+    """测试块存储按文件选择分块参数并记录到清单头"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.pack_small_chunks = False
+        store.chunk_policy = ChunkPolicy("fixed", 1024, max_size=16 * 1024, target_chunks=8)
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.query(FileManifest).delete()
+        db.session.commit()
+
+    def test_large_file_uses_bigger_chunks(self, test_app, temp_store):
+        """大文件的块数受目标值约束，小文件仍使用基础块大小；参数记录在清单头中"""
+        with test_app.app_context():
+            self._reset()
+            small, large = os.urandom(3000), os.urandom(64 * 1024)
+            small_info = temp_store.store_file(small, "a.txt")
+            large_info = temp_store.store_file(large, "b.txt")
+
+            assert small_info['chunk_count'] == 3
+            assert small_info['chunking'] == {"algorithm": "fixed", "chunk_size": 1024}
+            assert large_info['chunk_count'] == 8
+            assert large_info['chunking'] == {"algorithm": "fixed", "chunk_size": 8192}
+            assert temp_store.get_file_info(large_info['file_hash'])['chunking'] == large_info['chunking']
+            assert temp_store.read_file(small_info['file_hash']) == small
+            assert temp_store.read_file(large_info['file_hash']) == large
+
+    def test_stream_uses_declared_size(self, test_app, temp_store):
+        """流式入库：提供大小时按大小选择参数，未提供时使用默认参数"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(32 * 1024)
+            sized = temp_store.store_file_stream(io.BytesIO(data), size=len(data))
+            assert sized['chunking']['chunk_size'] == 4096
+            temp_store.delete_file(sized['file_hash'])
+            unsized = temp_store.store_file_stream(io.BytesIO(data))
+            assert unsized['chunk_count'] == 32
+            assert temp_store.read_file(unsized['file_hash']) == data
+
+    def test_split_matches_stored_chunks(self, test_app, temp_store):
+        """分块接口与入库使用相同的分块器：按文件名、文件头和大小选择，得到的块与清单一致"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.chunk_policy = ChunkPolicy("cdc", 1024, max_size=16 * 1024, target_chunks=8)
+            data = b"PK\x03\x04" + os.urandom(48 * 1024)
+
+            def stored(info):
+                return [m.chunk_hash for m in FileChunkMapping.get_file_chunks(info['file_hash'])]
+
+            for filename in ("archive.zip", "archive.bin", "notes.txt"):
+                chunks = temp_store.split_file_to_chunks(data, filename)
+                assert [c['hash'] for c in chunks] == stored(temp_store.store_file(data, filename))
+            stream_chunks = temp_store.split_file_stream_to_chunks(io.BytesIO(data), len(data), "notes.txt")
+            info = temp_store.store_file_stream(io.BytesIO(data), size=len(data), filename="notes.txt")
+            assert [c['hash'] for c in stream_chunks] == stored(info)
+            assert info['chunking']['algorithm'] == "cdc" and info['chunking']['avg_size'] == 8192
+
+    def test_manifest_deleted_with_file(self, test_app, temp_store):
+        """删除文件时清单头一并删除；关闭策略时使用原来的全局分块"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(64 * 1024))['file_hash']
+            assert FileManifest.get_chunking(file_hash) is not None
+            assert temp_store.delete_file(file_hash)
+            assert FileManifest.get_chunking(file_hash) is None
+
+            temp_store.chunk_policy = None
+            info = temp_store.store_file(os.urandom(64 * 1024))
+            assert info['chunk_count'] == 64
+            assert info['chunking'] == temp_store.chunker.describe()
@@ -2,8 +2,11 @@ import pytest
 import tempfile
 import shutil
 import io
+import random
+import tracemalloc
 from models.chunk import Chunk, FileChunkMapping
-from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import ChunkReadError, DatabaseChunkStore
 from common.db import db
 
 
@@ -112,6 +115,46 @@ class TestDatabaseChunkStore:
             assert file_info['total_size'] == len(test_file)
             assert file_info['chunk_count'] == result['chunk_count']
     
+    def test_read_range_touches_overlapping_chunks(self, test_app, temp_store):
+        """测试区间读取只读取与区间重叠的块"""
+        with test_app.app_context():
+            db.session.query(Chunk).delete()
+            db.session.query(FileChunkMapping).delete()
+            db.session.commit()
+            
+            test_data = random.Random(5).randbytes(10 * 1024 + 300)
+            file_hash = temp_store.store_file(test_data)['file_hash']
+            
+            read_hashes = []
+            original_load_chunk = temp_store._load_chunk
+            temp_store._load_chunk = lambda h, path=None: read_hashes.append(h) or original_load_chunk(h, path)
+            
+            assert temp_store.read_range(file_hash, 100, 200) == test_data[100:200]
+            assert len(read_hashes) == 1
+            
+            read_hashes.clear()
+            assert temp_store.read_range(file_hash, 1000, 3072) == test_data[1000:3072]
+            assert len(read_hashes) == 3
+            
+            # 区间超出文件末尾时截断，起点在末尾之后返回空
+            assert temp_store.read_range(file_hash, 10 * 1024, 1 << 30) == test_data[10 * 1024:]
+            assert temp_store.read_range(file_hash, len(test_data) + 5, len(test_data) + 10) == b""
+            assert temp_store.read_range("0" * 64, 0, 10) is None
+            assert temp_store.get_file_size(file_hash) == len(test_data)
+            assert temp_store.get_file_size("0" * 64) is None
+            
+            # 流式读取中途块丢失时抛出异常（响应头已发出，无法再返回None）
+            assert list(temp_store.open_file(file_hash, 1000, 1100)) == [test_data[1000:1024], test_data[1024:1100]]
+            temp_store.chunk_cache.clear()
+            missing = temp_store.FileChunkMapping.get_file_chunks(file_hash)[1].chunk_hash
+            Chunk.query.filter_by(chunk_hash=missing).update({'storage_path': temp_store.storage_root + '/missing'})
+            db.session.commit()
+            stream = temp_store.open_file(file_hash)
+            assert next(stream) == test_data[:1024]
+            with pytest.raises(ChunkReadError):
+                next(stream)
+            assert temp_store.read_file(file_hash) is None
+    
     def test_file_stream_processing(self, test_app, temp_store):
         """测试文件流处理功能"""
         with test_app.app_context():
@@ -135,6 +178,101 @@ class TestDatabaseChunkStore:
             retrieved_data = temp_store.read_file(result['file_hash'])
             assert retrieved_data == test_data
     
+    def test_file_stream_bounded_memory(self, test_app):
+        """测试流式入库和流式读取的内存占用与文件大小无关"""
+        chunk_size = 256 * 1024
+        total_size = 64 * chunk_size  # 16MB
+
+        class GeneratedStream:
+            """按需生成数据的流，不在内存中保留整个文件"""
+            def __init__(self, size):
+                self.remaining = size
+                self.rng = random.Random(0)
+
+            def read(self, size=-1):
+                size = min(size, self.remaining)
+                self.remaining -= size
+                return self.rng.randbytes(size)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                store = DatabaseChunkStore(temp_dir, chunk_size=chunk_size)
+
+                tracemalloc.start()
+                try:
+                    result = store.store_file_stream(GeneratedStream(total_size))
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+
+                assert result['total_size'] == total_size
+                assert result['chunk_count'] == 64
+                # 峰值只与块大小相关（若整文件驻留内存则至少为16MB）
+                assert peak < 8 * chunk_size, f"peak={peak}"
+
+                # 流式读取：逐块产出，关闭缓存后峰值同样只与块大小相关
+                store.chunk_cache = ChunkCache(0)
+                expected = GeneratedStream(total_size)
+                tracemalloc.start()
+                try:
+                    stream = store.open_file(result['file_hash'])
+                    for piece in stream:
+                        assert piece == expected.read(len(piece))
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+
+                assert expected.remaining == 0
+                assert peak < 8 * chunk_size, f"peak={peak}"
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def test_parallel_ingest_preserves_order(self, test_app):
+        """测试多工作线程入库时块顺序保持不变"""
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024, ingest_workers=4)
+        try:
+            with test_app.app_context():
+                test_data = b"".join(f"block {i:04d} ".encode() * 100 for i in range(40))
+
+                result = store.store_file_stream(io.BytesIO(test_data))
+                assert result['chunk_count'] == len(store.split_file_to_chunks(test_data))
+
+                mappings = FileChunkMapping.get_file_chunks(result['file_hash'])
+                assert [m.chunk_index for m in mappings] == list(range(len(mappings)))
+                assert [m.chunk_offset for m in mappings] == list(range(0, len(test_data), 1024))
+                assert store.read_file(result['file_hash']) == test_data
+        finally:
+            store.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def test_single_commit_per_file(self, test_app, temp_store):
+        """测试每个文件只提交一次事务，且文件内重复块的引用计数正确"""
+        from sqlalchemy import event
+
+        with test_app.app_context():
+            db.session.query(Chunk).delete()
+            db.session.query(FileChunkMapping).delete()
+            db.session.commit()
+
+            # 10个块，其中"A"块重复出现3次
+            test_data = b"A" * 1024 + b"B" * 1024 + b"A" * 1024 + bytes(range(256)) * 24 + b"A" * 1024
+
+            commits = []
+            listener = lambda session: commits.append(session)
+            event.listen(db.session, "after_commit", listener)
+            try:
+                result = temp_store.store_file(test_data)
+            finally:
+                event.remove(db.session, "after_commit", listener)
+
+            assert len(commits) == 1
+            assert result['chunk_count'] == 10
+            assert Chunk.get_ref_count(temp_store._calculate_chunk_hash(b"A" * 1024)) == 3
+            assert Chunk.get_ref_count(temp_store._calculate_chunk_hash(b"B" * 1024)) == 1
+            assert temp_store.read_file(result['file_hash']) == test_data
+    
     def test_file_deduplication_across_files(self, test_app, temp_store):
         """测试跨文件的块级去重"""
         with test_app.app_context():
@@ -0,0 +1,113 @@
+import io
+import random
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.chunker import (
+    FastCDCChunker,
+    FixedSizeChunker,
+    GEAR_TABLE,
+    gear_hashes,
+    make_chunker,
+)
+
+
+def _random_bytes(size: int, seed: int = 1) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+class TestChunker:
+    """测试分块算法"""
+
+    def test_gear_hash_matches_reference(self):
+        """向量化Gear哈希与逐字节定义一致"""
+        data = _random_bytes(300)
+        h = gear_hashes(data)
+        for i in (0, 5, 31, 32, 100, 299):
+            expected = 0
+            for k in range(min(i + 1, 32)):
+                expected += int(GEAR_TABLE[data[i - k]]) << k
+            assert int(h[i]) == expected & 0xFFFFFFFF
+
+    def test_fixed_chunker(self):
+        """固定分块保持原有行为"""
+        chunker = make_chunker("fixed", 1024)
+        assert isinstance(chunker, FixedSizeChunker)
+        pieces = list(chunker.split(b"A" * 2500))
+        assert [len(p) for p in pieces] == [1024, 1024, 452]
+        assert list(chunker.split_stream(io.BytesIO(b"A" * 2500))) == pieces
+
+    def test_cdc_size_bounds_and_reassembly(self):
+        """CDC块大小在[min, max]范围内，且拼接后与原数据一致"""
+        chunker = FastCDCChunker(4096, 1024, 16384)
+        data = _random_bytes(512 * 1024)
+        pieces = list(chunker.split(data))
+
+        assert b"".join(pieces) == data
+        assert all(len(p) <= 16384 for p in pieces)
+        assert all(len(p) >= 1024 for p in pieces[:-1])
+        # 平均块大小应在avg附近
+        avg = len(data) / len(pieces)
+        assert 2048 < avg < 8192
+
+    def test_cdc_stream_matches_bytes(self):
+        """流式切分与内存切分的切分点一致"""
+        chunker = FastCDCChunker(4096)
+        data = _random_bytes(200 * 1024, seed=7)
+
+        class SlowStream(io.BytesIO):
+            def read(self, size=-1):
+                return super().read(min(size, 777) if size and size > 0 else size)
+
+        assert list(chunker.split_stream(SlowStream(data))) == list(chunker.split(data))
+
+    def test_cdc_resists_insertion(self):
+        """在开头插入字节后，大部分块仍然可以复用"""
+        chunker = FastCDCChunker(4096)
+        data = _random_bytes(256 * 1024, seed=3)
+        edited = data[:100] + b"inserted" + data[100:]
+
+        original = set(chunker.split(data))
+        changed = list(chunker.split(edited))
+        shared = sum(1 for p in changed if p in original)
+        assert shared >= len(changed) - 2
+
+        fixed = FixedSizeChunker(4096)
+        fixed_shared = set(fixed.split(data)) & set(fixed.split(edited))
+        assert len(fixed_shared) == 0
+
+    def test_invalid_parameters(self):
+        """非法参数报错"""
+        with pytest.raises(ValueError):
+            make_chunker("unknown", 1024)
+        with pytest.raises(ValueError):
+            FastCDCChunker(4096, min_size=8)
+        with pytest.raises(ValueError):
+            FastCDCChunker(4096, min_size=8192)
+
+    def test_store_with_cdc(self, test_app):
+        """按存储实例选择CDC分块"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                store = DatabaseChunkStore(temp_dir, chunk_size=4096, chunking="cdc")
+                data = _random_bytes(128 * 1024, seed=11)
+                edited = b"x" + data
+
+                first = store.store_file(data)
+                second = store.store_file_stream(io.BytesIO(edited))
+
+                assert store.read_file(first['file_hash']) == data
+                assert store.read_file(second['file_hash']) == edited
+                assert second['new_chunks'] <= 2
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,126 @@
+import gzip
+import os
+
+import pytest
+
+from utils.compress import (
+    CompressionStats,
+    CorruptBlobError,
+    DictionaryUnavailableError,
+    TrainedDictionary,
+    available_codecs,
+    compress_for_storage,
+    compress_with_detection,
+    decompress_from_storage,
+    estimate_entropy,
+    looks_incompressible,
+    read_envelope_header,
+    stored_raw_size,
+    train_dictionary,
+)
+
+
+class TestCompressEnvelope:
+    """测试自描述压缩封装"""
+
+    @pytest.mark.parametrize("codec", available_codecs())
+    def test_roundtrip_all_codecs(self, codec):
+        """每种可用算法都能正确往返，并能从头部读出原始大小"""
+        for data in (b"", b"cloud drive " * 500, os.urandom(2048)):
+            blob = compress_for_storage(data, codec=codec)
+            assert decompress_from_storage(blob) == data
+            assert stored_raw_size(blob) == len(data)
+
+    def test_user_data_with_gzip_magic(self):
+        """以gzip魔数开头的用户数据不会被误解压"""
+        data = b"\x1f\x8b" + os.urandom(100)
+        assert decompress_from_storage(compress_for_storage(data)) == data
+        assert decompress_from_storage(compress_for_storage(data, enabled=False)) == data
+
+        already_gzipped = gzip.compress(b"user uploaded .gz file")
+        assert decompress_from_storage(compress_for_storage(already_gzipped)) == already_gzipped
+
+    def test_legacy_blobs_still_readable(self):
+        """旧版本直接gzip存储的数据仍可读取"""
+        legacy = gzip.compress(b"legacy chunk")
+        assert decompress_from_storage(legacy) == b"legacy chunk"
+        assert decompress_from_storage(b"raw legacy data") == b"raw legacy data"
+        assert stored_raw_size(legacy) is None
+
+    def test_incompressible_falls_back_to_none(self):
+        """压缩后变大的数据使用none编码"""
+        blob = compress_for_storage(os.urandom(4096), codec="zlib")
+        assert read_envelope_header(blob).codec == "none"
+
+    def test_checksum_detects_corruption(self):
+        """校验和能发现数据损坏"""
+        blob = bytearray(compress_for_storage(b"important data " * 100, codec="none"))
+        blob[-1] ^= 0xFF
+        with pytest.raises(CorruptBlobError):
+            decompress_from_storage(bytes(blob))
+
+    def test_unknown_codec_rejected(self):
+        """未安装的算法直接报错"""
+        with pytest.raises(ValueError):
+            compress_for_storage(b"data", codec="brotli-not-installed")
+
+    @pytest.mark.skipif("zstd" not in available_codecs(), reason="需要 zstandard")
+    def test_dictionary_envelope(self):
+        """字典压缩在头部记录字典id，解码时按id取字典，取不到时报告字典不可用"""
+        samples = [f'{{"id": {i}, "name": "user{i}", "enabled": true, "tags": ["a", "b"]}}'.encode() * 4
+                   for i in range(200)]
+        dictionary = TrainedDictionary(7, train_dictionary(samples, 4096))
+        data = b'{"id": 1000, "name": "user1000", "enabled": false, "tags": ["a"]}'
+
+        blob = compress_for_storage(data, codec="gzip", dictionary=dictionary)
+        header = read_envelope_header(blob)
+        assert (header.codec, header.dict_id) == ("zstd", 7)
+        assert len(blob) < len(compress_for_storage(data, codec="gzip"))
+        assert decompress_from_storage(blob, dictionaries={7: dictionary}) == data
+        with pytest.raises(DictionaryUnavailableError):
+            decompress_from_storage(blob)
+        assert read_envelope_header(compress_for_storage(data, enabled=False, dictionary=dictionary)).dict_id is None
+
+
+class TestIncompressibleDetection:
+    """测试不可压缩数据预检"""
+
+    def test_entropy_and_signatures(self):
+        """随机数据和已压缩格式被判定为不可压缩，文本和零数据不会"""
+        text = b"the quick brown fox jumps over the lazy dog\n" * 2000
+        assert estimate_entropy(bytes(4096)) == 0.0
+        assert estimate_entropy(os.urandom(1 << 20)) > 7.9
+
+        assert looks_incompressible(os.urandom(1 << 20))
+        assert looks_incompressible(gzip.compress(os.urandom(8192)))
+        assert not looks_incompressible(text)
+        assert not looks_incompressible(os.urandom(100))  # 太小，不做判断
+
+    def test_signature_needs_entropy(self):
+        """魔数只降低熵阈值：以魔数开头的文本仍然压缩，熵偏高但未达阈值的已压缩格式跳过"""
+        text = b"the quick brown fox jumps over the lazy dog\n" * 2000
+        for magic in (b"\xff\xd8\xff\xe0", b"BZh", b"ID3", b"GIF8"):
+            assert not looks_incompressible(magic + text)
+
+        # 只用 180 种字节值的随机数据，熵约 7.4，低于默认阈值
+        body = bytes(b % 180 for b in os.urandom(65536))
+        assert 7.0 < estimate_entropy(body) < 7.8
+        assert not looks_incompressible(body)
+        assert looks_incompressible(b"\xff\xd8\xff\xe0" + body)
+
+    def test_skip_counters(self):
+        """跳过与压缩的块分别计数，跳过的块以none编码存储"""
+        stats = CompressionStats()
+        random_blob = compress_with_detection(os.urandom(65536), stats=stats, codec="zlib")
+        text = b"compressible text " * 4000
+        text_blob = compress_with_detection(text, stats=stats, codec="zlib")
+
+        assert read_envelope_header(random_blob).codec == "none"
+        assert read_envelope_header(text_blob).codec == "zlib"
+        assert decompress_from_storage(text_blob) == text
+
+        snapshot = stats.snapshot()
+        assert snapshot['skipped_chunks'] == 1
+        assert snapshot['skipped_bytes'] == 65536
+        assert snapshot['compressed_chunks'] == 1
+        assert snapshot['wasted_chunks'] == 0
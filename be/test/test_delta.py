@@ -0,0 +1,178 @@
+import os
+import random
+import shutil
+import tempfile
+
+import pytest
+
+from benchmarks.common import text_like_bytes
+from common.db import db
+from models.chunk import Chunk, ChunkDelta, ChunkSketch, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.delta import apply_delta, compute_sketch, delta_base_hash, encode_delta
+from utils.compress import CorruptBlobError, read_envelope_header
+
+
+def _edit(data: bytes, count: int, seed: int) -> bytes:
+    """原地替换若干处字节（长度不变，固定分块的块边界不变）"""
+    rng = random.Random(seed)
+    edited = bytearray(data)
+    for _ in range(count):
+        pos = rng.randrange(len(edited) - 8)
+        edited[pos:pos + 8] = rng.randbytes(8)
+    return bytes(edited)
+
+
+class TestDeltaCodec:
+    """测试相似度特征与差分编码"""
+
+    def test_round_trip(self):
+        """插入、删除、替换后的数据可由差分还原，差分远小于原数据"""
+        base = text_like_bytes(256 * 1024, seed=1)
+        rng = random.Random(2)
+        target = bytearray(base)
+        for _ in range(10):
+            pos = rng.randrange(len(target))
+            target[pos:pos] = rng.randbytes(rng.randint(1, 50))
+            pos = rng.randrange(len(target))
+            del target[pos:pos + rng.randint(1, 50)]
+        target = bytes(target)
+
+        delta = encode_delta("ab" * 32, base, target)
+        assert len(delta) < len(target) // 20
+        assert delta_base_hash(delta) == "ab" * 32
+        assert apply_delta(delta, base) == target
+        # 不相关的数据全部作为 INSERT，仍可还原
+        unrelated = os.urandom(4096)
+        assert apply_delta(encode_delta("cd" * 32, base, unrelated), base) == unrelated
+
+    def test_wrong_base_detected(self):
+        """基准块内容不符时还原结果校验失败"""
+        base = text_like_bytes(64 * 1024, seed=3)
+        delta = encode_delta("ab" * 32, base, _edit(base, 3, seed=4))
+        with pytest.raises(CorruptBlobError):
+            apply_delta(delta, _edit(base, 3, seed=5))
+
+    def test_sketch_resemblance(self):
+        """少量改动的块至少有一个超级特征相同，不相关的块没有"""
+        base = text_like_bytes(64 * 1024, seed=6)
+        similar = compute_sketch(_edit(base, 2, seed=7))
+        sketch = compute_sketch(base)
+        assert any(a == b for a, b in zip(sketch, similar))
+        assert not any(a == b for a, b in zip(sketch, compute_sketch(os.urandom(64 * 1024))))
+
+
+class TestDeltaStore:
+    """测试块存储的相似块增量压缩"""
+
+    CHUNK = 16 * 1024
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=self.CHUNK, chunking="fixed")
+        store.chunk_policy = None
+        store.pack_small_chunks = False
+        store.delta_enabled = True
+        store.delta_max_depth = 2
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        for model in (Chunk, FileChunkMapping, ChunkSketch, ChunkDelta, MaintenanceCheckpoint):
+            db.session.query(model).delete()
+        db.session.commit()
+
+    def _read_uncached(self, store, file_hash):
+        store.chunk_cache.clear()
+        return store.read_file(file_hash)
+
+    def test_near_duplicate_stored_as_delta(self, test_app, temp_store):
+        """新版本中改动过的块以差分存储，读取时透明还原，统计节省的空间"""
+        with test_app.app_context():
+            self._reset()
+            v1 = text_like_bytes(4 * self.CHUNK, seed=10)
+            v2 = _edit(v1, 4, seed=11)
+            h1 = temp_store.store_file(v1)['file_hash']
+            before = Chunk.get_storage_stats()['total_compressed_size']
+            info = temp_store.store_file(v2)
+            added = Chunk.get_storage_stats()['total_compressed_size'] - before
+
+            deltas = db.session.query(ChunkDelta).all()
+            assert info['new_chunks'] >= 1
+            assert len(deltas) == info['new_chunks']
+            assert all(d.depth == 1 and d.delta_size * 2 <= d.full_size for d in deltas)
+            assert added == sum(d.delta_size for d in deltas)
+            blob = temp_store._read_chunk_blob(temp_store._lookup_storage_path(deltas[0].chunk_hash))
+            assert read_envelope_header(blob).delta
+
+            assert self._read_uncached(temp_store, info['file_hash']) == v2
+            assert self._read_uncached(temp_store, h1) == v1
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_range(info['file_hash'], self.CHUNK - 10, 3 * self.CHUNK) == v2[self.CHUNK - 10:3 * self.CHUNK]
+
+            stats = temp_store.get_delta_stats()
+            assert stats['delta_chunks'] == len(deltas)
+            assert stats['saved_bytes'] > 0
+            assert stats['runtime']['encoded'] == len(deltas)
+            assert stats['runtime']['delta_reads'] > 0
+
+    def test_depth_is_bounded(self, test_app, temp_store):
+        """差分链深度不超过上限：达到上限的块不再作为基准块"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.delta_max_depth = 1
+            versions = [text_like_bytes(self.CHUNK, seed=20)]
+            for i in range(3):
+                versions.append(_edit(versions[-1], 2, seed=21 + i))
+            hashes = [temp_store.store_file(v)['file_hash'] for v in versions]
+
+            depths = [d.depth for d in db.session.query(ChunkDelta)]
+            assert depths and max(depths) == 1
+            assert {d.base_hash for d in db.session.query(ChunkDelta)} == {
+                FileChunkMapping.get_file_chunks(hashes[0])[0].chunk_hash
+            }
+            for file_hash, data in zip(hashes, versions):
+                assert self._read_uncached(temp_store, file_hash) == data
+
+    def test_gc_keeps_base_chunks(self, test_app, temp_store):
+        """基准块在有差分块引用时不被回收；差分块回收后基准块随之回收"""
+        with test_app.app_context():
+            self._reset()
+            v1 = text_like_bytes(2 * self.CHUNK, seed=30)
+            v2 = _edit(v1, 2, seed=31)
+            h1 = temp_store.store_file(v1)['file_hash']
+            h2 = temp_store.store_file(v2)['file_hash']
+            assert db.session.query(ChunkDelta).count() == 2
+
+            temp_store.delete_file(h1)
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['reclaimed_chunks'] == 0
+            assert self._read_uncached(temp_store, h2) == v2
+
+            temp_store.delete_file(h2)
+            for _ in range(2):
+                temp_store.collect_garbage(grace_seconds=0)
+            assert db.session.query(Chunk).count() == 0
+            assert db.session.query(ChunkDelta).count() == 0
+            assert db.session.query(ChunkSketch).count() == 0
+
+    def test_scrub_resolves_deltas(self, test_app, temp_store):
+        """校验时还原差分块；基准块损坏时依赖它的差分块同样报告为损坏"""
+        with test_app.app_context():
+            self._reset()
+            v1 = text_like_bytes(self.CHUNK, seed=40)
+            temp_store.store_file(v1)
+            temp_store.store_file(_edit(v1, 2, seed=41))
+            report = temp_store.scrub(check_refcounts=False)['chunks']
+            assert report['ok'] == 2
+
+            base = db.session.query(ChunkDelta.base_hash).scalar()
+            with open(temp_store._lookup_storage_path(base), "r+b") as f:
+                f.seek(-4, os.SEEK_END)
+                f.write(b"\0\0\0\0")
+            temp_store.chunk_cache.clear()
+            report = temp_store.scrub(check_refcounts=False)['chunks']
+            assert report['ok'] == 0
+            assert report['corrupt'] == 2
@@ -0,0 +1,112 @@
+import json
+import random
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, ChunkDictionary, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.dictionary import DictionaryTrainer
+from utils.compress import available_codecs, read_envelope_header
+
+pytestmark = pytest.mark.skipif("zstd" not in available_codecs(), reason="需要 zstandard")
+
+
+def config_file(i: int) -> bytes:
+    """结构相同、取值不同的小型 JSON 配置文件"""
+    rng = random.Random(i)
+    return json.dumps({
+        "service": f"svc-{i}",
+        "replicas": rng.randint(1, 9),
+        "image": f"registry.example.com/team/svc-{i}:{rng.randint(100, 999)}",
+        "env": {"LOG_LEVEL": rng.choice(["info", "debug", "warn"]), "REGION": rng.choice(["cn-east", "cn-north"])},
+        "resources": {"cpu": f"{rng.randint(1, 8)}00m", "memory": f"{rng.randint(1, 16)}Gi"},
+        "healthcheck": {"path": "/healthz", "interval_seconds": rng.randint(5, 60), "timeout_seconds": 3},
+    }, indent=2).encode()
+
+
+class TestDictionaryCompression:
+    """测试小块的训练字典压缩：训练、发布版本、按字典id解码"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=4096)
+        store.chunk_policy = None
+        store.dict_enabled = True
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        for model in (Chunk, FileChunkMapping, ChunkDictionary, MaintenanceCheckpoint):
+            db.session.query(model).delete()
+        db.session.commit()
+
+    def _trainer(self, store, **kwargs):
+        return DictionaryTrainer(store, dict_size=8192, **kwargs)
+
+    def _dict_id(self, store, file_hash):
+        location = db.session.query(Chunk.storage_path).filter(
+            Chunk.chunk_hash == FileChunkMapping.get_file_chunks(file_hash)[0].chunk_hash
+        ).scalar()
+        return read_envelope_header(store._read_chunk_blob(location)).dict_id
+
+    def test_train_publish_and_use(self, test_app, temp_store):
+        """训练后发布新版本，新的小块记录字典id，旧块与新块都能读取；间隔内不重复训练"""
+        with test_app.app_context():
+            self._reset()
+            before = temp_store.store_file(config_file(-1))['file_hash']
+            for i in range(200):
+                temp_store.store_file(config_file(i))
+
+            report = self._trainer(temp_store).run()
+            assert report['published'] and report['dict_id'] is not None
+            assert report['candidate_ratio'] < report['baseline_ratio']
+            assert self._trainer(temp_store).run()['skipped'] == 'recent'
+
+            data = config_file(1000)
+            after = temp_store.store_file(data)['file_hash']
+            assert self._dict_id(temp_store, after) == report['dict_id']
+            assert self._dict_id(temp_store, before) is None
+
+            # 新进程（空字典缓存）按头部的字典id从数据库加载字典
+            reader = DatabaseChunkStore(temp_store.storage_root, chunk_size=4096)
+            try:
+                reader.chunk_cache.clear()
+                assert reader.read_file(after) == data
+                assert reader.read_file(before) == config_file(-1)
+            finally:
+                reader.close()
+
+    def test_scrub_and_no_improvement(self, test_app, temp_store):
+        """巡检能校验字典压缩的块；新字典不比当前版本更好时不发布"""
+        with test_app.app_context():
+            self._reset()
+            for i in range(200):
+                temp_store.store_file(config_file(i))
+            first = self._trainer(temp_store).run()
+            for i in range(200, 260):
+                temp_store.store_file(config_file(i))
+
+            scrubber_store = DatabaseChunkStore(temp_store.storage_root, chunk_size=4096)
+            try:
+                report = scrubber_store.scrub(check_refcounts=False)
+                chunks = report['chunks']
+                assert chunks['corrupt'] == 0 and chunks['ok'] == chunks['scanned'] == 260
+            finally:
+                scrubber_store.close()
+
+            second = self._trainer(temp_store, sample_chunks=20).run(force=True)
+            assert not second['published']
+            assert ChunkDictionary.latest_id() == first['dict_id']
+
+    def test_not_enough_samples(self, test_app, temp_store):
+        """小块太少时不训练"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(config_file(0))
+            assert self._trainer(temp_store).run()['skipped'] == 'not_enough_samples'
+            assert ChunkDictionary.latest() is None
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.durability import SyncBatch, TMP_SUFFIX
+
+
+def _tmp_files(root: str):
+    return [name for _, _, names in os.walk(root) for name in names if name.endswith(TMP_SUFFIX)]
+
+
+class TestSyncBatch:
+    """测试原子写入与组提交"""
+
+    def test_group_flush(self):
+        """持久模式：flush 前只有临时文件；flush 时每个文件、每个目录各 fsync 一次"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            dirs = [os.path.join(temp_dir, d) for d in ("aa", "bb")]
+            for d in dirs:
+                os.makedirs(d)
+            paths = [os.path.join(dirs[i % 2], f"{i:064x}") for i in range(6)]
+
+            batch = SyncBatch(durable=True)
+            for i, path in enumerate(paths):
+                batch.write(path, b"chunk %d" % i)
+            assert not any(os.path.exists(p) for p in paths)
+            assert len(_tmp_files(temp_dir)) == 6
+
+            with mock.patch("services.dedup.durability.os.fsync", wraps=os.fsync) as fsync:
+                batch.flush()
+            assert fsync.call_count == 6 + 2
+            assert batch.stats['file_syncs'] == 6
+            assert batch.stats['dir_syncs'] == 2
+            assert all(open(p, "rb").read() == b"chunk %d" % i for i, p in enumerate(paths))
+            assert _tmp_files(temp_dir) == []
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_early_flush_and_abort(self):
+        """待同步文件达到上限时提前 flush；abort 删除尚未 flush 的临时文件"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            batch = SyncBatch(durable=True, max_pending=2)
+            paths = [os.path.join(temp_dir, f"{i:064x}") for i in range(3)]
+            for path in paths:
+                batch.write(path, b"x")
+            assert os.path.exists(paths[0]) and os.path.exists(paths[1])
+            assert not os.path.exists(paths[2])
+
+            batch.abort()
+            assert not os.path.exists(paths[2])
+            assert _tmp_files(temp_dir) == []
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_non_durable_replaces_immediately(self):
+        """非持久模式：原子替换后立即可见，不 fsync"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "0" * 64)
+            batch = SyncBatch(durable=False)
+            with mock.patch("services.dedup.durability.os.fsync") as fsync:
+                batch.write(path, b"data")
+                batch.flush()
+                fsync.assert_not_called()
+            assert open(path, "rb").read() == b"data"
+            assert _tmp_files(temp_dir) == []
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestDurableIngest:
+    """测试入库时先落盘再提交"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.durable_writes = True
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.commit()
+
+    def test_commit_after_flush(self, test_app, temp_store):
+        """数据库提交发生在块文件和包文件落盘之后"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.pack_small_chunks = True
+            temp_store.pack_threshold = 600
+            events = []
+            flush, commit = SyncBatch.flush, db.session.commit
+
+            def traced_flush(batch):
+                events.append('flush')
+                return flush(batch)
+
+            def traced_commit():
+                events.append('commit')
+                return commit()
+
+            data = os.urandom(4096) + b"\0" * 1024  # 4个独立块文件 + 1个包内小块
+            with mock.patch.object(SyncBatch, "flush", traced_flush), \
+                    mock.patch.object(temp_store.pack_store, "sync", wraps=temp_store.pack_store.sync) as pack_sync, \
+                    mock.patch.object(db.session, "commit", traced_commit):
+                file_hash = temp_store.store_file(data)['file_hash']
+            assert events == ['flush', 'commit']
+            assert pack_sync.call_count == 1
+            assert temp_store.read_file(file_hash) == data
+            assert _tmp_files(temp_store.chunks_dir) == []
+
+    def test_failed_sync_leaves_no_records(self, test_app, temp_store):
+        """落盘失败时不提交数据库记录，临时文件被清理"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.pack_small_chunks = False
+            with mock.patch("services.dedup.durability._fsync_file", side_effect=OSError("disk failure")):
+                with pytest.raises(OSError):
+                    temp_store.store_file(os.urandom(4096))
+            assert db.session.query(Chunk).count() == 0
+            assert db.session.query(FileChunkMapping).count() == 0
+            assert _tmp_files(temp_store.chunks_dir) == []
+            assert not any(names for _, _, names in os.walk(temp_store.layout.base_dir)
+                           if any(len(n) == 64 for n in names))
+
+    def test_sweep_removes_stale_tmp_files(self, test_app, temp_store):
+        """崩溃残留的临时文件超过宽限期后由孤立块清理删除"""
+        with test_app.app_context():
+            self._reset()
+            name = "ab" * 32
+            path = temp_store.layout.path_for(name) + ".123-456" + TMP_SUFFIX
+            with open(path, "wb") as f:
+                f.write(b"partial")
+            old = time.time() - 7200
+            os.utime(path, (old, old))
+
+            report = temp_store.sweep_orphaned_chunks(grace_seconds=60)
+            assert report['stale_tmp'] == 1
+            assert report['stale_tmp_removed'] == 1
+            assert report['scanned'] == 0
+            assert not os.path.exists(path)
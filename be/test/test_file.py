@@ -68,6 +68,54 @@ def test_download_file(client, auth_headers):
     assert res.data == b"hello world"
 
 
+def test_download_range(client, auth_headers):
+    headers = dict(auth_headers, Range="bytes=6-10")
+    res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+    assert res.status_code == 206
+    assert res.data == b"world"
+    assert res.headers["Content-Range"] == "bytes 6-10/11"
+    assert res.headers["Accept-Ranges"] == "bytes"
+
+    headers = dict(auth_headers, Range="bytes=0-4,-5")
+    res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+    assert res.status_code == 206
+    assert res.mimetype == "multipart/byteranges"
+    assert b"Content-Range: bytes 0-4/11\r\n\r\nhello" in res.data
+    assert b"Content-Range: bytes 6-10/11\r\n\r\nworld" in res.data
+
+    headers = dict(auth_headers, Range="bytes=100-")
+    res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+    assert res.status_code == 416
+    assert res.headers["Content-Range"] == "bytes */11"
+
+
+def test_download_range_vanished(client, auth_headers, monkeypatch):
+    # stat 之后文件被删除：返回 404，而不是按预先算好的 Content-Length 发送空的 206
+    from services.file_service import FileService
+    monkeypatch.setattr(FileService, "download", staticmethod(lambda *args, **kwargs: None))
+    for spec in ("bytes=6-10", "bytes=0-4,-5"):
+        headers = dict(auth_headers, Range=spec)
+        res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+        assert res.status_code == 404
+
+
+def test_download_if_range(client, auth_headers):
+    res = client.get("/file/download", headers=auth_headers, query_string={"filename": "hello.txt"})
+    etag = res.headers["ETag"]
+
+    headers = dict(auth_headers, Range="bytes=0-4")
+    headers["If-Range"] = etag
+    res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+    assert res.status_code == 206
+    assert res.data == b"hello"
+
+    # etag 不匹配时返回完整文件
+    headers["If-Range"] = '"stale"'
+    res = client.get("/file/download", headers=headers, query_string={"filename": "hello.txt"})
+    assert res.status_code == 200
+    assert res.data == b"hello world"
+
+
 def test_create_folder(client, auth_headers):
     res = client.post("/file/create_folder", headers=auth_headers, json={"foldername": "docs"})
     assert res.get_json()["code"] == 0 
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, ChunkFingerprint, FileChunkMapping
+from services.dedup.chunk_store import DatabaseChunkStore
+from utils.hash import available_fingerprints, get_fingerprint
+
+
+class TestChunkFingerprint:
+    """测试可配置的块指纹算法：算法记录、混合存储的读取与校验、删除时清理"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.chunk_policy = None
+        store.pack_small_chunks = False
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        for model in (Chunk, FileChunkMapping, ChunkFingerprint):
+            db.session.query(model).delete()
+        db.session.commit()
+
+    def _chunk_hashes(self, file_hash):
+        return [mapping.chunk_hash for mapping in FileChunkMapping.get_file_chunks(file_hash)]
+
+    def test_fingerprint_functions(self):
+        """所有可用算法的摘要都是 64 位十六进制；未知算法报错"""
+        assert {"sha256", "blake2b"} <= set(available_fingerprints())
+        for name in available_fingerprints():
+            digest = get_fingerprint(name)(b"hello")
+            assert len(digest) == 64 and int(digest, 16) >= 0
+        assert get_fingerprint("blake2b")(b"hello") == hashlib.blake2b(b"hello", digest_size=32).hexdigest()
+        with pytest.raises(ValueError):
+            get_fingerprint("md5")
+
+    def test_default_writes_no_rows(self, test_app, temp_store):
+        """默认 sha256 不写算法记录"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(3000)
+            file_hash = temp_store.store_file(data)['file_hash']
+            assert self._chunk_hashes(file_hash)[0] == hashlib.sha256(data[:1024]).hexdigest()
+            assert db.session.query(ChunkFingerprint).count() == 0
+
+    @pytest.mark.parametrize("packed", [False, True])
+    @pytest.mark.parametrize("algorithm", [
+        "blake2b",
+        pytest.param("blake3", marks=pytest.mark.skipif("blake3" not in available_fingerprints(), reason="需要 blake3")),
+    ])
+    def test_mixed_store(self, test_app, temp_store, packed, algorithm):
+        """先用 sha256 再改用其他算法：新块记录算法，两种块都能读取，巡检全部通过"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.pack_small_chunks = packed
+            old_data = os.urandom(3000)
+            old_hash = temp_store.store_file(old_data)['file_hash']
+
+            temp_store.fingerprint = algorithm
+            new_data = os.urandom(2500)
+            new_hash = temp_store.store_file(new_data)['file_hash']
+            new_chunks = self._chunk_hashes(new_hash)
+            assert new_chunks[0] == get_fingerprint(algorithm)(new_data[:1024])
+            assert ChunkFingerprint.algorithms_of(new_chunks + self._chunk_hashes(old_hash)) == {
+                chunk_hash: algorithm for chunk_hash in new_chunks
+            }
+
+            # 相同内容再次上传时与同一算法的块去重
+            assert temp_store.store_file(new_data)['file_hash'] == new_hash
+            assert db.session.query(ChunkFingerprint).count() == len(set(new_chunks))
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(old_hash) == old_data
+            assert temp_store.read_file(new_hash) == new_data
+            chunks = temp_store.scrub(check_refcounts=False)['chunks']
+            assert chunks['ok'] == chunks['scanned'] == 6 and chunks['hash_mismatch'] == 0
+
+    def test_delete_removes_rows(self, test_app, temp_store):
+        """块被回收时一并删除算法记录"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.fingerprint = "blake2b"
+            file_hash = temp_store.store_file(os.urandom(2048))['file_hash']
+            assert db.session.query(ChunkFingerprint).count() == 2
+            temp_store.delete_file(file_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+            assert db.session.query(ChunkFingerprint).count() == 0
+
+    def test_unknown_algorithm(self, test_app):
+        """配置了不可用的算法时在创建存储时报错"""
+        with test_app.app_context():
+            temp_dir = tempfile.mkdtemp()
+            try:
+                with pytest.raises(ValueError):
+                    DatabaseChunkStore(temp_dir, fingerprint="crc32")
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,207 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import ChunkReclaimedError, DatabaseChunkStore
+from services.dedup.gc import GarbageCollector
+
+
+class TestGarbageCollector:
+    """测试标记-清除垃圾回收"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.pack_small_chunks = False  # 使用独立块文件，便于检查文件是否被删除
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.query(MaintenanceCheckpoint).delete()
+        db.session.commit()
+
+    def test_delete_only_drops_manifest(self, test_app, temp_store):
+        """删除文件只删除清单并减少引用计数，块文件留给垃圾回收"""
+        with test_app.app_context():
+            self._reset()
+            shared = os.urandom(1024)
+            keep = temp_store.store_file(shared + os.urandom(2048))['file_hash']
+            drop = temp_store.store_file(shared + os.urandom(2048))['file_hash']
+            drop_chunks = [m.chunk_hash for m in FileChunkMapping.get_file_chunks(drop)]
+
+            result = temp_store.delete_file(drop)
+            assert result == {'deleted_chunks': 2, 'remaining_chunks': 1}
+            assert not temp_store.file_exists(drop)
+            assert all(Chunk.exists(h) for h in drop_chunks)
+            assert Chunk.get_ref_count(drop_chunks[0]) == 1
+
+            # 宽限期内的块不回收
+            report = temp_store.collect_garbage()
+            assert report['reclaimed_chunks'] == 0
+            assert report['skipped_recent'] == 2
+
+            dry = temp_store.collect_garbage(grace_seconds=0, dry_run=True)
+            assert dry['reclaimable'] == 2
+            assert all(Chunk.exists(h) for h in drop_chunks)
+
+            paths = {h: temp_store._lookup_storage_path(h) for h in drop_chunks}
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['completed']
+            assert report['reclaimed_chunks'] == 2
+            assert Chunk.exists(drop_chunks[0])
+            assert not any(Chunk.exists(h) for h in drop_chunks[1:])
+            assert not any(os.path.exists(paths[h]) for h in drop_chunks[1:])
+            assert os.path.exists(paths[drop_chunks[0]])
+            assert temp_store.read_file(keep) is not None
+
+    def test_incremental_runs_resume_from_checkpoint(self, test_app, temp_store):
+        """分批运行时保存断点，下次从断点继续直到完成"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(10 * 1024))['file_hash']
+            temp_store.delete_file(file_hash)
+
+            collector = GarbageCollector(temp_store, batch_size=3, grace_seconds=0)
+            first = collector.run(max_batches=2)
+            assert not first['completed']
+            assert first['reclaimed_chunks'] == 6
+            cursor, _ = MaintenanceCheckpoint.load(GarbageCollector.CHECKPOINT_TASK)
+            assert cursor
+
+            second = collector.run()
+            assert second['resumed_from'] == cursor
+            assert second['completed']
+            # 统计跨运行累计
+            assert second['reclaimed_chunks'] == 10
+            assert db.session.query(Chunk).count() == 0
+            assert MaintenanceCheckpoint.load(GarbageCollector.CHECKPOINT_TASK) == ('', {})
+
+    def test_rereferenced_chunk_is_kept(self, test_app, temp_store):
+        """回收前被重新上传引用的块不会被删除"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(2048)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.delete_file(file_hash)
+            temp_store.store_file(data)
+
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['reclaimed_chunks'] == 0
+            assert temp_store.read_file(file_hash) == data
+
+    def test_delete_chunk_only_drops_refs(self, test_app, temp_store):
+        """delete_chunk 只减少引用计数：计数有偏差时仍被文件引用的块不会被删除，回收以文件映射为准"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(2048)
+            file_hash = temp_store.store_file(data)['file_hash']
+            chunk_hash = FileChunkMapping.get_file_chunks(file_hash)[0].chunk_hash
+            path = temp_store._lookup_storage_path(chunk_hash)
+
+            assert temp_store.delete_chunk(chunk_hash)
+            assert not temp_store.delete_chunk(chunk_hash + "0")
+            assert temp_store.delete_chunk(chunk_hash)
+            assert Chunk.get_ref_count(chunk_hash) == 0
+            assert os.path.exists(path)
+            assert temp_store.collect_garbage(grace_seconds=0)['reclaimed_chunks'] == 0
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+            temp_store.delete_file(file_hash)
+            assert temp_store.collect_garbage(grace_seconds=0)['reclaimed_chunks'] == 2
+            assert not os.path.exists(path)
+
+    def _gc_before_commit(self, store, collect):
+        """在入库的存在性检查之后、提交引用之前执行一次 collect（只执行一次）"""
+        save_refs = store._save_refs
+        calls = []
+
+        def interleaved(*args):
+            if not calls:
+                calls.append(collect())
+            return save_refs(*args)
+
+        store._save_refs = interleaved
+        return calls
+
+    def test_reupload_racing_gc(self, test_app, temp_store):
+        """删除 -> 重新上传 -> 上传提交前回收：复用的块已被回收时回滚重试，提交的清单可以读取"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(3072)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.delete_file(file_hash)
+
+            calls = self._gc_before_commit(temp_store, lambda: temp_store.collect_garbage(grace_seconds=0))
+            assert temp_store.store_file(data)['file_hash'] == file_hash
+            assert calls[0]['reclaimed_chunks'] == 3
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+            # 数据流无法重读：报错并回滚，不留下无法读取的清单
+            temp_store.delete_file(file_hash)
+            self._gc_before_commit(temp_store, lambda: temp_store.collect_garbage(grace_seconds=0))
+            with pytest.raises(ChunkReclaimedError):
+                temp_store.store_file_stream(io.BytesIO(data))
+            assert not temp_store.file_exists(file_hash)
+            assert temp_store.store_file_stream(io.BytesIO(data))['file_hash'] == file_hash
+            assert temp_store.read_file(file_hash) == data
+
+    def test_blob_removal_rechecks_rewritten_chunks(self, test_app, temp_store):
+        """回收提交删除记录后、删除块文件前，并发上传已在同一位置重新写入并提交的块不删除"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(2048)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.delete_file(file_hash)
+
+            remove = temp_store._remove_unreferenced_blobs
+
+            def reupload_first(removed):
+                temp_store.store_file(data)
+                return remove(removed)
+
+            temp_store._remove_unreferenced_blobs = reupload_first
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['reclaimed_chunks'] == 2 and report['remove_errors'] == 0
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+    def test_upload_detects_removed_blobs(self, test_app, temp_store):
+        """上传写入块文件后、提交前，回收删除了同一位置的文件：提交时发现并重新写入"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(2048)
+            file_hash = temp_store.store_file(data)['file_hash']
+            removed = [(h, temp_store._lookup_storage_path(h)) for h in
+                       (m.chunk_hash for m in FileChunkMapping.get_file_chunks(file_hash))]
+            temp_store.delete_file(file_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+
+            # 模拟上一轮回收滞后的文件删除：记录早已删除，新写入的文件尚未提交
+            calls = self._gc_before_commit(temp_store, lambda: temp_store._remove_unreferenced_blobs(removed))
+            assert temp_store.store_file(data)['file_hash'] == file_hash
+            assert calls == [0]
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+    def test_throttle(self, test_app, temp_store):
+        """限制每秒回收的块数"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(6 * 1024))['file_hash']
+            temp_store.delete_file(file_hash)
+
+            collector = GarbageCollector(temp_store, batch_size=2, grace_seconds=0, max_deletes_per_second=40)
+            report = collector.run()
+            assert report['reclaimed_chunks'] == 6
+            assert report['runtime_seconds'] >= 6 / 40
@@ -0,0 +1,62 @@
+from utils.http_range import (
+    MAX_RANGES,
+    content_disposition,
+    if_range_matches,
+    multipart_byteranges,
+    multipart_byteranges_length,
+    parse_range,
+)
+
+
+class TestHttpRange:
+    """测试 Range / If-Range 解析"""
+
+    def test_parse_single_and_suffix(self):
+        assert parse_range("bytes=0-99", 1000) == [(0, 100)]
+        assert parse_range("bytes=900-", 1000) == [(900, 1000)]
+        assert parse_range("bytes=-100", 1000) == [(900, 1000)]
+        assert parse_range("bytes=-5000", 1000) == [(0, 1000)]
+        assert parse_range("bytes=990-2000", 1000) == [(990, 1000)]
+
+    def test_parse_multi_range_keeps_order(self):
+        assert parse_range("bytes=500-599, 0-9, -1", 1000) == [(500, 600), (0, 10), (999, 1000)]
+
+    def test_invalid_and_unsatisfiable(self):
+        # 格式非法时忽略 Range
+        assert parse_range(None, 1000) is None
+        assert parse_range("items=0-1", 1000) is None
+        assert parse_range("bytes=abc", 1000) is None
+        assert parse_range("bytes=9-3", 1000) is None
+        assert parse_range("bytes=" + ",".join(["0-1"] * (MAX_RANGES + 1)), 1000) is None
+        # 起点超出文件大小的区间无法满足
+        assert parse_range("bytes=1000-", 1000) == []
+        assert parse_range("bytes=0-1", 0) == []
+        assert parse_range("bytes=2000-3000, 0-0", 1000) == [(0, 1)]
+
+    def test_if_range(self):
+        assert if_range_matches(None, "abc", 0)
+        assert if_range_matches('"abc"', "abc", 0)
+        assert not if_range_matches('"abd"', "abc", 0)
+        assert not if_range_matches('W/"abc"', "abc", 0)
+        assert not if_range_matches('"abc"', None, 0)
+        assert if_range_matches("Wed, 21 Oct 2015 07:28:00 GMT", None, 1445412480.5)
+        assert not if_range_matches("Wed, 21 Oct 2015 07:28:00 GMT", None, 1445412481)
+
+    def test_multipart_body(self):
+        parts = [(0, 3, iter([b"a", b"bc"])), (7, 9, iter([b"hi"]))]
+        body = b"".join(multipart_byteranges(parts, 10, "text/plain", "XYZ"))
+        assert len(body) == multipart_byteranges_length([(0, 3), (7, 9)], 10, "text/plain", "XYZ")
+        assert body == (
+            b"--XYZ\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-2/10\r\n\r\nabc\r\n"
+            b"--XYZ\r\nContent-Type: text/plain\r\nContent-Range: bytes 7-8/10\r\n\r\nhi\r\n"
+            b"--XYZ--\r\n"
+        )
+
+    def test_content_disposition(self):
+        assert content_disposition("a.txt") == 'attachment; filename="a.txt"'
+        assert content_disposition("文档.txt") == "attachment; filename=\".txt\"; filename*=UTF-8''%E6%96%87%E6%A1%A3.txt"
+        assert content_disposition('a"b\\c.txt') == 'attachment; filename="a\\"b\\\\c.txt"'
+        # 控制字符不能出现在响应头中
+        value = content_disposition("x\r\nSet-Cookie: a=b.txt")
+        assert "\r" not in value and "\n" not in value
+        assert value == "attachment; filename=\"xSet-Cookie: a=b.txt\"; filename*=UTF-8''x%0D%0ASet-Cookie%3A%20a%3Db.txt"
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.layout import ChunkLayout, LayoutMigrator
+from services.dedup.sweeper import OrphanSweeper
+
+
+class TestChunkLayout:
+    """测试块文件目录布局"""
+
+    def test_paths_and_descriptor(self):
+        """多级分片路径、描述文件校验、目录创建缓存"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            chunk_hash = "abcdef" + "0" * 58
+            layout = ChunkLayout(temp_dir, depth=3, width=2)
+            layout.initialize()
+            path = layout.path_for(chunk_hash)
+            assert path == os.path.join(temp_dir, "v2-3x2", "ab", "cd", "ef", chunk_hash)
+            assert os.path.isdir(os.path.dirname(path))
+            assert layout.contains(path)
+            assert not layout.contains(ChunkLayout.legacy(temp_dir).path_for(chunk_hash, create=False))
+
+            with mock.patch("services.dedup.layout.os.makedirs") as makedirs:
+                layout.path_for(chunk_hash)
+                layout.path_for("abcdef" + "1" * 58)
+                makedirs.assert_not_called()
+
+            # 同一目录的描述文件与配置不一致时拒绝使用
+            with open(os.path.join(layout.base_dir, ChunkLayout.DESCRIPTOR_NAME), "w") as f:
+                f.write('{"version": 2, "depth": 2, "width": 3}')
+            with pytest.raises(ValueError):
+                ChunkLayout(temp_dir, depth=3, width=2).initialize()
+            with pytest.raises(ValueError):
+                ChunkLayout(temp_dir, depth=2, width=2, version=1)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_sweeper_walks_nested_shards(self):
+        """多级分片目录按全局顺序扫描，归并结果与一级分片相同"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            layout = ChunkLayout(temp_dir, depth=2, width=2)
+            names = sorted(hashlib.sha256(str(i).encode()).hexdigest() for i in range(300))
+            known, orphans = names[::3], [n for i, n in enumerate(names) if i % 3]
+            old = time.time() - 7200
+            for name in names:
+                path = layout.path_for(name)
+                with open(path, "wb") as f:
+                    f.write(b"x")
+                os.utime(path, (old, old))
+
+            report = OrphanSweeper(layout.base_dir, iter(known), grace_seconds=60, workers=4,
+                                   depth=layout.depth, width=layout.width).sweep()
+            assert report['scanned'] == len(names)
+            assert report['removed'] == len(orphans)
+            assert all(os.path.exists(layout.path_for(n, create=False)) for n in known)
+            assert not any(os.path.exists(layout.path_for(n, create=False)) for n in orphans)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestLayoutMigration:
+    """测试在线迁移到新布局"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.pack_small_chunks = False
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.query(MaintenanceCheckpoint).delete()
+        db.session.commit()
+
+    def _store_legacy(self, store, data):
+        """模拟旧版本写入：块文件位于根目录下的一级分片"""
+        current = store.layout
+        store.layout = ChunkLayout.legacy(store.chunks_dir)
+        try:
+            return store.store_file(data)['file_hash']
+        finally:
+            store.layout = current
+
+    def test_migrate_legacy_chunks(self, test_app, temp_store):
+        """分批迁移旧布局的块，迁移中途和完成后读取都正常，断点续跑"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(6 * 1024)
+            file_hash = self._store_legacy(temp_store, data)
+            legacy = ChunkLayout.legacy(temp_store.chunks_dir)
+            old_paths = [row[0] for row in db.session.query(Chunk.storage_path)]
+            assert all(legacy.contains(p) for p in old_paths)
+
+            dry = temp_store.migrate_layout(dry_run=True)
+            assert dry['pending'] == 6
+            assert all(os.path.exists(p) for p in old_paths)
+
+            with mock.patch("config.Config.LAYOUT_MIGRATE_BATCH_SIZE", 2, create=True):
+                partial = temp_store.migrate_layout(max_batches=1)
+            assert partial['migrated'] == 2
+            assert not partial['completed']
+            assert temp_store.read_file(file_hash) == data
+
+            # 读取请求拿到的是迁移前查出的旧位置，重新查询后仍能读到
+            temp_store.chunk_cache.clear()
+            moved = next(h for h, p in db.session.query(Chunk.chunk_hash, Chunk.storage_path)
+                         if temp_store.layout.contains(p))
+            stale_path = legacy.path_for(moved, create=False)
+            assert not os.path.exists(stale_path)
+            assert temp_store._load_chunk(moved, stale_path) is not None
+
+            report = temp_store.migrate_layout()
+            assert report['completed']
+            assert report['migrated'] == 6
+            assert report['resumed_from']
+            assert all(temp_store.layout.contains(row[0]) for row in db.session.query(Chunk.storage_path))
+            assert not any(os.path.exists(p) for p in old_paths)
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+            again = temp_store.migrate_layout()
+            assert again['migrated'] == 0
+            assert again['already_migrated'] == 6
+
+    def test_remove_errors_checkpointed(self, test_app, temp_store):
+        """旧块文件删除失败的计数写入断点，续跑时不丢失"""
+        with test_app.app_context():
+            self._reset()
+            self._store_legacy(temp_store, os.urandom(4 * 1024))
+            with mock.patch("config.Config.LAYOUT_MIGRATE_BATCH_SIZE", 2, create=True), \
+                    mock.patch("services.dedup.layout.os.remove", side_effect=OSError):
+                partial = temp_store.migrate_layout(max_batches=1)
+            assert partial['remove_errors'] == 2
+            assert MaintenanceCheckpoint.load(LayoutMigrator.CHECKPOINT_TASK)[1]['remove_errors'] == 2
+
+            report = temp_store.migrate_layout()
+            assert report['completed'] and report['remove_errors'] == 2
+
+    def test_sweep_covers_all_layouts(self, test_app, temp_store):
+        """孤立块清理同时扫描当前布局和旧布局"""
+        with test_app.app_context():
+            self._reset()
+            old = time.time() - 7200
+            orphans = []
+            for layout, name in ((temp_store.layout, "1" * 64), (ChunkLayout.legacy(temp_store.chunks_dir), "2" * 64)):
+                path = layout.path_for(name)
+                with open(path, "wb") as f:
+                    f.write(b"orphan")
+                os.utime(path, (old, old))
+                orphans.append(path)
+            data = os.urandom(2048)
+            file_hash = self._store_legacy(temp_store, data)
+            temp_store.store_file(os.urandom(2048))
+
+            report = temp_store.sweep_orphaned_chunks(grace_seconds=60)
+            assert report['scanned'] == 6
+            assert report['removed'] == 2
+            assert not any(os.path.exists(p) for p in orphans)
+            assert temp_store.read_file(file_hash) == data
@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.backend import ChunkBackend
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.object_store import ObjectStore
+from services.dedup.packfile import PackStore
+
+BUCKET = "chunk-objects"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _count_requests(client) -> Counter:
+    """按操作名统计客户端发出的请求"""
+    calls = Counter()
+    client.meta.events.register("before-call.s3", lambda model, **kwargs: calls.update([model.name]))
+    return calls
+
+
+class TestObjectStore:
+    """测试对象存储块后端的读写删除"""
+
+    def test_put_many_bounded_concurrency(self, s3_client):
+        """并发上传时同时进行的请求数不超过上限"""
+        store = ObjectStore(BUCKET, client=s3_client, max_concurrency=3)
+        lock = threading.Lock()
+        in_flight, peak = [0], [0]
+        original = s3_client.put_object
+
+        def slow_put(**kwargs):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.02)
+            try:
+                return original(**kwargs)
+            finally:
+                with lock:
+                    in_flight[0] -= 1
+
+        s3_client.put_object = slow_put
+        items = [(f"{i:064x}", os.urandom(100)) for i in range(12)]
+        try:
+            locations = store.put_many(items)
+        finally:
+            store.close()
+        assert peak[0] == 3
+        assert [store.read(location) for location in locations] == [blob for _, blob in items]
+
+    def test_missing_and_batched_delete(self, s3_client):
+        """不存在的对象读取为 None；批量删除按上限分批请求"""
+        store = ObjectStore(BUCKET, client=s3_client)
+        store.DELETE_BATCH = 4
+        locations = store.put_many([(f"{i:064x}", b"x") for i in range(10)])
+        calls = _count_requests(s3_client)
+        assert store.delete_many(locations) == 0
+        assert calls["DeleteObjects"] == 3
+        assert store.read(locations[0]) is None
+        assert s3_client.list_objects_v2(Bucket=BUCKET).get("KeyCount", 0) == 0
+        store.close()
+
+    def test_incomplete_backend_rejected(self):
+        """后端接口是抽象类：缺少方法的实现在创建时就报错"""
+        class ReadOnlyBackend(ChunkBackend):
+            def read(self, location):
+                return None
+
+        with pytest.raises(TypeError):
+            ReadOnlyBackend()
+
+
+class TestObjectBackendStore:
+    """测试块存储使用对象存储后端：块级去重、读取、回收，且不发 HEAD 请求"""
+
+    @pytest.fixture
+    def temp_store(self, s3_client):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.chunk_policy = None
+        store.chunk_backend = "s3"
+        store.object_store = ObjectStore(BUCKET, client=s3_client, max_concurrency=4)
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.commit()
+
+    def _objects(self, store):
+        return store.object_store.client.list_objects_v2(Bucket=BUCKET).get("KeyCount", 0)
+
+    def test_chunks_deduplicated_in_bucket(self, test_app, temp_store):
+        """每个唯一块一个对象，重复内容不再上传；存在性只查数据库"""
+        with test_app.app_context():
+            self._reset()
+            calls = _count_requests(temp_store.object_store.client)
+            shared = os.urandom(4096)
+            data1 = shared + os.urandom(2048)
+            data2 = shared + os.urandom(1024)
+            h1 = temp_store.store_file(data1)['file_hash']
+            info = temp_store.store_file(data2)
+
+            assert info['new_chunks'] == 1
+            assert self._objects(temp_store) == 7
+            assert calls["PutObject"] == 7
+            assert all(ObjectStore.is_object_location(row[0]) for row in db.session.query(Chunk.storage_path))
+            assert not os.listdir(temp_store.pack_store.packs_dir)
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(h1) == data1
+            assert temp_store.read_range(info['file_hash'], 4000, 5000) == data2[4000:5000]
+            assert calls["HeadObject"] == 0
+
+    def test_gc_batch_deletes_objects(self, test_app, temp_store):
+        """回收时一次批量删除请求删除整批对象"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(8 * 1024))['file_hash']
+            assert self._objects(temp_store) == 8
+            calls = _count_requests(temp_store.object_store.client)
+
+            temp_store.delete_file(file_hash)
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['reclaimed_chunks'] == 8
+            assert report['remove_errors'] == 0
+            assert calls["DeleteObjects"] == 1
+            assert self._objects(temp_store) == 0
+
+    def test_missing_object_fails_read(self, test_app, temp_store):
+        """对象丢失时文件读取失败而不是返回错误数据"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(2048))['file_hash']
+            location = db.session.query(Chunk.storage_path).first()[0]
+            temp_store.object_store.delete_many([location])
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) is None
+
+    def test_upload_racing_blob_removal(self, test_app, temp_store):
+        """回收在上传写入对象后、提交前删除了同一对象：按删除记录发现并重新上传，不发 HEAD 请求"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(2048)
+            file_hash = temp_store.store_file(data)['file_hash']
+            removed = [(row.chunk_hash, row.storage_path) for row in
+                       db.session.query(Chunk.chunk_hash, Chunk.storage_path)]
+            temp_store.delete_file(file_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+
+            save_refs = temp_store._save_refs
+            raced = []
+
+            def interleaved(*args):
+                if not raced:
+                    raced.append(temp_store._remove_unreferenced_blobs(removed))
+                return save_refs(*args)
+
+            temp_store._save_refs = interleaved
+            calls = _count_requests(temp_store.object_store.client)
+            assert temp_store.store_file(data)['file_hash'] == file_hash
+            assert raced == [0] and calls["PutObject"] == 4
+            assert self._objects(temp_store) == 2
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+            assert calls["HeadObject"] == 0
+
+    def test_compaction_stays_local(self, test_app, temp_store):
+        """对象存储后端下压缩本地包（切换后端前写入的块）：存活的块写回本地包，不上传到对象存储"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.chunk_backend = "local"
+            keep = b"keep me " * 100
+            keep_hash = temp_store.store_file(keep)['file_hash']
+            drop_hash = temp_store.store_file(b"drop me " * 300)['file_hash']
+            temp_store.pack_store.seal()
+            temp_store.chunk_backend = "s3"
+
+            temp_store.delete_file(drop_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+            calls = _count_requests(temp_store.object_store.client)
+            report = temp_store.compact_packs(threshold=0.3, min_age=0)
+            assert report['packs_compacted'] == 1 and report['chunks_moved'] > 0
+            assert calls["PutObject"] == 0 and self._objects(temp_store) == 0
+            assert all(PackStore.is_pack_location(row[0]) for row in db.session.query(Chunk.storage_path))
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(keep_hash) == keep
@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.packfile import PackStore
+
+
+class TestPackStore:
+    """测试小块包文件存储"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.commit()
+
+    def test_append_read_and_index(self):
+        """追加写入、按位置读取、索引记录一致"""
+        temp_dir = tempfile.mkdtemp()
+        packs = PackStore(temp_dir, max_pack_size=100)
+        try:
+            h1, h2 = "aa" * 32, "bb" * 32
+            loc1 = packs.append(h1, b"x" * 60)
+            loc2 = packs.append(h2, b"y" * 60)  # 超过包大小上限，写入新包
+
+            assert packs.read(loc1) == b"x" * 60
+            assert packs.read(loc2) == b"y" * 60
+            assert len(packs.list_packs()) == 2
+
+            name, offset, length = PackStore.parse_location(loc1)
+            assert list(packs.read_index(name)) == [(h1, offset, length)]
+        finally:
+            packs.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_small_chunks_packed_and_loose_still_readable(self, test_app, temp_store):
+        """小块写入包文件，旧的独立文件布局仍可读取"""
+        with test_app.app_context():
+            self._reset()
+
+            data = b"packed chunk data " * 200
+            result = temp_store.store_file(data)
+            for mapping in FileChunkMapping.get_file_chunks(result['file_hash']):
+                chunk = Chunk.query.filter_by(chunk_hash=mapping.chunk_hash).first()
+                assert PackStore.is_pack_location(chunk.storage_path)
+            assert temp_store.read_file(result['file_hash']) == data
+
+            # 模拟旧版本写入的独立块文件
+            legacy = b"legacy loose chunk"
+            legacy_hash = temp_store._calculate_chunk_hash(legacy)
+            legacy_path = temp_store._get_chunk_storage_path(legacy_hash)
+            with open(legacy_path, "wb") as f:
+                f.write(temp_store._compress_chunk(legacy))
+            Chunk.upsert_refs([{
+                'chunk_hash': legacy_hash, 'chunk_size': len(legacy),
+                'storage_path': legacy_path, 'compressed_size': None, 'ref_count': 1,
+            }])
+            assert temp_store.read_chunk(legacy_hash) == legacy
+
+    def test_compaction_reclaims_dead_bytes(self, test_app, temp_store):
+        """删除文件后压缩包文件，存活的块迁移到新包"""
+        with test_app.app_context():
+            self._reset()
+
+            keep = b"keep me " * 100
+            drop = b"drop me " * 300
+            keep_hash = temp_store.store_file(keep)['file_hash']
+            drop_hash = temp_store.store_file(drop)['file_hash']
+            temp_store.pack_store.seal()
+            old_packs = temp_store.pack_store.list_packs()
+
+            temp_store.delete_file(drop_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+            report = temp_store.compact_packs(threshold=0.3, min_age=0)
+
+            assert report['packs_compacted'] == 1
+            assert report['bytes_reclaimed'] > 0
+            assert not any(os.path.exists(temp_store.pack_store.pack_path(p)) for p in old_packs)
+            assert temp_store.read_file(keep_hash) == keep
+
+    def test_compaction_streams_in_batches(self, test_app, temp_store, monkeypatch):
+        """压缩时存活的块分批读出、写入，不把整个包读进内存"""
+        with test_app.app_context():
+            self._reset()
+            files = {}
+            for _ in range(6):
+                data = os.urandom(3000)
+                files[temp_store.store_file(data)['file_hash']] = data
+            drop_hash = temp_store.store_file(os.urandom(8000))['file_hash']
+            temp_store.pack_store.seal()
+            temp_store.delete_file(drop_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+
+            monkeypatch.setattr(DatabaseChunkStore, "COMPACT_BATCH_BYTES", 4096)
+            write_chunk_blobs = temp_store._write_chunk_blobs
+            batches = []
+
+            def recording(items, *args, **kwargs):
+                batches.append(sum(len(blob) for _, blob in items))
+                return write_chunk_blobs(items, *args, **kwargs)
+
+            temp_store._write_chunk_blobs = recording
+            report = temp_store.compact_packs(threshold=0.3, min_age=0)
+            assert report['packs_compacted'] == 1 and report['chunks_moved'] == 18
+            assert len(batches) > 3 and max(batches) < 4096 + 1024
+            temp_store.chunk_cache.clear()
+            for file_hash, data in files.items():
+                assert temp_store.read_file(file_hash) == data
+
+    def test_pack_held_by_writer_not_compacted(self, test_app, temp_store):
+        """其他进程（如命令行压缩任务）不会压缩写入进程仍在追加的包，无论包多旧"""
+        with test_app.app_context():
+            self._reset()
+            keep = b"keep me " * 100
+            keep_hash = temp_store.store_file(keep)['file_hash']
+            drop_hash = temp_store.store_file(b"drop me " * 300)['file_hash']
+            temp_store.delete_file(drop_hash)
+            temp_store.collect_garbage(grace_seconds=0)
+            active = temp_store.pack_store.active_pack()
+            old = time.time() - 3600
+            os.utime(temp_store.pack_store.pack_path(active), (old, old))
+
+            compactor = DatabaseChunkStore(temp_store.storage_root, chunk_size=1024)
+            try:
+                report = compactor.compact_packs(threshold=0.3, min_age=0)
+                assert report['packs_busy'] == 1 and report['packs_compacted'] == 0
+                assert os.path.exists(temp_store.pack_store.pack_path(active))
+
+                # 写入进程封存后可以压缩，之后的追加写入新包
+                temp_store.pack_store.seal()
+                report = compactor.compact_packs(threshold=0.3, min_age=0)
+                assert report['packs_compacted'] == 1
+                again = temp_store.store_file(b"after compaction " * 50)
+                temp_store.chunk_cache.clear()
+                assert temp_store.read_file(keep_hash) == keep
+                assert temp_store.read_file(again['file_hash']) == b"after compaction " * 50
+            finally:
+                compactor.close()
+
+    def test_read_fds_bounded_and_not_closed_while_in_use(self):
+        """读取描述符按 LRU 淘汰；被淘汰/移除时正在使用的描述符由最后一个使用者关闭"""
+        temp_dir = tempfile.mkdtemp()
+        packs = PackStore(temp_dir, max_read_fds=2)
+        try:
+            locations = []
+            for i in range(4):
+                locations.append(packs.append(f"{i:02x}" * 32, bytes([i]) * 100))
+                packs.seal()
+            for i, location in enumerate(locations):
+                assert packs.read(location) == bytes([i]) * 100
+            assert len(packs._read_fds) == 2
+
+            name = PackStore.parse_location(locations[0])[0]
+            handle = packs._acquire_read_fd(name)
+            packs._forget_read_fd(name)
+            assert os.pread(handle.fd, 100, 0) == bytes([0]) * 100
+            packs._release_read_fd(handle)
+            with pytest.raises(OSError):
+                os.fstat(handle.fd)
+        finally:
+            packs.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_cache import ChunkCache
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.readahead import ReadAhead
+
+
+class TestReadAhead:
+    """测试顺序读取预读"""
+
+    def test_order_and_buffer_bound(self):
+        """按顺序产出，预读中的字节数不超过上限"""
+        items = [(i, 100) for i in range(20)]
+        lock = threading.Lock()
+        started = []
+
+        def fetch(item):
+            with lock:
+                started.append(item[0])
+            return b"x" * item[1]
+
+        with ThreadPoolExecutor(4) as executor:
+            readahead = ReadAhead(executor, depth=8, max_bytes=250, trigger=0)
+            for consumed, (item, data) in enumerate(readahead.iterate(items, fetch, lambda it: it[1])):
+                assert item[0] == consumed
+                assert data == b"x" * 100
+                # 已提交但未消费的条目最多 max_bytes // 100 = 2 个
+                with lock:
+                    assert len(started) <= consumed + 1 + 2
+
+    def test_trigger_and_cancel(self):
+        """达到触发阈值前不预读；提前结束迭代时取消未开始的预读"""
+        fetched = []
+
+        def fetch(item):
+            fetched.append(item)
+            time.sleep(0.01)
+            return b"data"
+
+        with ThreadPoolExecutor(1) as executor:
+            readahead = ReadAhead(executor, depth=4, max_bytes=1 << 20, trigger=2)
+            stream = readahead.iterate(list(range(100)), fetch, lambda it: 1)
+            next(stream)
+            assert fetched == [0]
+            next(stream)
+            next(stream)
+            stream.close()
+        assert len(fetched) < 10
+
+    def test_failed_prefetch_yields_none(self):
+        def fetch(item):
+            if item == 3:
+                raise IOError("cold storage timeout")
+            return b"ok"
+
+        with ThreadPoolExecutor(2) as executor:
+            readahead = ReadAhead(executor, depth=4, max_bytes=1 << 20, trigger=0)
+            results = [data for _, data in readahead.iterate(list(range(6)), fetch, lambda it: 1)]
+        assert results == [b"ok", b"ok", b"ok", None, b"ok", b"ok"]
+
+    def test_store_reads_with_readahead(self, test_app):
+        """开启预读的流式读取结果与原数据一致；预读读不到时同步重读"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+                store.chunk_cache = ChunkCache(0)
+                store._readahead_executor = ThreadPoolExecutor(2)
+                store.readahead = ReadAhead(store._readahead_executor, depth=3, max_bytes=1 << 20)
+                data = os.urandom(20 * 1024 + 7)
+                file_hash = store.store_file(data)['file_hash']
+
+                assert b"".join(store.open_file(file_hash)) == data
+                assert store.read_range(file_hash, 3000, 15000) == data[3000:15000]
+
+                # 预读线程读取失败的块由请求线程重新读取
+                original = store._read_chunk_blob
+                calls = {'n': 0}
+
+                def flaky_read(path):
+                    calls['n'] += 1
+                    if threading.current_thread() is not threading.main_thread():
+                        return None
+                    return original(path)
+
+                store._read_chunk_blob = flaky_read
+                assert store.read_file(file_hash) == data
+                assert calls['n'] > 21
+                store.close()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
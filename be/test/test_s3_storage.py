@@ -0,0 +1,56 @@
+import gzip
+import io
+from collections import Counter
+
+import boto3
+import pytest
+from moto import mock_aws
+from werkzeug.datastructures import FileStorage
+
+from services.storage.S3_storage import S3Storage
+from utils.compress import compress_for_storage
+
+BUCKET = "user-files"
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3Storage(BUCKET)
+
+
+def _count_requests(client) -> Counter:
+    calls = Counter()
+    client.meta.events.register("before-call.s3", lambda model, **kwargs: calls.update([model.name]))
+    return calls
+
+
+class TestS3StorageStat:
+    """测试 S3 文件的 stat：一次 HEAD 得到原始大小和 ETag，不下载对象"""
+
+    def test_stat_uses_head(self, storage):
+        data = b"hello world " * 1000
+        storage.upload_file(1, FileStorage(io.BytesIO(data), filename="a.txt"))
+        calls = _count_requests(storage.s3)
+
+        meta = storage.stat_file(1, "a.txt")
+        assert meta["size"] == len(data)
+        assert meta["etag"] and not meta["etag"].startswith('"')
+        assert meta["mtime"] is not None
+        assert dict(calls) == {"HeadObject": 1}
+        assert storage.stat_file(1, "missing.txt") is None
+
+    def test_legacy_objects(self, storage):
+        """没有原始大小元数据的旧对象：封装格式只读头部，旧 gzip 对象解压后得到大小"""
+        data = b"legacy " * 500
+        storage.s3.put_object(Bucket=BUCKET, Key="1/enveloped.txt", Body=compress_for_storage(data))
+        storage.s3.put_object(Bucket=BUCKET, Key="1/old.gz", Body=gzip.compress(data))
+        calls = _count_requests(storage.s3)
+
+        assert storage.stat_file(1, "enveloped.txt")["size"] == len(data)
+        assert calls["GetObject"] == 1
+        assert storage.stat_file(1, "old.gz")["size"] == len(data)
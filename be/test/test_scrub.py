@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.layout import ChunkLayout
+from services.dedup.scrub import RateLimiter, Scrubber
+
+
+class TestScrubber:
+    """测试完整性校验"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.pack_small_chunks = False
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.query(MaintenanceCheckpoint).delete()
+        db.session.commit()
+
+    def test_detects_and_repairs_damage(self, test_app, temp_store):
+        """检测丢失/损坏的块；修复后相同内容再次上传可以恢复"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(4 * 1024)
+            file_hash = temp_store.store_file(data)['file_hash']
+            hashes = [m.chunk_hash for m in FileChunkMapping.get_file_chunks(file_hash)]
+
+            os.remove(temp_store._lookup_storage_path(hashes[0]))
+            with open(temp_store._lookup_storage_path(hashes[1]), "r+b") as f:
+                f.seek(20)
+                f.write(b"\x00garbage\x00")
+
+            report = Scrubber(temp_store, workers=2, batch_size=2).run()
+            chunks = report['chunks']
+            assert chunks['completed']
+            assert chunks['scanned'] == 4
+            assert chunks['missing'] == 1
+            assert chunks['ok'] == 2
+            assert chunks['corrupt'] + chunks['hash_mismatch'] == 1
+            assert {d['chunk_hash'] for d in chunks['damaged']} == set(hashes[:2])
+            assert report['refcounts']['mismatched'] == 0
+
+            repaired = Scrubber(temp_store, workers=2).run(repair=True)
+            assert repaired['chunks']['removed'] == 2
+            assert not Chunk.exists(hashes[0])
+
+            temp_store.chunk_cache.clear()
+            temp_store.store_file(data)
+            assert temp_store.read_file(file_hash) == data
+
+    def test_relocated_chunks_are_not_removed(self, test_app, temp_store):
+        """校验批次查出之后块被布局迁移：按新位置重新校验，修复模式不删除迁移走的健康块"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(4 * 1024)
+            current = temp_store.layout
+            temp_store.layout = ChunkLayout.legacy(temp_store.chunks_dir)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.layout = current
+
+            scrubber = Scrubber(temp_store, workers=2)
+            next_batch = scrubber._next_batch
+
+            def migrate_after_fetch(after):
+                rows = next_batch(after)
+                if rows:
+                    assert temp_store.migrate_layout()['migrated'] == 4
+                return rows
+
+            scrubber._next_batch = migrate_after_fetch
+            chunks = scrubber.run(repair=True, check_refcounts=False)['chunks']
+            assert chunks['ok'] == chunks['scanned'] == 4
+            assert chunks['missing'] == 0 and chunks['removed'] == 0
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+    def test_refcount_recompute(self, test_app, temp_store):
+        """引用计数与映射引用次数不一致时报告并修复"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(2048))['file_hash']
+            chunk_hash = FileChunkMapping.get_file_chunks(file_hash)[0].chunk_hash
+            Chunk.add_refs({chunk_hash: 5})
+
+            report = temp_store.scrub(check_refcounts=True)
+            assert report['refcounts']['mismatched'] == 1
+            assert report['refcounts']['samples'][0] == {'chunk_hash': chunk_hash, 'ref_count': 6, 'actual': 1}
+
+            report = temp_store.scrub(repair=True)
+            assert report['refcounts']['repaired'] == 1
+            assert Chunk.get_ref_count(chunk_hash) == 1
+
+    def test_resumable(self, test_app, temp_store):
+        """分批校验保存断点，重启后从断点继续"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(os.urandom(6 * 1024))
+
+            first = Scrubber(temp_store, batch_size=2).run(max_batches=2)
+            assert not first['chunks']['completed']
+            assert 'refcounts' not in first
+            cursor, saved = MaintenanceCheckpoint.load(Scrubber.CHECKPOINT_TASK)
+            assert saved['scanned'] == 4
+
+            second = Scrubber(temp_store, batch_size=2).run()
+            assert second['chunks']['resumed_from'] == cursor
+            assert second['chunks']['scanned'] == 6
+            assert second['chunks']['completed']
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(100 * 1024)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire(10 * 1024)
+        assert time.monotonic() - started >= 0.35
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_store import ChunkReadError, DatabaseChunkStore
+from services.dedup.sendfile import RegionStream, sendfile_region
+
+
+class TestZeroCopyDownload:
+    """测试下载路径：原样存储的块按文件区间读取/发送，压缩块走解压路径"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        store.chunk_policy = None
+        store.pack_small_chunks = False
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.commit()
+
+    def _count_decodes(self, store):
+        calls = []
+        decode = store._decode_chunk_blob
+
+        def counting(blob, **kwargs):
+            calls.append(len(blob))
+            return decode(blob, **kwargs)
+
+        store._decode_chunk_blob = counting
+        return calls
+
+    @pytest.mark.parametrize("packed", [False, True])
+    def test_single_raw_chunk_is_region(self, test_app, temp_store, packed):
+        """单个原样块内的区间返回文件区间，可直接 sendfile；包文件中的块同样适用"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.pack_small_chunks = packed
+            data = os.urandom(3000)
+            file_hash = temp_store.store_file(data)['file_hash']
+
+            stream = temp_store.open_blob(file_hash, 1100, 1900)
+            assert isinstance(stream, RegionStream)
+            assert b"".join(stream) == data[1100:1900]
+
+            out = tempfile.TemporaryFile()
+            with temp_store.open_blob(file_hash, 2048, 3000) as region:
+                assert sendfile_region(out.fileno(), region) == 952
+            out.seek(0)
+            assert out.read() == data[2048:]
+
+    def test_mixed_chunks_match_decoded_path(self, test_app, temp_store):
+        """原样块与压缩块混合时产出与 read_range 相同的数据，只有压缩块被解码"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(1024) + b"a" * 2048 + os.urandom(1500)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.chunk_cache.clear()
+            decodes = self._count_decodes(temp_store)
+
+            assert b"".join(temp_store.open_blob(file_hash)) == data
+            assert len(decodes) == 1  # 两个相同的压缩块去重为一个，第二次命中块缓存
+            for start, end in [(0, 1024), (500, 3500), (3000, 4572), (4000, 4100)]:
+                assert b"".join(temp_store.open_blob(file_hash, start, end)) == data[start:end]
+                assert temp_store.read_range(file_hash, start, end) == data[start:end]
+
+    def test_compressed_and_disabled_use_decoded_path(self, test_app, temp_store):
+        """压缩块或关闭零拷贝时不返回文件区间"""
+        with test_app.app_context():
+            self._reset()
+            text_hash = temp_store.store_file(b"hello " * 150)['file_hash']
+            raw = os.urandom(900)
+            raw_hash = temp_store.store_file(raw)['file_hash']
+
+            assert not isinstance(temp_store.open_blob(text_hash), RegionStream)
+            assert b"".join(temp_store.open_blob(text_hash, 6, 12)) == b"hello "
+            temp_store.zero_copy_reads = False
+            assert not isinstance(temp_store.open_blob(raw_hash), RegionStream)
+            assert b"".join(temp_store.open_blob(raw_hash)) == raw
+
+    def test_missing_raw_chunk_fails(self, test_app, temp_store):
+        """块文件丢失时回退到解压路径并报告读取失败"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(2048))['file_hash']
+            os.remove(db.session.query(Chunk.storage_path).first()[0])
+            temp_store.chunk_cache.clear()
+            with pytest.raises(ChunkReadError):
+                b"".join(temp_store.open_blob(file_hash))
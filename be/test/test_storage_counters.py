@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping, StorageCounters
+from services.dedup.chunk_store import DatabaseChunkStore
+
+
+class TestStorageCounters:
+    """测试触发器维护的存储统计计数器"""
+
+    @pytest.fixture
+    def temp_store(self):
+        temp_dir = tempfile.mkdtemp()
+        store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+        yield store
+        store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        db.session.query(Chunk).delete()
+        db.session.query(FileChunkMapping).delete()
+        db.session.commit()
+
+    def _assert_consistent(self):
+        counted = StorageCounters.snapshot()
+        actual = StorageCounters.compute()
+        for name in StorageCounters.FIELDS:
+            assert counted[name] == actual[name], name
+        return counted
+
+    def test_counters_follow_writes_and_deletes(self, test_app, temp_store):
+        """上传、重复上传、删除、垃圾回收后计数与全表聚合一致"""
+        with test_app.app_context():
+            self._reset()
+            shared = os.urandom(1024)
+            first = temp_store.store_file(shared + os.urandom(2048))['file_hash']
+            stats = self._assert_consistent()
+            assert stats['total_files'] == 1
+            assert stats['total_chunks'] == 3
+
+            data = shared + os.urandom(1024)
+            second = temp_store.store_file(data)['file_hash']
+            temp_store.store_file(data)  # 重复上传不增加文件数
+            stats = self._assert_consistent()
+            assert stats['total_files'] == 2
+            assert stats['total_chunks'] == 4
+            assert stats['total_size'] == 4 * 1024
+
+            temp_store.delete_file(first)
+            stats = self._assert_consistent()
+            assert stats['total_files'] == 1
+
+            temp_store.collect_garbage(grace_seconds=0)
+            stats = self._assert_consistent()
+            assert stats['total_chunks'] == 2
+
+            temp_store.delete_file(second)
+            self._assert_consistent()
+
+    def test_rolled_back_writes_do_not_count(self, test_app, temp_store):
+        """计数器与块、映射在同一事务中修改，回滚后不变"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(os.urandom(2048))
+            before = StorageCounters.snapshot()
+
+            Chunk.upsert_refs([{'chunk_hash': 'f' * 64, 'chunk_size': 10, 'storage_path': 'x',
+                                'compressed_size': 10}], commit=False)
+            assert StorageCounters.snapshot()['total_chunks'] == before['total_chunks'] + 1
+            db.session.rollback()
+            assert StorageCounters.snapshot() == before
+
+    def test_store_stats_use_counters(self, test_app, temp_store):
+        """存储统计读取计数器，包含文件数和平均块数"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(os.urandom(3072))
+            stats = temp_store.get_storage_stats()
+            assert stats['total_files'] == 1
+            assert stats['total_chunks'] == 3
+            assert stats['avg_chunks_per_file'] == 3
+            assert 0 < stats['compression_ratio']
+
+    def test_reconcile_repairs_drift(self, test_app, temp_store):
+        """计数器被改乱后，校对命令从头重新计算"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(os.urandom(2048))
+            actual = StorageCounters.compute()
+
+            row = db.session.get(StorageCounters, StorageCounters.ROW_ID)
+            row.total_chunks += 5
+            row.total_files = 0
+            db.session.commit()
+
+            report = temp_store.reconcile_stats(dry_run=True)
+            assert report['drift'] == {'total_chunks': -5, 'total_files': actual['total_files']}
+            assert not report['repaired']
+            assert StorageCounters.snapshot()['total_files'] == 0
+
+            report = temp_store.reconcile_stats()
+            assert report['repaired']
+            self._assert_consistent()
+
+            assert temp_store.reconcile_stats()['drift'] == {}
+
+    def test_striped_rows_summed(self, test_app, temp_store):
+        """计数分散在多行中，读取时求和；校对把真实值写回第一行、其余行清零"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.store_file(os.urandom(2048))
+            assert db.session.query(StorageCounters).count() == StorageCounters.STRIPES
+            before = self._assert_consistent()
+
+            # 模拟 PostgreSQL 下其他连接写入的行：一行加、一行减，总和不变
+            rows = [db.session.get(StorageCounters, stripe) for stripe in (3, 7)]
+            rows[0].total_chunks += 4
+            rows[1].total_chunks -= 4
+            db.session.commit()
+            assert StorageCounters.snapshot() == before
+
+            rows[1].total_chunks += 1
+            db.session.commit()
+            assert temp_store.reconcile_stats()['drift'] == {'total_chunks': -1}
+            assert db.session.get(StorageCounters, 3).total_chunks == 0
+            self._assert_consistent()
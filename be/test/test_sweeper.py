@@ -0,0 +1,82 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from common.db import db
+from models.chunk import Chunk, FileChunkMapping
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.sweeper import OrphanSweeper
+
+
+def _write_orphan(chunks_dir: str, name: str, age: float, shard: str = None) -> str:
+    shard_dir = os.path.join(chunks_dir, shard or name[:2])
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, name)
+    with open(path, "wb") as f:
+        f.write(b"orphaned content")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestOrphanSweeper:
+    """测试孤立块文件清理"""
+
+    def test_merge_diff(self):
+        """有序归并只删除数据库中不存在且超过宽限期的文件"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            names = sorted(hashlib.sha256(str(i).encode()).hexdigest() for i in range(200))
+            known, orphans = names[::2], names[1::2]
+            for name in known:
+                _write_orphan(temp_dir, name, age=7200)
+            old = [_write_orphan(temp_dir, name, age=7200) for name in orphans[:-5]]
+            recent = [_write_orphan(temp_dir, name, age=10) for name in orphans[-5:]]
+            # 放错分片的文件不参与归并
+            misplaced = _write_orphan(temp_dir, "f" * 64, age=7200, shard="00")
+
+            dry = OrphanSweeper(temp_dir, iter(known), grace_seconds=3600, workers=3).sweep(dry_run=True)
+            assert dry['orphans'] == len(orphans)
+            assert dry['removed'] == 0
+            assert all(os.path.exists(p) for p in old)
+
+            report = OrphanSweeper(temp_dir, iter(known), grace_seconds=3600, workers=3).sweep()
+            assert report['scanned'] == len(names)
+            assert report['removed'] == len(old)
+            assert report['skipped_recent'] == len(recent)
+            assert report['files_per_second'] > 0
+            assert not any(os.path.exists(p) for p in old)
+            assert all(os.path.exists(p) for p in recent)
+            assert os.path.exists(misplaced)
+            assert all(os.path.exists(os.path.join(temp_dir, n[:2], n)) for n in known)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_store_sweep_uses_batched_hash_stream(self, test_app):
+        """存储的孤立块清理按批次读取数据库哈希，已记录的块文件不受影响"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with test_app.app_context():
+                db.session.query(Chunk).delete()
+                db.session.query(FileChunkMapping).delete()
+                db.session.commit()
+
+                store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+                store.pack_small_chunks = False
+                data = os.urandom(8 * 1024)
+                file_hash = store.store_file(data)['file_hash']
+                orphan = _write_orphan(store.chunks_dir, "0" * 64, age=7200)
+
+                assert list(Chunk.iter_hashes(batch_size=3)) == sorted(
+                    row[0] for row in db.session.query(Chunk.chunk_hash))
+
+                report = store.sweep_orphaned_chunks(grace_seconds=60)
+                assert report['scanned'] == 9
+                assert report['removed'] == 1
+                assert not os.path.exists(orphan)
+                assert store.read_file(file_hash) == data
+                store.close()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
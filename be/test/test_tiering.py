@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from common.db import db
+from models.chunk import Chunk, ChunkAccess, FileChunkMapping, MaintenanceCheckpoint
+from services.dedup.chunk_store import DatabaseChunkStore
+from services.dedup.object_store import ObjectStore
+from services.dedup.tiering import TierMigrator
+
+BUCKET = "cold-chunks"
+
+
+class TestTiering:
+    """测试冷热分层：迁移到对象存储、读取提升、访问时间批量写入"""
+
+    @pytest.fixture
+    def temp_store(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        temp_dir = tempfile.mkdtemp()
+        with mock_aws():
+            client = boto3.client("s3", region_name="us-east-1")
+            client.create_bucket(Bucket=BUCKET)
+            store = DatabaseChunkStore(temp_dir, chunk_size=1024)
+            store.chunk_policy = None
+            store.pack_small_chunks = False
+            store.object_store = ObjectStore(BUCKET, client=client)
+            yield store
+            store.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _reset(self):
+        for model in (Chunk, FileChunkMapping, ChunkAccess, MaintenanceCheckpoint):
+            db.session.query(model).delete()
+        db.session.commit()
+
+    def _objects(self, store):
+        return store.object_store.client.list_objects_v2(Bucket=BUCKET).get("KeyCount", 0)
+
+    def _locations(self):
+        return [row[0] for row in db.session.query(Chunk.storage_path)]
+
+    def test_migrate_and_read_cold(self, test_app, temp_store):
+        """冷块上传到对象存储并删除本地文件，之后仍可读取"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(5000)
+            file_hash = temp_store.store_file(data)['file_hash']
+            local = self._locations()
+
+            report = temp_store.migrate_cold_chunks(cold_after_seconds=-60)
+            assert report['completed']
+            assert report['migrated'] == 5
+            assert all(ObjectStore.is_object_location(path) for path in self._locations())
+            assert not any(os.path.exists(path) for path in local)
+            assert self._objects(temp_store) == 5
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+            assert temp_store.get_tier_stats()['cold_chunks'] == 5
+
+    def test_read_promotes_chunk(self, test_app, temp_store):
+        """读取冷块后写回本地，更新位置并删除冷层对象"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(3000)
+            file_hash = temp_store.store_file(data)['file_hash']
+            temp_store.migrate_cold_chunks(cold_after_seconds=-60)
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_range(file_hash, 0, 1024) == data[:1024]
+            report = temp_store.flush_tier_updates()
+            assert report['promoted'] == 1
+            locations = self._locations()
+            assert sum(not ObjectStore.is_object_location(path) for path in locations) == 1
+            assert self._objects(temp_store) == 2
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+            assert temp_store.flush_tier_updates()['promoted'] == 2
+            assert self._objects(temp_store) == 0
+            assert temp_store.get_tier_stats()['runtime']['cold_reads'] == 3
+
+    def test_access_times_are_batched(self, test_app, temp_store):
+        """读取只记录到内存，批量写入后最近读取过的块不被迁移"""
+        with test_app.app_context():
+            self._reset()
+            temp_store.access_tracker.flush_interval = 3600
+            hot, cold = os.urandom(2048), os.urandom(2048)
+            hot_hash = temp_store.store_file(hot)['file_hash']
+            temp_store.store_file(cold)
+            Chunk.query.update({'updated_at': db.func.datetime('now', '-2 hours')}, synchronize_session=False)
+            db.session.commit()
+
+            for _ in range(5):
+                assert temp_store.read_file(hot_hash) == hot
+            assert db.session.query(ChunkAccess).count() == 0
+            assert len(temp_store.access_tracker) == 2
+
+            report = temp_store.migrate_cold_chunks(cold_after_seconds=3600)
+            assert db.session.query(ChunkAccess).count() == 2
+            assert report['migrated'] == 2
+            hot_chunks = {m.chunk_hash for m in FileChunkMapping.get_file_chunks(hot_hash)}
+            for row in db.session.query(Chunk):
+                assert ObjectStore.is_object_location(row.storage_path) != (row.chunk_hash in hot_chunks)
+
+    def test_throttled_and_resumable(self, test_app, temp_store):
+        """迁移按字节限速，分批提交断点，中断后从断点继续"""
+        with test_app.app_context():
+            self._reset()
+            data = os.urandom(8 * 1024)
+            file_hash = temp_store.store_file(data)['file_hash']
+
+            migrator = TierMigrator(temp_store, cold_after_seconds=-60, batch_size=2, max_bytes_per_second=16 * 1024)
+            first = migrator.run(max_batches=2)
+            assert not first['completed']
+            assert first['migrated'] == 4
+            assert first['runtime_seconds'] >= 0.1
+            second = migrator.run()
+            assert second['completed']
+            assert second['resumed_from'] != ''
+            assert second['migrated'] == 8
+            assert MaintenanceCheckpoint.load(TierMigrator.CHECKPOINT_TASK) == ('', {})
+
+            temp_store.chunk_cache.clear()
+            assert temp_store.read_file(file_hash) == data
+
+    def test_gc_deletes_cold_objects(self, test_app, temp_store):
+        """回收冷层中的块时批量删除对象"""
+        with test_app.app_context():
+            self._reset()
+            file_hash = temp_store.store_file(os.urandom(4096))['file_hash']
+            temp_store.migrate_cold_chunks(cold_after_seconds=-60)
+            assert self._objects(temp_store) == 4
+
+            temp_store.delete_file(file_hash)
+            report = temp_store.collect_garbage(grace_seconds=0)
+            assert report['reclaimed_chunks'] == 4
+            assert report['remove_errors'] == 0
+            assert self._objects(temp_store) == 0
@@ -1,30 +1,412 @@
 import gzip
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
 
 # GZIP magic header bytes
 _GZIP_MAGIC = b"\x1f\x8b"
 
+# 自描述封装格式（每个存储对象一份头部，读取时不再靠猜测）:
+#   magic(4) | codec id(1) | flags(1) | 原始长度(8, 小端) | [CRC32(4), 当 flags & FLAG_CHECKSUM]
+#   | [字典id(4), 当 flags & FLAG_DICT] | payload
+ENVELOPE_MAGIC = b"\x93CKE"
+FLAG_CHECKSUM = 0x01
+FLAG_DELTA = 0x02  # 解码结果是相对另一个块的差分（见 services.dedup.delta），需要基准块才能还原
+FLAG_DICT = 0x04  # payload 使用训练字典压缩（目前只有 zstd），解码时按字典id取回同一份字典
+_HEADER = struct.Struct("<4sBBQ")
+_CHECKSUM = struct.Struct("<I")
+_DICT_ID = struct.Struct("<I")
+ENVELOPE_MAX_HEADER_SIZE = _HEADER.size + _CHECKSUM.size + _DICT_ID.size  # 只读头部时读取的字节数
+
+DEFAULT_CODEC = "gzip"
+
+
+class CorruptBlobError(ValueError):
+    """封装头部或校验和与数据不符"""
+
+
+class DictionaryUnavailableError(CorruptBlobError):
+    """数据使用的压缩字典不可用（未加载或 zstandard 未安装），数据本身不一定损坏"""
+
+
+class Codec:
+    """压缩编解码器：codec_id 写入封装头部，一经分配不可更改"""
+
+    def __init__(self, name: str, codec_id: int, compress, decompress, default_level: Optional[int] = None):
+        self.name = name
+        self.codec_id = codec_id
+        self._compress = compress
+        self._decompress = decompress
+        self.default_level = default_level
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        return self._compress(data, self.default_level if level is None else level)
+
+    def decompress(self, payload: bytes, raw_size: int) -> bytes:
+        return self._decompress(payload, raw_size)
+
+
+_CODECS_BY_NAME: Dict[str, Codec] = {}
+_CODECS_BY_ID: Dict[int, Codec] = {}
+
+
+def register_codec(codec: Codec):
+    """注册编解码器（同名或同id会被覆盖）"""
+    _CODECS_BY_NAME[codec.name] = codec
+    _CODECS_BY_ID[codec.codec_id] = codec
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return _CODECS_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f"不可用的压缩算法: {name}（可用: {', '.join(available_codecs())}）")
+
+
+def available_codecs() -> List[str]:
+    return sorted(_CODECS_BY_NAME, key=lambda name: _CODECS_BY_NAME[name].codec_id)
+
+
+register_codec(Codec("none", 0, lambda data, level: data, lambda payload, raw_size: payload))
+register_codec(Codec("zlib", 1, lambda data, level: zlib.compress(data, level),
+                     lambda payload, raw_size: zlib.decompress(payload), default_level=6))
+register_codec(Codec("gzip", 2, lambda data, level: gzip.compress(data, compresslevel=level),
+                     lambda payload, raw_size: gzip.decompress(payload), default_level=9))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if zstandard is not None:
+    register_codec(Codec(
+        "zstd", 3,
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda payload, raw_size: zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_size),
+        default_level=3,
+    ))
+
+try:
+    import lz4.frame
+
+    register_codec(Codec(
+        "lz4", 4,
+        lambda data, level: lz4.frame.compress(data, compression_level=level),
+        lambda payload, raw_size: lz4.frame.decompress(payload),
+        default_level=0,
+    ))
+except ImportError:
+    pass
+
+
+class EnvelopeHeader(NamedTuple):
+    codec: str
+    raw_size: int
+    checksum: Optional[int]
+    header_size: int
+    delta: bool = False
+    dict_id: Optional[int] = None
+
+
+class TrainedDictionary:
+    """
+    从已存储数据中训练得到的 zstd 字典
+    - dict_id 即字典版本号，写入每个使用它压缩的数据的封装头部，字典发布后内容不可更改
+    - 压缩/解压上下文按线程缓存（zstd 上下文不能被多个线程同时使用）
+    """
+
+    def __init__(self, dict_id: int, data: bytes):
+        if zstandard is None:
+            raise DictionaryUnavailableError("字典压缩需要安装 zstandard")
+        self.dict_id = dict_id
+        self.data = data
+        self._dict = zstandard.ZstdCompressionDict(data)
+        self._local = threading.local()
+
+    def _contexts(self) -> Dict:
+        contexts = getattr(self._local, "contexts", None)
+        if contexts is None:
+            contexts = self._local.contexts = {}
+        return contexts
+
+    def compress(self, data: bytes, level: Optional[int] = None) -> bytes:
+        level = 3 if level is None else level
+        contexts = self._contexts()
+        compressor = contexts.get(level)
+        if compressor is None:
+            compressor = contexts[level] = zstandard.ZstdCompressor(
+                level=level, dict_data=self._dict, write_dict_id=False
+            )
+        return compressor.compress(data)
+
+    def decompress(self, payload: bytes, raw_size: int) -> bytes:
+        contexts = self._contexts()
+        decompressor = contexts.get("d")
+        if decompressor is None:
+            decompressor = contexts["d"] = zstandard.ZstdDecompressor(dict_data=self._dict)
+        return decompressor.decompress(payload, max_output_size=raw_size)
+
+
+def train_dictionary(samples: List[bytes], dict_size: int, level: Optional[int] = None) -> bytes:
+    """用样本数据训练 zstd 字典，返回字典内容；样本太少或太单一时 zstd 会抛出异常"""
+    if zstandard is None:
+        raise ValueError("字典训练需要安装 zstandard")
+    return zstandard.train_dictionary(dict_size, samples, level=3 if level is None else level).as_bytes()
+
+
+# 已压缩格式的魔数（(偏移, 魔数)）：图片、音视频、压缩包以及本模块的封装格式
+_COMPRESSED_SIGNATURES = [
+    (0, b"\xff\xd8\xff"),            # JPEG
+    (0, b"\x89PNG\r\n\x1a\n"),       # PNG
+    (0, b"GIF8"),                     # GIF
+    (8, b"WEBP"),                     # WebP (RIFF....WEBP)
+    (4, b"ftyp"),                     # MP4 / MOV / HEIC
+    (0, b"\x1a\x45\xdf\xa3"),         # MKV / WebM
+    (0, b"OggS"),                     # Ogg
+    (0, b"fLaC"),                     # FLAC
+    (0, b"ID3"),                      # MP3
+    (0, b"PK\x03\x04"),               # ZIP / docx / xlsx / jar / apk
+    (0, _GZIP_MAGIC),                 # gzip
+    (0, b"BZh"),                      # bzip2
+    (0, b"\xfd7zXZ\x00"),             # xz
+    (0, b"7z\xbc\xaf\x27\x1c"),         # 7z
+    (0, b"Rar!\x1a\x07"),             # RAR
+    (0, b"\x28\xb5\x2f\xfd"),         # zstd
+    (0, b"\x04\x22\x4d\x18"),         # lz4
+    (0, ENVELOPE_MAGIC),              # 已封装的数据
+]
+
+ENTROPY_SAMPLE_SIZE = 64 * 1024   # 熵估计采样字节数
+ENTROPY_SAMPLE_BLOCK = 512        # 采样块大小（等间隔取若干连续块）
+MIN_DETECT_SIZE = 1024            # 太小的数据熵估计不可靠，直接尝试压缩
+SIGNATURE_ENTROPY_THRESHOLD = 7.0  # 魔数命中时使用的较低熵阈值
+
+
+def has_compressed_signature(data: bytes) -> bool:
+    """按魔数判断是否为已知的已压缩格式"""
+    return any(data[offset:offset + len(magic)] == magic for offset, magic in _COMPRESSED_SIGNATURES)
+
+
+def estimate_entropy(data: bytes) -> float:
+    """
+    按字节分布估计熵（比特/字节，0~8）
+
+    数据较大时等间隔取若干 ENTROPY_SAMPLE_BLOCK 字节的连续块，总共约 ENTROPY_SAMPLE_SIZE 字节。
+    """
+    arr = np.frombuffer(data, dtype=np.uint8)
+    if len(arr) > ENTROPY_SAMPLE_SIZE:
+        blocks = ENTROPY_SAMPLE_SIZE // ENTROPY_SAMPLE_BLOCK
+        starts = np.linspace(0, len(arr) - ENTROPY_SAMPLE_BLOCK, blocks).astype(np.int64)
+        arr = arr[starts[:, None] + np.arange(ENTROPY_SAMPLE_BLOCK)].ravel()
+    if not len(arr):
+        return 0.0
+    counts = np.bincount(arr, minlength=256)
+    probs = counts[counts > 0] / len(arr)
+    return max(0.0, float(-(probs * np.log2(probs)).sum()))
+
+
+def looks_incompressible(data: bytes, entropy_threshold: float = 7.8) -> bool:
+    """
+    采样熵高于阈值时认为不值得压缩
+
+    每个块都会调用，块开头的魔数只是巧合的可能很大（文件中间的块、以 "BZh"/"ID3" 开头的文本），
+    因此魔数命中时只把阈值降到 SIGNATURE_ENTROPY_THRESHOLD，仍需熵估计同意。
+    """
+    if len(data) < MIN_DETECT_SIZE:
+        return False
+    entropy = estimate_entropy(data)
+    if entropy >= entropy_threshold:
+        return True
+    return entropy >= min(entropy_threshold, SIGNATURE_ENTROPY_THRESHOLD) and has_compressed_signature(data)
+
+
+class CompressionStats:
+    """
+    压缩统计（线程安全）
+    - skipped: 预检判定不可压缩、直接存原始数据的块
+    - compressed: 实际压缩的块；wasted 为其中压缩后没有变小的块
+    - cpu_seconds_saved: 按已压缩数据的平均CPU耗时估算跳过部分节省的时间，再扣除预检耗时
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.skipped_chunks = 0
+        self.skipped_bytes = 0
+        self.compressed_chunks = 0
+        self.compressed_bytes = 0
+        self.wasted_chunks = 0
+        self.compress_seconds = 0.0
+        self.detect_seconds = 0.0
+
+    def record_skip(self, size: int, detect_seconds: float):
+        with self._lock:
+            self.skipped_chunks += 1
+            self.skipped_bytes += size
+            self.detect_seconds += detect_seconds
+
+    def record_compress(self, size: int, compress_seconds: float, detect_seconds: float, shrunk: bool):
+        with self._lock:
+            self.compressed_chunks += 1
+            self.compressed_bytes += size
+            self.compress_seconds += compress_seconds
+            self.detect_seconds += detect_seconds
+            if not shrunk:
+                self.wasted_chunks += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            per_byte = self.compress_seconds / self.compressed_bytes if self.compressed_bytes else 0.0
+            return {
+                'skipped_chunks': self.skipped_chunks,
+                'skipped_bytes': self.skipped_bytes,
+                'compressed_chunks': self.compressed_chunks,
+                'compressed_bytes': self.compressed_bytes,
+                'wasted_chunks': self.wasted_chunks,
+                'compress_cpu_seconds': self.compress_seconds,
+                'detect_cpu_seconds': self.detect_seconds,
+                'cpu_seconds_saved': per_byte * self.skipped_bytes - self.detect_seconds,
+            }
+
+
+def compress_with_detection(data: bytes, stats: Optional[CompressionStats] = None,
+                            entropy_threshold: float = 7.8, **kwargs) -> bytes:
+    """
+    先做不可压缩预检，再调用 compress_for_storage
+
+    判定为不可压缩的数据以 none 编码存储；其他参数同 compress_for_storage。
+    """
+    started = time.thread_time()
+    skip = kwargs.get('enabled', True) and looks_incompressible(data, entropy_threshold)
+    detect_seconds = time.thread_time() - started
+
+    if skip:
+        if stats is not None:
+            stats.record_skip(len(data), detect_seconds)
+        return compress_for_storage(data, **dict(kwargs, enabled=False))
+
+    started = time.thread_time()
+    blob = compress_for_storage(data, **kwargs)
+    if stats is not None and kwargs.get('enabled', True):
+        shrunk = read_envelope_header(blob).codec != "none"
+        stats.record_compress(len(data), time.thread_time() - started, detect_seconds, shrunk)
+    return blob
+
 
 def is_gzip(data: bytes) -> bool:
     return isinstance(data, (bytes, bytearray)) and len(data) >= 2 and bytes(data[:2]) == _GZIP_MAGIC
 
 
-def compress_for_storage(data: bytes, enabled: bool = True) -> bytes:
-    """Compress with gzip if enabled and not already gzipped. Fail-safe to return original on error."""
-    if not enabled or not data or is_gzip(data):
-        return data
-    try:
-        return gzip.compress(data)
-    except Exception:
-        return data
+def read_envelope_header(blob: bytes) -> Optional[EnvelopeHeader]:
+    """解析封装头部；不是封装格式（旧数据）时返回 None"""
+    if not isinstance(blob, (bytes, bytearray, memoryview)) or len(blob) < _HEADER.size:
+        return None
+    magic, codec_id, flags, raw_size = _HEADER.unpack_from(blob)
+    if magic != ENVELOPE_MAGIC:
+        return None
+    codec = _CODECS_BY_ID.get(codec_id)
+    if codec is None:
+        raise CorruptBlobError(f"未知的压缩算法id: {codec_id}")
 
+    header_size = _HEADER.size
+    checksum = None
+    if flags & FLAG_CHECKSUM:
+        if len(blob) < header_size + _CHECKSUM.size:
+            raise CorruptBlobError("封装头部不完整")
+        (checksum,) = _CHECKSUM.unpack_from(blob, header_size)
+        header_size += _CHECKSUM.size
+    dict_id = None
+    if flags & FLAG_DICT:
+        if len(blob) < header_size + _DICT_ID.size:
+            raise CorruptBlobError("封装头部不完整")
+        (dict_id,) = _DICT_ID.unpack_from(blob, header_size)
+        header_size += _DICT_ID.size
+    return EnvelopeHeader(codec.name, raw_size, checksum, header_size, bool(flags & FLAG_DELTA), dict_id)
 
-def decompress_from_storage(blob: bytes, enabled: bool = True) -> bytes:
-    """Decompress if looks like gzip and enabled, otherwise return original. Fail-safe."""
-    if not enabled or not blob or not is_gzip(blob):
-        return blob
-    try:
-        return gzip.decompress(blob)
-    except Exception:
-        return blob
+
+def stored_raw_size(blob: bytes) -> Optional[int]:
+    """不解压直接从头部读取原始大小；旧格式数据、差分数据（头部记录的是差分长度）返回 None"""
+    header = read_envelope_header(blob)
+    return header.raw_size if header and not header.delta else None
 
 
+def compress_for_storage(data: bytes, enabled: bool = True, codec: Optional[str] = None,
+                         level: Optional[int] = None, checksum: bool = True, delta: bool = False,
+                         dictionary: Optional[TrainedDictionary] = None) -> bytes:
+    """
+    压缩并封装数据
+
+    Args:
+        data: 原始数据
+        enabled: False 时使用 none 编码（仍然带头部）
+        codec: 压缩算法名，默认 gzip
+        level: 压缩级别，默认使用算法自身的默认值
+        checksum: 是否在头部记录原始数据的CRC32
+        delta: data 是差分数据（头部标记 FLAG_DELTA，原始长度与校验和均指差分本身）
+        dictionary: 使用训练字典压缩（固定用 zstd，level 只在 codec 也是 zstd 时沿用），头部记录字典id
+
+    压缩失败或压缩后反而变大时退回 none 编码。
+    """
+    chosen = get_codec(codec or DEFAULT_CODEC) if enabled else get_codec("none")
+    payload = data
+    if enabled and dictionary is not None:
+        try:
+            payload = dictionary.compress(data, level if chosen.name == "zstd" else None)
+            chosen = get_codec("zstd")
+        except Exception:
+            dictionary = None
+    if chosen.codec_id != 0 and dictionary is None:
+        try:
+            payload = chosen.compress(data, level)
+        except Exception:
+            payload = data
+    if len(payload) >= len(data):
+        chosen, payload, dictionary = get_codec("none"), data, None
+
+    flags = (FLAG_CHECKSUM if checksum else 0) | (FLAG_DELTA if delta else 0) | (FLAG_DICT if dictionary else 0)
+    header = _HEADER.pack(ENVELOPE_MAGIC, chosen.codec_id, flags, len(data))
+    if checksum:
+        header += _CHECKSUM.pack(zlib.crc32(data))
+    if dictionary is not None:
+        header += _DICT_ID.pack(dictionary.dict_id)
+    return header + payload
+
+
+def decompress_from_storage(blob: bytes, enabled: bool = True, dictionaries=None) -> bytes:
+    """
+    按封装头部解码数据
+
+    封装数据不论 enabled 取值都会按头部记录的算法解码，并校验长度与CRC32，
+    不一致时抛出 CorruptBlobError。没有封装头部的旧数据保持原有行为：
+    enabled 且形如 gzip 时解压，否则原样返回。
+    使用训练字典压缩的数据按头部的字典id从 dictionaries（提供 get(dict_id) 的对象）取字典，
+    取不到时抛出 DictionaryUnavailableError。
+    """
+    header = read_envelope_header(blob)
+    if header is None:
+        if not enabled or not blob or not is_gzip(blob):
+            return blob
+        try:
+            return gzip.decompress(blob)
+        except Exception:
+            return blob
+
+    payload = memoryview(blob)[header.header_size:]
+    decoder = get_codec(header.codec)
+    if header.dict_id is not None:
+        decoder = dictionaries.get(header.dict_id) if dictionaries is not None else None
+        if decoder is None:
+            raise DictionaryUnavailableError(f"压缩字典不可用: {header.dict_id}")
+    try:
+        data = decoder.decompress(payload, header.raw_size)
+    except Exception as e:
+        raise CorruptBlobError(f"{header.codec} 解码失败: {e}") from e
+    data = bytes(data)
+    if len(data) != header.raw_size:
+        raise CorruptBlobError(f"长度不符: 头部记录 {header.raw_size}，实际 {len(data)}")
+    if header.checksum is not None and zlib.crc32(data) != header.checksum:
+        raise CorruptBlobError("CRC32校验失败")
+    return data
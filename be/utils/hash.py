@@ -1,4 +1,20 @@
 import hashlib
+from typing import Callable, Dict, List
+
+# 块指纹算法：摘要统一为 32 字节（64 位十六进制），与 Chunk.chunk_hash 列和包索引的定长字段兼容；
+# 算法名记录在 ChunkFingerprint 表中，没有记录的块为 sha256（引入可选算法之前的所有块）
+DEFAULT_FINGERPRINT = "sha256"
+_FINGERPRINTS: Dict[str, Callable[[bytes], str]] = {
+    "sha256": lambda data: hashlib.sha256(data).hexdigest(),
+    "blake2b": lambda data: hashlib.blake2b(data, digest_size=32).hexdigest(),
+}
+
+try:
+    import blake3
+
+    _FINGERPRINTS["blake3"] = lambda data: blake3.blake3(data).hexdigest()
+except ImportError:
+    pass
 
 
 def md5_bytes(data: bytes) -> str:
@@ -19,3 +35,13 @@ def md5_fileobj(file_obj) -> str:
     return digest
 
 
+def available_fingerprints() -> List[str]:
+    return sorted(_FINGERPRINTS)
+
+
+def get_fingerprint(name: str) -> Callable[[bytes], str]:
+    """返回块指纹函数（数据 -> 64 位十六进制摘要）"""
+    try:
+        return _FINGERPRINTS[name]
+    except KeyError:
+        raise ValueError(f"不可用的指纹算法: {name}（可用: {', '.join(available_fingerprints())}）")
@@ -0,0 +1,133 @@
+import unicodedata
+import uuid
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from werkzeug.http import http_date, parse_if_range_header
+
+MAX_RANGES = 16  # 超过该数量的多区间请求按整文件返回，避免被用来放大读取
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    解析 Range 请求头，返回按请求顺序排列的 [start, end) 区间列表
+
+    Returns:
+        None: 没有 Range 头、格式非法或区间过多，按整文件返回 200
+        []: 所有区间都无法满足，返回 416
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for item in spec.split(","):
+        first, sep, last = item.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                suffix = int(last)
+                if suffix < 0:
+                    return None
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size
+            else:
+                start = int(first)
+                end = int(last) + 1 if last else size
+                if start < 0 or (last and end <= start):
+                    return None
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def if_range_matches(header: Optional[str], etag: Optional[str], mtime: Optional[float]) -> bool:
+    """
+    If-Range 校验：没有该头或校验值与当前文件一致时返回 True
+    只接受强校验：弱 etag 永远不匹配，日期必须与最后修改时间（秒）完全相同
+    """
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith("W/"):
+        return False
+    if header.startswith('"'):
+        return etag is not None and header == f'"{etag}"'
+    parsed = parse_if_range_header(header)
+    if parsed.date is None or mtime is None:
+        return False
+    return int(parsed.date.timestamp()) == int(mtime)
+
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end - 1}/{size}"
+
+
+def content_disposition(filename: str) -> str:
+    """
+    附件下载的 Content-Disposition（与 send_file 相同的做法）
+
+    filename 为带引号的 ASCII 文件名：去掉控制字符（CR/LF 会造成响应头注入），转义引号和反斜杠；
+    文件名含非 ASCII 或控制字符时另外给出 RFC 5987 编码的 filename*，filename 作为不支持它的客户端的回退
+    """
+    simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    simple = "".join(c for c in simple if " " <= c < "\x7f")
+    escaped = simple.replace("\\", "\\\\").replace('"', '\\"')
+    value = f'attachment; filename="{escaped}"'
+    if simple != filename:
+        value += f"; filename*=UTF-8''{quote(filename, safe='!#$&+^`|~')}"
+    return value
+
+
+def last_modified(mtime: Optional[float]) -> Optional[str]:
+    return http_date(int(mtime)) if mtime is not None else None
+
+
+def new_boundary() -> str:
+    return uuid.uuid4().hex
+
+
+def _part_header(start: int, end: int, size: int, content_type: str, boundary: str) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: {content_range(start, end, size)}\r\n\r\n"
+    ).encode("latin-1")
+
+
+def _closing_boundary(boundary: str) -> bytes:
+    return f"--{boundary}--\r\n".encode("latin-1")
+
+
+def multipart_byteranges(parts: Iterable[Tuple[int, int, Iterable[bytes]]], size: int,
+                         content_type: str, boundary: str) -> Iterator[bytes]:
+    """
+    流式产出 multipart/byteranges 响应体
+
+    Args:
+        parts: [(start, end, 区间数据迭代器), ...]，区间为 [start, end)
+    """
+    for start, end, stream in parts:
+        yield _part_header(start, end, size, content_type, boundary)
+        yield from stream
+        yield b"\r\n"
+    yield _closing_boundary(boundary)
+
+
+def multipart_byteranges_length(ranges: Iterable[Tuple[int, int]], size: int,
+                                content_type: str, boundary: str) -> int:
+    """multipart/byteranges 响应体的总长度，用于在产出数据前设置 Content-Length"""
+    total = len(_closing_boundary(boundary))
+    for start, end in ranges:
+        total += len(_part_header(start, end, size, content_type, boundary)) + (end - start) + 2
+    return total